@@ -0,0 +1,21 @@
+# backend/app/core/admin.py
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from . import supa  # loads backend/.env before ADMIN_TOKEN is read
+
+# Shared secret for operator-only endpoints; unset = those endpoints are disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def is_admin_token(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """FastAPI dependency: the request must carry `X-Admin-Token: <ADMIN_TOKEN>`."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin endpoints disabled (ADMIN_TOKEN not set)")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
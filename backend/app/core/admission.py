@@ -0,0 +1,167 @@
+# backend/app/core/admission.py
+import math
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, Optional
+
+from fastapi import Depends, HTTPException, Request
+
+# ===== Admission control =====
+# Two independent gates in front of expensive endpoints:
+#   1) a per-client token bucket, charged by the request's estimated cost → 429 when empty;
+#   2) a global concurrency cap per endpoint class → 503 straight away when full (no queueing).
+# "heavy" (backtests, reconcile) and "interactive" (/predict) have separate caps, so a burst of
+# long backtests can never take the slots /predict needs. Background jobs are charged up front.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+USER_RATE = float(os.getenv("ADMISSION_USER_RATE", "1.0"))      # cost units refilled per second
+USER_BURST = float(os.getenv("ADMISSION_USER_BURST", "60"))     # bucket size (cost units)
+CLASS_LIMITS = {
+    "interactive": int(os.getenv("ADMISSION_CAP_INTERACTIVE", "16")),
+    "heavy": int(os.getenv("ADMISSION_CAP_HEAVY", "2")),
+    # job submission only enqueues; the token bucket is what limits it (jobs.JOB_QUEUE_MAX bounds the queue)
+    "jobs": int(os.getenv("ADMISSION_CAP_JOBS", "16")),
+}
+BUSY_RETRY_AFTER = int(os.getenv("ADMISSION_BUSY_RETRY_AFTER", "2"))  # seconds, for 503s
+_MAX_BUCKETS = 10000
+
+class TokenBucket:
+    def __init__(self, rate: float = USER_RATE, capacity: float = USER_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: float) -> float:
+        """Charge `cost`; returns 0 on success, else seconds until it would fit."""
+        self._refill(time.monotonic())
+        cost = min(cost, self.capacity)  # a huge request drains the bucket rather than never fitting
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else float(BUSY_RETRY_AFTER)
+
+    def refund(self, cost: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + min(cost, self.capacity))
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+_slots = {name: threading.BoundedSemaphore(max(1, n)) for name, n in CLASS_LIMITS.items()}
+_stats: Dict[str, Dict[str, int]] = {
+    name: {"in_use": 0, "admitted": 0, "throttled": 0, "shed": 0} for name in CLASS_LIMITS
+}
+_stats_lock = threading.Lock()
+
+def _count(stats: Dict[str, int], **deltas: int) -> None:
+    with _stats_lock:
+        for k, d in deltas.items():
+            stats[k] += d
+
+def client_key(request: Request) -> str:
+    """The client address. Raw headers are never used: a client could mint a fresh bucket per request."""
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+def _charge(key: str, cost: float, refund: bool = False) -> float:
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            if len(_buckets) >= _MAX_BUCKETS:  # forget clients whose buckets have refilled
+                now = time.monotonic()
+                for k in [k for k, b in _buckets.items() if b.tokens + (now - b.updated) * b.rate >= b.capacity]:
+                    del _buckets[k]
+            bucket = _buckets[key] = TokenBucket()
+        if refund:
+            bucket.refund(cost)
+            return 0.0
+        return bucket.take(cost)
+
+def _reject(status: int, detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(status_code=status, detail=detail,
+                         headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+def admit(endpoint_class: str, cost: Callable[[Request], float] = lambda r: 1.0,
+          user: Optional[Callable[..., str]] = None):
+    """
+    FastAPI yield dependency: `dependencies=[Depends(admit("heavy", backtest_cost))]`.
+    With `user` (the route's auth dependency), buckets are per validated user id; FastAPI
+    caches the dependency per request, so the route's own Depends(user) doesn't re-validate.
+    Without it, buckets are per client address.
+    """
+    slots = _slots[endpoint_class]
+    stats = _stats[endpoint_class]
+
+    def gate(request: Request, key: str):
+        if not ADMISSION_ENABLED:
+            yield
+            return
+        units = cost(request)
+        wait = _charge(key, units)
+        if wait > 0:
+            _count(stats, throttled=1)
+            raise _reject(429, "Rate limit exceeded for this client; retry later", wait)
+        if not slots.acquire(blocking=False):
+            _charge(key, units, refund=True)  # shed requests didn't use anything
+            _count(stats, shed=1)
+            raise _reject(503, f"Server busy ({endpoint_class} capacity reached); retry later", BUSY_RETRY_AFTER)
+        _count(stats, admitted=1, in_use=1)
+        try:
+            yield
+        finally:
+            _count(stats, in_use=-1)
+            slots.release()
+
+    if user is None:
+        def dependency(request: Request):
+            yield from gate(request, client_key(request))
+    else:
+        def dependency(request: Request, user_id: str = Depends(user)):
+            yield from gate(request, "user:" + user_id)
+
+    return dependency
+
+# ===== Cost estimators (1 unit ≈ one /predict) =====
+def _date_param(request: Request, name: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(request.query_params[name])
+    except (KeyError, ValueError):
+        return None
+
+def _trading_days(start: date, end: date) -> int:
+    return max(1, (end - start).days * 5 // 7)
+
+def backtest_cost(request: Request) -> float:
+    """Trading days × lookback, scaled so the default 14-day/60-bar backtest costs ~1."""
+    end = _date_param(request, "end") or date.today()
+    start = _date_param(request, "start") or end - timedelta(days=14)
+    try:
+        lookback = int(request.query_params.get("lookback", "60"))
+    except ValueError:
+        lookback = 60
+    return max(1.0, _trading_days(start, end) * lookback / 600.0)
+
+def compare_cost(request: Request) -> float:
+    """backtest_cost summed over every lookback, times the number of models compared."""
+    end = _date_param(request, "end") or date.today()
+    start = _date_param(request, "start") or end - timedelta(days=14)
+    try:
+        lookbacks = [int(x) for x in request.query_params.getlist("lookbacks")] or [60]
+    except ValueError:
+        lookbacks = [60]
+    models = max(1, len(request.query_params.getlist("models")))
+    return max(1.0, _trading_days(start, end) * sum(lookbacks) * models / 600.0)
+
+def reconcile_cost(request: Request) -> float:
+    try:
+        limit = int(request.query_params.get("limit", "5000"))
+    except ValueError:
+        limit = 5000
+    return max(1.0, limit / 500.0)
+
+def status() -> Dict[str, Dict[str, int]]:
+    with _stats_lock:
+        return {name: {"limit": CLASS_LIMITS[name], **s} for name, s in _stats.items()}
@@ -0,0 +1,106 @@
+# backend/app/core/backtest_rows.py
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+
+from .importtime import lazy
+
+np = lazy("numpy")
+pd = lazy("pandas")
+
+# Public column order of a backtest table (API rows, CSV export, saved backtest_rows)
+COLUMNS = ("date", "actual", "pred", "prev_close", "error", "abs_error", "mape_pct", "accuracy_pct",
+           "direction_pred", "hit", "trade_points", "trade_return_pct", "cum_pl_points", "cum_return_pct")
+_FLOATS = ("actual", "pred", "prev_close", "error", "abs_error", "mape_pct", "accuracy_pct",
+           "trade_points", "trade_return_pct", "cum_pl_points", "cum_return_pct")
+
+class BacktestRows:
+    """
+    Per-day backtest metrics as a struct of arrays: one float64 column per metric, a
+    datetime64[D] date column and two bool columns. Nothing row-shaped exists until
+    records() / frame() is called at the serialization edge.
+    """
+
+    __slots__ = ("date", "direction_up", "hit") + _FLOATS
+
+    @classmethod
+    def compute(cls, dates, pred, prev_close, actual) -> "BacktestRows":
+        """Same metrics and 4-dp rounding as the original per-row loop, for whole arrays."""
+        pred = np.asarray(pred, dtype=np.float64)
+        prev_close = np.asarray(prev_close, dtype=np.float64)
+        actual = np.asarray(actual, dtype=np.float64)
+        error = pred - actual
+        abs_err = np.abs(error)
+        safe_actual = np.where(actual != 0, np.abs(actual), 1.0)
+        mape = np.where(actual != 0, abs_err / safe_actual * 100.0, 0.0)
+        dir_pred = np.sign(pred - prev_close)
+        trade_pts = dir_pred * (actual - prev_close)
+        safe_prev = np.where(prev_close != 0, prev_close, 1.0)
+        trade_ret = np.where(prev_close != 0, trade_pts / safe_prev * 100.0, 0.0)
+
+        r = cls.__new__(cls)
+        r.date = np.asarray(dates, dtype="datetime64[D]")
+        r.actual = np.round(actual, 4)
+        r.pred = np.round(pred, 4)
+        r.prev_close = np.round(prev_close, 4)
+        r.error = np.round(error, 4)
+        r.abs_error = np.round(abs_err, 4)
+        r.mape_pct = np.round(mape, 4)
+        r.accuracy_pct = np.round(100.0 - mape, 4)
+        r.direction_up = pred >= prev_close
+        r.hit = np.sign(actual - prev_close) == dir_pred
+        r.trade_points = np.round(trade_pts, 4)
+        r.trade_return_pct = np.round(trade_ret, 4)
+        r.cum_pl_points = np.cumsum(r.trade_points)
+        r.cum_return_pct = np.cumsum(r.trade_return_pct)
+        return r
+
+    @classmethod
+    def from_records(cls, rows: Sequence[Dict[str, Any]]) -> "BacktestRows":
+        """Rebuild from stored row dicts (e.g. backtest_rows read back from Supabase)."""
+        r = cls.__new__(cls)
+        r.date = np.array([str(x.get("date"))[:10] for x in rows], dtype="datetime64[D]")
+        for col in _FLOATS:
+            setattr(r, col, np.array([x.get(col) for x in rows], dtype=np.float64))
+        r.direction_up = np.array([x.get("direction_pred") == "UP" for x in rows], dtype=bool)
+        r.hit = np.array([bool(x.get("hit")) for x in rows], dtype=bool)
+        return r
+
+    def __len__(self) -> int:
+        return len(self.date)
+
+    # ===== Serialization edge =====
+    def columns(self) -> Dict[str, Any]:
+        """Column arrays in COLUMNS order (dates as ISO strings, direction as UP/DOWN)."""
+        out: Dict[str, Any] = {}
+        for col in COLUMNS:
+            if col == "date":
+                out[col] = self.date.astype(str)
+            elif col == "direction_pred":
+                out[col] = np.where(self.direction_up, "UP", "DOWN")
+            else:
+                out[col] = getattr(self, col)
+        return out
+
+    def records(self) -> List[Dict[str, Any]]:
+        cols = [c.tolist() for c in self.columns().values()]
+        return [dict(zip(COLUMNS, vals)) for vals in zip(*cols)]
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns(), columns=list(COLUMNS))
+
+    def dates(self) -> List[str]:
+        return self.date.astype(str).tolist()
+
+def rolling_mean(values, window: int):
+    """Trailing mean over `window` days, NaN until the window is full (like pandas rolling)."""
+    v = np.asarray(values, dtype=np.float64)
+    out = np.full(len(v), np.nan)
+    if 0 < window <= len(v):
+        out[window - 1:] = np.lib.stride_tricks.sliding_window_view(v, window).mean(axis=1)
+    return out
+
+def nullable(values, decimals: int = 4) -> List[Optional[float]]:
+    """Rounded list with NaN -> None (JSON-safe)."""
+    v = np.asarray(values, dtype=np.float64)
+    return np.where(np.isnan(v), None, np.round(v, decimals)).tolist()
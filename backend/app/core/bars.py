@@ -0,0 +1,200 @@
+# backend/app/core/bars.py
+from __future__ import annotations
+
+import os
+import re
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+from .importtime import lazy
+
+np = lazy("numpy")
+pd = lazy("pandas")
+
+# ===== Append-only columnar bar store =====
+# <BARS_DIR>/<symbol>/<interval>/{ts,open,high,low,close,volume}.bin
+# ts is int64 epoch seconds (UTC), prices/volume float64. Each column is a flat file that is
+# only ever appended to, so reads can np.memmap it and touch just the requested slice.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))  # backend/
+BARS_DIR = os.getenv("BARS_DIR", os.path.join(BASE_DIR, "data", "bars"))
+COLUMNS = ("ts", "open", "high", "low", "close", "volume")
+RESAMPLE_CHUNK_ROWS = int(os.getenv("RESAMPLE_CHUNK_ROWS", "1000000"))
+
+# "5m" -> 300 seconds; days/weeks are calendar buckets (UTC)
+_UNIT_SECONDS = {"m": 60, "h": 3600, "d": 86400, "wk": 7 * 86400}
+_INTERVAL_RE = re.compile(r"^(\d+)(m|h|d|wk)$")
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+def interval_seconds(interval: str) -> int:
+    m = _INTERVAL_RE.match(interval.strip().lower())
+    if not m:
+        raise ValueError(f"Unsupported interval '{interval}' (use e.g. 1m, 5m, 1h, 1d, 1wk)")
+    return int(m.group(1)) * _UNIT_SECONDS[m.group(2)]
+
+def _dir(symbol: str, interval: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9._-]", "_", symbol)
+    return os.path.join(BARS_DIR, safe, interval)
+
+def _lock(path: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+def _dtype(col: str):
+    return np.int64 if col == "ts" else np.float64
+
+def _lengths(path: str) -> Dict[str, int]:
+    out = {}
+    for col in COLUMNS:
+        f = os.path.join(path, f"{col}.bin")
+        out[col] = os.path.getsize(f) // 8 if os.path.exists(f) else 0  # both dtypes are 8 bytes
+    return out
+
+def _repair(path: str) -> int:
+    """A crash mid-append can leave columns of unequal length; cut all back to the shortest."""
+    lens = _lengths(path)
+    n = min(lens.values())
+    for col, ln in lens.items():
+        if ln != n:
+            with open(os.path.join(path, f"{col}.bin"), "r+b") as fh:
+                fh.truncate(n * 8)
+    return n
+
+def _memmap(path: str, col: str, n: int):
+    if n == 0:
+        return np.empty(0, dtype=_dtype(col))
+    return np.memmap(os.path.join(path, f"{col}.bin"), dtype=_dtype(col), mode="r", shape=(n,))
+
+def last_timestamp(symbol: str, interval: str) -> Optional[int]:
+    path = _dir(symbol, interval)
+    n = min(_lengths(path).values()) if os.path.isdir(path) else 0
+    if n == 0:
+        return None
+    return int(_memmap(path, "ts", n)[n - 1])
+
+def frame_to_columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """OHLCV DataFrame (tz-aware or naive UTC index) -> column arrays for append()."""
+    idx = pd.DatetimeIndex(df.index)
+    idx = idx.tz_convert("UTC").tz_localize(None) if idx.tz is not None else idx
+    return {
+        "ts": idx.values.astype("datetime64[s]").astype(np.int64),
+        "open": df["Open"].to_numpy(dtype=np.float64),
+        "high": df["High"].to_numpy(dtype=np.float64),
+        "low": df["Low"].to_numpy(dtype=np.float64),
+        "close": df["Close"].to_numpy(dtype=np.float64),
+        "volume": df["Volume"].to_numpy(dtype=np.float64),
+    }
+
+def append(symbol: str, interval: str, cols: Dict[str, np.ndarray]) -> int:
+    """Append bars newer than the last stored one. Returns rows written."""
+    path = _dir(symbol, interval)
+    os.makedirs(path, exist_ok=True)
+    with _lock(path):
+        n = _repair(path)
+        ts = np.asarray(cols["ts"], dtype=np.int64)
+        order = np.argsort(ts, kind="stable")
+        ts = ts[order]
+        keep = np.ones(len(ts), dtype=bool)
+        keep[1:] = ts[1:] != ts[:-1]                        # drop duplicate timestamps
+        if n:
+            keep &= ts > int(_memmap(path, "ts", n)[n - 1])  # append-only: never rewrite history
+        if not keep.any():
+            return 0
+        for col in COLUMNS:
+            arr = np.asarray(cols[col], dtype=_dtype(col))[order][keep]
+            with open(os.path.join(path, f"{col}.bin"), "ab") as fh:
+                fh.write(np.ascontiguousarray(arr).tobytes())
+        return int(keep.sum())
+
+def read_columns(symbol: str, interval: str, start_ts: Optional[int] = None,
+                 end_ts: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Memory-mapped column slices for [start_ts, end_ts). Nothing is copied until you touch it."""
+    path = _dir(symbol, interval)
+    if not os.path.isdir(path):
+        return {col: np.empty(0, dtype=_dtype(col)) for col in COLUMNS}
+    with _lock(path):
+        n = _repair(path)
+    ts = _memmap(path, "ts", n)
+    lo = 0 if start_ts is None else int(np.searchsorted(ts, start_ts, side="left"))
+    hi = n if end_ts is None else int(np.searchsorted(ts, end_ts, side="left"))
+    return {col: _memmap(path, col, n)[lo:hi] for col in COLUMNS}
+
+# ===== Vectorized resampling =====
+def _bucket_ids(ts: np.ndarray, step: int) -> np.ndarray:
+    if step % (7 * 86400) == 0:
+        # weeks start on Monday; the epoch (1970-01-01) was a Thursday
+        return (ts + 3 * 86400) // step
+    return ts // step
+
+def _bucket_start(bucket: np.ndarray, step: int) -> np.ndarray:
+    if step % (7 * 86400) == 0:
+        return bucket * step - 3 * 86400
+    return bucket * step
+
+def _resample_chunks(cols: Dict[str, np.ndarray], step: int,
+                     chunk_rows: int = RESAMPLE_CHUNK_ROWS) -> Iterator[Tuple[np.ndarray, ...]]:
+    """
+    Yield resampled (ts, open, high, low, close, volume) blocks. Input is processed in
+    ~chunk_rows slices; the last (possibly incomplete) bucket of a slice is carried into
+    the next one, so memory stays bounded no matter how many bars are stored.
+    """
+    ts_all = cols["ts"]
+    n = len(ts_all)
+    i = 0
+    while i < n:
+        j = min(i + chunk_rows, n)
+        b = _bucket_ids(np.asarray(ts_all[i:j]), step)
+        while j < n:
+            cut = int(np.searchsorted(b, b[-1], side="left"))
+            if cut > 0:
+                j = i + cut
+                b = b[:cut]
+                break
+            j = min(j + chunk_rows, n)  # a single bucket spans the whole slice: widen it
+            b = _bucket_ids(np.asarray(ts_all[i:j]), step)
+
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(b)) + 1))
+        ends = np.concatenate((starts[1:], [len(b)])) - 1
+        o = np.asarray(cols["open"][i:j])
+        h = np.asarray(cols["high"][i:j])
+        l = np.asarray(cols["low"][i:j])
+        c = np.asarray(cols["close"][i:j])
+        v = np.asarray(cols["volume"][i:j])
+        yield (
+            _bucket_start(b[starts], step),
+            o[starts],
+            np.maximum.reduceat(h, starts),
+            np.minimum.reduceat(l, starts),
+            c[ends],
+            np.add.reduceat(v, starts),
+        )
+        i = j
+
+def resample(cols: Dict[str, np.ndarray], interval: str) -> Dict[str, np.ndarray]:
+    step = interval_seconds(interval)
+    if len(cols["ts"]) == 0:
+        return {col: np.empty(0, dtype=_dtype(col)) for col in COLUMNS}
+    parts = list(_resample_chunks(cols, step))
+    return {col: np.concatenate([p[k] for p in parts]) for k, col in enumerate(COLUMNS)}
+
+def to_frame(cols: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Same shape as yahoo._as_ohlcv(): naive DatetimeIndex + Open/High/Low/Close/Volume."""
+    idx = pd.to_datetime(np.asarray(cols["ts"], dtype=np.int64), unit="s")
+    return pd.DataFrame({
+        "Open": np.asarray(cols["open"]),
+        "High": np.asarray(cols["high"]),
+        "Low": np.asarray(cols["low"]),
+        "Close": np.asarray(cols["close"]),
+        "Volume": np.asarray(cols["volume"]),
+    }, index=idx)
+
+def read_bars(symbol: str, interval: str, start_ts: Optional[int] = None, end_ts: Optional[int] = None,
+              resample_to: Optional[str] = None) -> pd.DataFrame:
+    """Read stored bars, optionally resampled to a coarser interval on the fly."""
+    cols = read_columns(symbol, interval, start_ts, end_ts)
+    if resample_to and resample_to != interval:
+        if interval_seconds(resample_to) < interval_seconds(interval):
+            raise ValueError(f"Cannot resample {interval} bars down to {resample_to}")
+        cols = resample(cols, resample_to)
+    return to_frame(cols)
@@ -0,0 +1,99 @@
+# backend/app/core/batcher.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .importtime import lazy
+
+np = lazy("numpy")
+
+class MicroBatcher:
+    """
+    Single dedicated inference worker. Callers submit (model, windows) and get a Future;
+    the worker waits up to `max_wait_ms` for more work, stacks windows of the same model
+    and shape into one batch, runs it once and hands each caller back its own slice.
+    All TF work happens on this one thread, so requests stop fighting over intra-op threads.
+    """
+
+    def __init__(self, run: Callable[[Any, Any], Any], max_batch: int = 32, max_wait_ms: float = 3.0,
+                 name: str = "inference-batcher"):
+        self._run = run
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._q: "queue.Queue[Tuple[Any, Any, Future, Any]]" = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"batches": 0, "windows": 0, "largest_batch": 0}
+        self._running_tags: Tuple[Any, ...] = ()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, model, X, tag: Any = None) -> Future:
+        """
+        X: (n, lookback, features) float32. Result: (n,) scaled predictions. `tag` is opaque
+        (the profiler's handle); running() reports the tags of the batch being executed.
+        """
+        fut: Future = Future()
+        self._ensure_started()
+        self._q.put((model, X, fut, tag))
+        return fut
+
+    def running(self) -> Tuple[Optional[int], Tuple[Any, ...]]:
+        """(worker thread id, tags of the batch it is running right now)."""
+        return (self._thread.ident if self._thread is not None else None), self._running_tags
+
+    def _collect(self) -> List[Tuple[Any, Any, Future, Any]]:
+        first = self._q.get()
+        pending = [first]
+        n = len(first[1])
+        deadline = time.perf_counter() + self.max_wait
+        while n < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._q.get(timeout=timeout)
+            except queue.Empty:
+                break
+            pending.append(item)
+            n += len(item[1])
+        return pending
+
+    def _loop(self) -> None:
+        while True:
+            pending = self._collect()
+            groups: Dict[tuple, List[Tuple[Any, Any, Future, Any]]] = {}
+            for item in pending:
+                model, X, fut, _ = item
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                groups.setdefault((id(model), X.shape[1:]), []).append(item)
+
+            for items in groups.values():
+                self._running_tags = tuple(tag for *_, tag in items if tag is not None)
+                try:
+                    batch = items[0][1] if len(items) == 1 else np.concatenate([x for _, x, _, _ in items])
+                    out = self._run(items[0][0], batch)
+                except BaseException as e:  # never let the worker die; fail the callers instead
+                    for _, _, fut, _ in items:
+                        fut.set_exception(e)
+                    continue
+                finally:
+                    self._running_tags = ()
+
+                pos = 0
+                for _, x, fut, _ in items:
+                    fut.set_result(out[pos:pos + len(x)])
+                    pos += len(x)
+                self.stats["batches"] += 1
+                self.stats["windows"] += pos
+                self.stats["largest_batch"] = max(self.stats["largest_batch"], pos)
@@ -0,0 +1,96 @@
+# backend/app/core/depmonitor.py
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+
+from . import resilience, supa, yahoo
+
+# ===== Dependency monitor =====
+# A background thread probes Supabase, Yahoo and Stooq every DEP_MONITOR_INTERVAL seconds,
+# all in parallel and off the event loop. Each probe is a tiny real request with a
+# DEP_PROBE_TIMEOUT bound. The last result per dependency (up/down, latency, detail, since
+# when) is cached for /health/deps and for handlers that would rather skip a dependency known
+# to be down than wait out its timeout (see is_up): that takes DEP_DOWN_AFTER failed probes in
+# a row, so one dropped probe doesn't turn requests away. Market-source failures also feed the
+# resilience breakers, so a source that went down is skipped by fetch_ohlc; a successful probe
+# only closes a breaker that is already open, and never resets the failure count real traffic
+# is building up on a closed one.
+DEP_MONITOR_INTERVAL = float(os.getenv("DEP_MONITOR_INTERVAL", "60"))  # seconds; 0 = stop once all are up
+DEP_RETRY_INTERVAL = float(os.getenv("DEP_RETRY_INTERVAL", "10"))      # while something is down
+DEP_PROBE_TIMEOUT = float(os.getenv("DEP_PROBE_TIMEOUT", "5"))
+DEP_DOWN_AFTER = max(1, int(os.getenv("DEP_DOWN_AFTER", "3")))  # consecutive failed probes
+
+PROBES: Dict[str, Callable[[float], Tuple[bool, str]]] = {"supabase": supa.connection_status}
+if yahoo.DATA_SOURCE != "synthetic":  # synthetic data never touches the market sources
+    PROBES.update(yahoo=yahoo.probe_yahoo, stooq=yahoo.probe_stooq)
+_BREAKER_FED = ("yahoo", "stooq")  # same names as yahoo._call_source
+
+_status: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=len(PROBES), thread_name_prefix="dep-probe")
+_thread: threading.Thread | None = None
+
+def is_up(name: str) -> bool:
+    """False only after DEP_DOWN_AFTER failed probes in a row. Unknown (not probed yet) counts as up."""
+    with _lock:
+        entry = _status.get(name)
+    return entry is None or entry["consecutive_failures"] < DEP_DOWN_AFTER
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        deps = {n: dict(_status[n]) if n in _status else {"up": None, "detail": "first probe running"}
+                for n in PROBES}
+    return {"interval": DEP_MONITOR_INTERVAL, "down_after": DEP_DOWN_AFTER, "all_up": all(e["up"] is not False for e in deps.values()),
+            "deps": deps}
+
+def _check(name: str, probe: Callable[[float], Tuple[bool, str]]) -> bool:
+    t0 = time.perf_counter()
+    try:
+        ok, detail = probe(DEP_PROBE_TIMEOUT)
+    except Exception as e:
+        ok, detail = False, f"{type(e).__name__}: {e}"
+    now = time.time()
+    with _lock:
+        prev = _status.get(name)
+        changed = prev is None or prev["up"] != ok
+        _status[name] = {
+            "up": ok, "detail": detail[:200],
+            "latency_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+            "checked_at": now,
+            "since": now if changed else prev["since"],
+            "consecutive_failures": 0 if ok else (prev["consecutive_failures"] + 1 if prev else 1),
+        }
+    if name in _BREAKER_FED:
+        breaker = resilience.breaker(name)
+        if not ok:
+            breaker.record_failure()
+        elif breaker.state != "closed":
+            breaker.record_success()
+    if changed:
+        print(f"[deps] {'✅' if ok else '❌'} {name} {'up' if ok else 'DOWN'}: {detail}")
+        if name == "supabase" and not ok:
+            print("[deps] Check .env, key type, table name, and RLS.")
+    return ok
+
+def check_all() -> bool:
+    """Probe everything once (in parallel); True if all are up."""
+    return all(_pool.map(lambda item: _check(*item), list(PROBES.items())))
+
+def _loop() -> None:
+    while True:
+        all_up = check_all()
+        if DEP_MONITOR_INTERVAL <= 0 and all_up:
+            return
+        time.sleep(DEP_RETRY_INTERVAL if not all_up else DEP_MONITOR_INTERVAL)
+
+def start() -> None:
+    """Start probing in the background (idempotent); returns immediately."""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _thread = threading.Thread(target=_loop, name="dep-monitor", daemon=True)
+    _thread.start()
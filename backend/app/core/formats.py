@@ -0,0 +1,80 @@
+# backend/app/core/formats.py
+from __future__ import annotations
+
+import importlib.util
+import json
+from functools import lru_cache
+from typing import Any, Dict, Mapping, Optional, Sequence
+
+from fastapi import Request, Response
+
+from .importtime import lazy
+
+pa = lazy("pyarrow")
+msgpack = lazy("msgpack")
+
+# ===== Columnar response negotiation =====
+# JSON stays the default. Clients that send `Accept: application/vnd.apache.arrow.stream`
+# (pyarrow) or `Accept: application/msgpack` (msgpack) get the same table as columns instead
+# of one object per row. Both libraries are optional: if one isn't installed the request
+# silently falls back to JSON.
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+MSGPACK_MIME = "application/msgpack"
+_MIMES = {ARROW_MIME: "arrow", MSGPACK_MIME: "msgpack", "application/x-msgpack": "msgpack"}
+_PACKAGES = {"arrow": "pyarrow", "msgpack": "msgpack"}
+
+@lru_cache(maxsize=None)
+def available(fmt: str) -> bool:
+    return fmt == "json" or importlib.util.find_spec(_PACKAGES[fmt]) is not None
+
+def negotiate(request: Request, fmt: Optional[str] = None) -> str:
+    """'arrow' | 'msgpack' | 'json' from an explicit format, else the Accept header."""
+    if fmt:
+        fmt = fmt.lower()
+        return fmt if fmt in _PACKAGES and available(fmt) else "json"
+    accept = request.headers.get("accept", "")
+    for part in accept.split(","):
+        want = _MIMES.get(part.split(";")[0].strip().lower())
+        if want and available(want):
+            return want
+    return "json"
+
+def _column(values: Sequence[Any]):
+    if hasattr(values, "to_numpy"):
+        values = values.to_numpy()
+    return values
+
+def _arrow(columns: Mapping[str, Sequence[Any]], meta: Dict[str, Any]) -> bytes:
+    table = pa.table({k: _column(v) for k, v in columns.items()})
+    table = table.replace_schema_metadata({"meta": json.dumps(meta, default=str)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def _msgpack(columns: Mapping[str, Sequence[Any]], meta: Dict[str, Any]) -> bytes:
+    cols = {}
+    for k, v in columns.items():
+        v = _column(v)
+        cols[k] = v.tolist() if hasattr(v, "tolist") else list(v)
+    return msgpack.packb({**meta, "columns": cols}, use_bin_type=True, default=str)
+
+def table_response(fmt: str, columns: Mapping[str, Sequence[Any]], meta: Optional[Dict[str, Any]] = None):
+    """
+    Encode a column table for a non-JSON format. Arrow carries `meta` as JSON in the schema
+    metadata; MessagePack sends {**meta, "columns": {...}}. Returns None for 'json' so the
+    caller keeps building its usual JSON body.
+    """
+    meta = meta or {}
+    if fmt == "arrow":
+        return Response(_arrow(columns, meta), media_type=ARROW_MIME)
+    if fmt == "msgpack":
+        return Response(_msgpack(columns, meta), media_type=MSGPACK_MIME)
+    return None
+
+def records_to_columns(rows: Sequence[Dict[str, Any]]) -> Dict[str, list]:
+    """Row dicts (e.g. PostgREST results) -> columns; keys missing from a row become None."""
+    keys: Dict[str, None] = {}
+    for row in rows:
+        keys.update(dict.fromkeys(row))
+    return {k: [row.get(k) for row in rows] for k in keys}
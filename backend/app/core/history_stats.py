@@ -0,0 +1,139 @@
+# backend/app/core/history_stats.py
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from . import supa, tracing
+from .importtime import lazy
+
+np = lazy("numpy")
+pd = lazy("pandas")
+
+# ===== Per-user accuracy aggregate =====
+# Only reconciled rows (actual_close set) count, and only the columns the maths needs are
+# read. The per-user frame is cached in-process and dropped whenever reconcile writes new
+# actuals for that user, so the dashboard normally gets its numbers without a table scan.
+STATS_COLUMNS = "id,prediction_for,last_close,predicted_close,actual_close,signal"
+STATS_CACHE_TTL = int(os.getenv("HISTORY_STATS_TTL", "600"))   # seconds; safety net besides invalidate()
+STATS_PAGE_ROWS = int(os.getenv("HISTORY_STATS_PAGE_ROWS", "1000"))
+BUCKETS = {"day": "D", "week": "W-SUN", "month": "M"}
+POSITION = {"LONG": 1.0, "SHORT": -1.0, "NO_TRADE": 0.0}  # stored signal → position for P&L
+
+_cache: Dict[str, Tuple[float, pd.DataFrame]] = {}
+_cache_lock = threading.Lock()
+
+def invalidate(user_id: Optional[str] = None) -> None:
+    """Forget one user's aggregate (or everyone's); called after reconcile writes actuals."""
+    with _cache_lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(user_id, None)
+
+def _load_rows(user_id: str) -> List[Dict[str, Any]]:
+    """Keyset-paged read of the user's reconciled rows (projected columns only)."""
+    base = f"{supa.REST}/{supa.TABLE}"
+    rows: List[Dict[str, Any]] = []
+    last_id = None
+    while True:
+        q = (f"{base}?select={STATS_COLUMNS}&user_id=eq.{user_id}&actual_close=not.is.null"
+             f"&order=id.asc&limit={STATS_PAGE_ROWS}")
+        if last_id is not None:
+            q += f"&id=gt.{last_id}"
+        with tracing.span("supabase.select", **{"db.table": supa.TABLE, "limit": STATS_PAGE_ROWS}) as s:
+            r = requests.get(q, headers=supa.HEADERS, timeout=30)
+            s.set(**{"http.status_code": r.status_code})
+        r.raise_for_status()
+        page = r.json() or []
+        rows.extend(page)
+        if len(page) < STATS_PAGE_ROWS:
+            return rows
+        last_id = page[-1]["id"]
+
+def _frame(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=STATS_COLUMNS.split(","))
+    for col in ("last_close", "predicted_close", "actual_close"):
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["prediction_for"] = pd.to_datetime(df["prediction_for"], errors="coerce")
+    df = df.dropna(subset=["prediction_for", "predicted_close", "actual_close"])
+
+    last = df["last_close"].to_numpy(dtype=float)
+    pred = df["predicted_close"].to_numpy(dtype=float)
+    actual = df["actual_close"].to_numpy(dtype=float)
+    called_up = pred >= last
+    position = df["signal"].map(POSITION).fillna(0.0).to_numpy(dtype=float)  # what was actually traded
+    move = actual - last
+    hit = np.where(np.isnan(last), np.nan, called_up == (move >= 0)).astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = pd.DataFrame({
+            "abs_err": np.abs(pred - actual),
+            "pct_err": np.where(actual != 0, np.abs(pred - actual) / actual, np.nan),
+            # same rule reconcile uses for direction_hit (ties count as "up")
+            "hit": hit,
+            "trade": position != 0,
+            "trade_hit": np.where(position != 0, hit, np.nan),  # hit rate of the calls actually traded
+            "pnl": position * move,
+            "pnl_pct": position * move / last,
+        }, index=pd.DatetimeIndex(df["prediction_for"]))
+    return out.sort_index()
+
+def _user_frame(user_id: str) -> pd.DataFrame:
+    with _cache_lock:
+        hit = _cache.get(user_id)
+    if hit and time.time() - hit[0] < STATS_CACHE_TTL:
+        return hit[1]
+    df = _frame(_load_rows(user_id))
+    with _cache_lock:
+        _cache[user_id] = (time.time(), df)
+    return df
+
+def _summary(g) -> Dict[str, Any]:
+    return {
+        "n": int(g["abs_err"].count()),
+        "trades": int(g["trade"].sum()),
+        "hit_rate": g["hit"].mean(),
+        "trade_hit_rate": g["trade_hit"].mean(),
+        "mae": g["abs_err"].mean(),
+        "mape": g["pct_err"].mean() * 100.0,
+        "pnl": g["pnl"].sum(),
+        "pnl_pct": g["pnl_pct"].sum() * 100.0,
+    }
+
+def _clean(d: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: (None if isinstance(v, float) and not np.isfinite(v) else
+                round(float(v), 6) if isinstance(v, (float, np.floating)) else v)
+            for k, v in d.items()}
+
+def stats(user_id: str, bucket: str = "day", start=None, end=None) -> Dict[str, Any]:
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {sorted(BUCKETS)}")
+    df = _user_frame(user_id)
+    if start is not None:
+        df = df.loc[df.index >= pd.Timestamp(start)]
+    if end is not None:
+        df = df.loc[df.index <= pd.Timestamp(end)]
+
+    buckets: List[Dict[str, Any]] = []
+    if not df.empty:
+        g = df.groupby(df.index.to_period(BUCKETS[bucket]))
+        agg = pd.DataFrame({
+            "n": g["abs_err"].count(),
+            "trades": g["trade"].sum(),
+            "hit_rate": g["hit"].mean(),
+            "trade_hit_rate": g["trade_hit"].mean(),
+            "mae": g["abs_err"].mean(),
+            "mape": g["pct_err"].mean() * 100.0,
+            "pnl": g["pnl"].sum(),
+            "pnl_pct": g["pnl_pct"].sum() * 100.0,
+        })
+        agg["cum_pnl"] = agg["pnl"].cumsum()
+        for period, row in zip(agg.index, agg.to_dict("records")):
+            row["n"], row["trades"] = int(row["n"]), int(row["trades"])
+            buckets.append({"period_start": period.start_time.date().isoformat(), **_clean(row)})
+
+    return {"bucket": bucket, "overall": _clean(_summary(df)), "buckets": buckets}
@@ -0,0 +1,288 @@
+# backend/app/core/hotswap.py
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import model, model_server, readiness, shared_cache
+from .importtime import lazy
+
+np = lazy("numpy")
+
+# ===== Zero-downtime model reload =====
+# A reload loads the new model + scaler on a background thread, runs one dummy inference
+# per warm-up lookback (so the swap doesn't hand a cold graph to traffic), then swaps both
+# registry entries in one step (model.swap). Requests that already picked up the old model
+# finish with it. Reloads come from the admin API or, with MODEL_WATCH_INTERVAL > 0, from a
+# poller that notices the served files changed (and stopped changing) on disk.
+#
+# Shadow mode loads a candidate from the models directory without serving it: every live
+# inference is re-run on the candidate on a separate thread, and both predictions (in price
+# terms, each through its own scaler) are appended to SHADOW_LOG with running agreement stats.
+#
+# With SHARED_CACHE (several workers), an admin reload is also published to the shared cache
+# directory, and every worker polls it every MODEL_SYNC_INTERVAL seconds and runs the same
+# reload, so all workers converge on one model (a worker started later picks it up too).
+# Shadow mode would evaluate in just the worker that got the request, so it is refused there.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))  # backend/
+MODELS_DIR = os.path.join(BASE_DIR, "app", "models")
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "0"))  # seconds; 0 = admin reload only
+SHADOW_LOG = os.getenv("SHADOW_LOG", os.path.join(BASE_DIR, "data", "shadow_predictions.jsonl"))
+SHADOW_QUEUE_MAX = int(os.getenv("SHADOW_QUEUE_MAX", "64"))  # pending candidate runs before dropping
+MODEL_SYNC_INTERVAL = float(os.getenv("MODEL_SYNC_INTERVAL", "2"))  # seconds; SHARED_CACHE only
+
+_lock = threading.Lock()
+_reload: Dict[str, Any] = {"status": "idle", "mode": None, "started_at": None, "finished_at": None,
+                           "error": None, "last_swap_at": None}
+_shadow: Optional[Dict[str, Any]] = None
+_shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+_shadow_pending = 0
+_synced_seq = 0  # last shared model target this worker has applied
+
+def _served_paths() -> Tuple[str, str]:
+    return model.model_file(model.default_model_path()), os.path.realpath(model.default_scaler_path())
+
+def candidate_path(name: str) -> str:
+    """A file in the models directory, by name only (admin input never becomes a free path)."""
+    if not name or os.path.basename(name) != name:
+        raise ValueError("expected a file name inside the models directory")
+    path = os.path.join(MODELS_DIR, name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{name} not found in {MODELS_DIR}")
+    return os.path.realpath(path)
+
+# ===== Reload =====
+def reload(model_name: str | None = None, scaler_name: str | None = None, shadow: bool = False,
+           broadcast: bool = True) -> bool:
+    """Start a background reload; False if one is already running. `broadcast`: tell the other workers."""
+    global _synced_seq
+    if shadow and shared_cache.SHARED_CACHE:
+        raise ValueError("shadow mode is per worker and not available with SHARED_CACHE (several workers)")
+    served_model, served_scaler = _served_paths()
+    src_model = candidate_path(model_name) if model_name else served_model
+    src_scaler = candidate_path(scaler_name) if scaler_name else served_scaler
+    if model.INFERENCE_BACKEND == "process" and (shadow or src_model != served_model):
+        raise ValueError("INFERENCE_BACKEND=process only reloads the served file in place (no shadow)")
+    with _lock:
+        if _reload["status"] == "loading":
+            return False
+        _reload.update(status="loading", mode="shadow" if shadow else "swap",
+                       started_at=time.time(), finished_at=None, error=None)
+    threading.Thread(target=_do_reload, name="model-reload", daemon=True,
+                     args=(served_model, served_scaler, src_model, src_scaler, shadow)).start()
+    if broadcast and shared_cache.SHARED_CACHE:
+        _synced_seq = shared_cache.publish_model_target(model_name, scaler_name)
+    return True
+
+def _do_reload(served_model: str, served_scaler: str, src_model: str, src_scaler: str, shadow: bool) -> None:
+    global _shadow
+    try:
+        src_model = model.model_source(src_model)  # the fp16/int8 variant under MODEL_PRECISION
+        model_sha, scaler_sha = model.file_sha256(src_model), model.file_sha256(src_scaler)
+        live_m, live_s = model.live_entry(served_model), model.live_entry(served_scaler)
+        if not shadow and live_m and live_s and (live_m[0], live_m[1], live_s[0], live_s[1]) == (
+                src_model, model_sha, src_scaler, scaler_sha):
+            _finish("unchanged")
+            return
+
+        lookbacks = readiness.WARMUP_LOOKBACKS
+        scaler = model.load_scaler_file(src_scaler)
+        if model.INFERENCE_BACKEND == "process":
+            # fresh worker processes load the file as it is now; the old pool drains and exits
+            model_server.replace_pool(served_model, lookbacks)
+            m = None
+        else:
+            m = model.load_model_file(src_model)
+            n_features = int(m.input_shape[-1])
+            for lb in lookbacks:
+                out = model._predict_direct(m, np.zeros((1, lb, n_features), dtype=np.float32))
+                if not np.all(np.isfinite(out)):
+                    raise ValueError(f"candidate returned non-finite output for lookback {lb}")
+
+        version = "sha256:" + model_sha[:16]
+        if shadow:
+            with _lock:
+                _shadow = {"served": served_model, "source": src_model, "version": version,
+                           "model": m, "scaler": scaler, "scaler_source": src_scaler,
+                           "scaler_sha": scaler_sha, "model_sha": model_sha, "started_at": time.time(),
+                           "n": 0, "abs_diff_sum": 0.0, "direction_agree": 0, "dropped": 0}
+            model.shadow_hook = _queue_shadow
+            print(f"[hotswap] shadowing {os.path.basename(src_model)} ({version})")
+        else:
+            model.swap({served_model: (src_model, model_sha, m), served_scaler: (src_scaler, scaler_sha, scaler)})
+            with _lock:
+                _reload["last_swap_at"] = time.time()
+            print(f"[hotswap] now serving {os.path.basename(src_model)} ({version})")
+        _finish("done")
+    except Exception as e:
+        print(f"[hotswap] reload failed, still serving the previous model: {e}")
+        _finish("failed", str(e))
+
+def _finish(status: str, error: str | None = None) -> None:
+    with _lock:
+        _reload.update(status=status, finished_at=time.time(), error=error)
+
+def promote() -> Optional[str]:
+    """Serve the shadow candidate (already loaded and warm). Returns its version, None if none."""
+    global _shadow
+    with _lock:
+        cand, _shadow = _shadow, None
+    model.shadow_hook = None
+    if cand is None:
+        return None
+    served_scaler = _served_paths()[1]
+    model.swap({
+        cand["served"]: (cand["source"], cand["model_sha"], cand["model"]),
+        served_scaler: (cand["scaler_source"], cand["scaler_sha"], cand["scaler"]),
+    })
+    with _lock:
+        _reload["last_swap_at"] = time.time()
+    print(f"[hotswap] promoted shadow candidate {cand['version']}")
+    return cand["version"]
+
+def stop_shadow() -> bool:
+    global _shadow
+    with _lock:
+        cand, _shadow = _shadow, None
+    model.shadow_hook = None
+    return cand is not None
+
+# ===== Shadow evaluation =====
+def _queue_shadow(served_path: str, X, live_out) -> None:
+    global _shadow_pending
+    cand = _shadow
+    if cand is None or served_path != cand["served"]:
+        return
+    with _lock:
+        if _shadow_pending >= SHADOW_QUEUE_MAX:
+            cand["dropped"] += 1
+            return
+        _shadow_pending += 1
+    _shadow_pool.submit(_run_shadow, cand, np.array(X, dtype=np.float32), np.array(live_out, dtype=np.float64))
+
+def _to_price(scaler, scaled_close) -> Any:
+    dummy = np.zeros((len(scaled_close), int(getattr(scaler, "n_features_in_", 5))))
+    dummy[:, 0] = scaled_close  # Close is feature 0
+    return scaler.inverse_transform(dummy)[:, 0]
+
+def _run_shadow(cand: Dict[str, Any], X, live_out) -> None:
+    global _shadow_pending
+    try:
+        live_scaler = model.get_scaler()
+        n, lb, nf = X.shape
+        raw = live_scaler.inverse_transform(X.reshape(-1, nf)).reshape(n, lb, nf)
+        Xc = cand["scaler"].transform(raw.reshape(-1, nf)).reshape(n, lb, nf).astype(np.float32)
+        cand_out = model._predict_direct(cand["model"], Xc)
+        live_px, cand_px = _to_price(live_scaler, live_out), _to_price(cand["scaler"], cand_out)
+        last_close = raw[:, -1, 0]
+        agree = np.sign(live_px - last_close) == np.sign(cand_px - last_close)
+        with _lock:
+            cand["n"] += n
+            cand["abs_diff_sum"] += float(np.abs(cand_px - live_px).sum())
+            cand["direction_agree"] += int(agree.sum())
+        _append_log({
+            "at": time.time(), "lookback": lb, "live_version": model.model_version(cand["served"]),
+            "candidate_version": cand["version"], "last_close": last_close.round(4).tolist(),
+            "live": live_px.round(4).tolist(), "candidate": cand_px.round(4).tolist(),
+        })
+    except Exception as e:
+        print(f"[hotswap] shadow inference failed: {e}")
+    finally:
+        with _lock:
+            _shadow_pending -= 1
+
+def _append_log(record: Dict[str, Any]) -> None:
+    try:
+        os.makedirs(os.path.dirname(SHADOW_LOG), exist_ok=True)
+        with open(SHADOW_LOG, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"[hotswap] could not write shadow log: {e}")
+
+# ===== Status =====
+def status() -> Dict[str, Any]:
+    served_model, served_scaler = _served_paths()
+    live_m, live_s = model.live_entry(served_model), model.live_entry(served_scaler)
+    with _lock:
+        out: Dict[str, Any] = {"reload": dict(_reload), "watch_interval": MODEL_WATCH_INTERVAL}
+        cand = _shadow
+        if cand is not None:
+            n = cand["n"]
+            out["shadow"] = {
+                "version": cand["version"], "source": os.path.basename(cand["source"]),
+                "started_at": cand["started_at"], "windows": n, "dropped": cand["dropped"],
+                "mean_abs_diff": round(cand["abs_diff_sum"] / n, 4) if n else None,
+                "direction_agreement_pct": round(100.0 * cand["direction_agree"] / n, 2) if n else None,
+                "log": SHADOW_LOG,
+            }
+    out["live"] = {
+        "model_version": model.model_version(served_model),
+        "model_source": os.path.basename(live_m[0]) if live_m else None,
+        "scaler_source": os.path.basename(live_s[0]) if live_s else None,
+        "loaded": bool(live_m and live_m[2] is not None) or model.INFERENCE_BACKEND == "process",
+    }
+    return out
+
+# ===== Directory watch =====
+def _signature(paths: List[str]) -> Tuple:
+    sig = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            sig.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+def _watch_loop() -> None:
+    try:
+        served_model, served_scaler = _served_paths()
+        paths = [model.model_source(served_model), served_scaler]
+    except FileNotFoundError as e:
+        print(f"[hotswap] not watching model files: {e}")
+        return
+    seen = _signature(paths)
+    pending = None
+    while True:
+        time.sleep(MODEL_WATCH_INTERVAL)
+        sig = _signature(paths)
+        if sig == seen:
+            pending = None
+            continue
+        if None in sig or sig != pending:
+            pending = sig  # still being written (or briefly missing): wait for one quiet interval
+            continue
+        if reload(broadcast=False):  # every worker watches the files itself
+            print("[hotswap] model files changed on disk; reloading")
+            seen, pending = sig, None
+
+# ===== Cross-worker sync (SHARED_CACHE) =====
+def _sync_loop() -> None:
+    global _synced_seq
+    while True:
+        target = shared_cache.read_model_target()
+        if target and target.get("seq") != _synced_seq:
+            try:
+                if reload(target.get("model"), target.get("scaler"), broadcast=False):
+                    _synced_seq = target["seq"]
+                    print(f"[hotswap] applying shared model reload #{target['seq']}")
+                # else a reload is running here: try again on the next tick
+            except (FileNotFoundError, ValueError) as e:
+                _synced_seq = target["seq"]  # a target this worker can't load: don't retry it forever
+                print(f"[hotswap] ignoring shared model reload #{target['seq']}: {e}")
+        time.sleep(MODEL_SYNC_INTERVAL)
+
+def start_watch() -> None:
+    """
+    Poll the served model/scaler files every MODEL_WATCH_INTERVAL seconds (no-op when 0) and,
+    with SHARED_CACHE, the shared model target every MODEL_SYNC_INTERVAL seconds.
+    """
+    if shared_cache.SHARED_CACHE:
+        threading.Thread(target=_sync_loop, name="model-sync", daemon=True).start()
+    if MODEL_WATCH_INTERVAL > 0:
+        threading.Thread(target=_watch_loop, name="model-watch", daemon=True).start()
+        print(f"[hotswap] watching model files every {MODEL_WATCH_INTERVAL}s")
@@ -0,0 +1,58 @@
+# backend/app/core/importtime.py
+import importlib
+import time
+from types import ModuleType
+from typing import Dict, List, Optional
+
+# module name -> (milliseconds, "startup" | "lazy")
+IMPORT_TIMES: Dict[str, tuple] = {}
+
+def timed_import(name: str, package: Optional[str] = None, kind: str = "startup") -> ModuleType:
+    """
+    Import a module and record how long it took. Already-imported modules cost ~0 ms,
+    so the recorded number is the real price paid by *this* import.
+    """
+    t0 = time.perf_counter()
+    mod = importlib.import_module(name, package)
+    ms = (time.perf_counter() - t0) * 1000.0
+    IMPORT_TIMES.setdefault(mod.__name__, (round(ms, 2), kind))
+    return mod
+
+class LazyModule:
+    """
+    Stand-in for a heavy module (tensorflow, yfinance, pandas ...). The real import
+    happens on first attribute access, so workers that never touch it never pay for it.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            self._module = timed_import(self._name, kind="lazy")
+            print(f"[import] lazily loaded {self._name} in {IMPORT_TIMES[self._module.__name__][0]} ms")
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+def lazy(name: str) -> LazyModule:
+    return LazyModule(name)
+
+def import_report() -> List[Dict[str, object]]:
+    """Per-module import timings, slowest first."""
+    rows = [{"module": m, "ms": ms, "kind": kind} for m, (ms, kind) in IMPORT_TIMES.items()]
+    rows.sort(key=lambda r: r["ms"], reverse=True)
+    return rows
+
+def print_import_report() -> None:
+    rows = import_report()
+    total = sum(r["ms"] for r in rows if r["kind"] == "startup")
+    print(f"[startup] import time: {total:.1f} ms across {sum(1 for r in rows if r['kind'] == 'startup')} modules")
+    for r in rows:
+        print(f"[startup]   {r['ms']:>9.2f} ms  {r['kind']:<7}  {r['module']}")
@@ -0,0 +1,344 @@
+# backend/app/core/jobs.py
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from . import shared_cache
+
+# ===== In-process background jobs =====
+# Long computations run on a small bounded executor instead of inside the HTTP request.
+# Callers poll the job for progress / partial results and may cancel it; finished results are
+# kept for JOB_TTL seconds. With JOB_DB_PATH set, jobs are also written to SQLite, so queued or
+# interrupted jobs are re-run and finished results are still served after a restart, and any
+# worker process sharing the file can read or cancel them (the flag is checked in progress()).
+# With SHARED_CACHE (several workers) the file defaults to SHARED_CACHE_DIR/jobs.sqlite3.
+# Each row records the process that owns it, and every process refreshes a heartbeat on its
+# own rows; a queued or running row whose owner stopped heartbeating for JOB_OWNER_TIMEOUT
+# seconds is adopted and re-run by a live process (see start()), never one that is still alive.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "32"))     # queued + running; beyond this submit() refuses
+JOB_TTL = int(os.getenv("JOB_TTL", "3600"))               # seconds a finished job stays readable
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "") or (          # e.g. backend/data/jobs.sqlite3; empty = memory only
+    os.path.join(shared_cache.SHARED_CACHE_DIR, "jobs.sqlite3") if shared_cache.SHARED_CACHE else "")
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10"))  # seconds
+JOB_OWNER_TIMEOUT = float(os.getenv("JOB_OWNER_TIMEOUT", "60"))  # no heartbeat this long = owner is dead
+
+class JobCancelled(Exception):
+    pass
+
+class QueueFull(Exception):
+    pass
+
+class Job:
+    def __init__(self, kind: str, params: Dict[str, Any], job_id: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = "queued"          # queued | running | done | failed | cancelled
+        self.done = 0
+        self.total = 0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+        self._partial: Optional[Callable[[], Any]] = None
+
+    # --- called from the worker ---
+    def progress(self, done: int, total: int, partial: Optional[Callable[[], Any]] = None) -> None:
+        """Report progress; `partial` lazily builds the results so far. Raises if cancelled."""
+        self.done, self.total = int(done), int(total)
+        if partial is not None:
+            self._partial = partial
+        _persist(self)
+        if self.cancelled:
+            raise JobCancelled()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._cancel.is_set() and _db_cancel_requested(self.id):
+            self._cancel.set()  # cancelled through another worker process
+        return self._cancel.is_set()
+
+    # --- read side ---
+    def partial(self) -> Any:
+        return self._partial() if self._partial is not None and self.status == "running" else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "id": self.id, "kind": self.kind, "params": self.params, "status": self.status,
+            "progress": {"done": self.done, "total": self.total,
+                         "pct": round(100.0 * self.done / self.total, 1) if self.total else None},
+            "error": self.error, "created_at": self.created_at, "finished_at": self.finished_at,
+        }
+
+_runners: Dict[str, Callable[[Job], Any]] = {}
+_jobs: Dict[str, Job] = {}
+_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=max(1, JOB_WORKERS), thread_name_prefix="job")
+
+def register(kind: str, runner: Callable[[Job], Any]) -> None:
+    """`runner(job)` does the work, calls job.progress(...) as it goes and returns the result."""
+    _runners[kind] = runner
+
+def _run(job: Job) -> None:
+    if job.cancelled:
+        job.status, job.finished_at = "cancelled", time.time()
+        _persist(job)
+        return
+    job.status = "running"
+    _persist(job)
+    try:
+        job.result = _runners[job.kind](job)
+        job.status = "done"
+    except JobCancelled:
+        job.status = "cancelled"
+    except Exception as e:
+        job.error = str(getattr(e, "detail", None) or e)  # HTTPException carries .detail
+        job.status = "failed"
+        print(f"[jobs] {job.kind} job {job.id} failed: {job.error}")
+    finally:
+        job.finished_at = time.time()
+        job._partial = None  # drop references to the worker's arrays
+        _persist(job, final=True)
+
+def _sweep() -> None:
+    now = time.time()
+    with _lock:
+        for jid in [j.id for j in _jobs.values() if j.finished_at and now - j.finished_at > JOB_TTL]:
+            del _jobs[jid]
+    _db_sweep(now)
+
+def submit(kind: str, params: Dict[str, Any]) -> Job:
+    if kind not in _runners:
+        raise ValueError(f"unknown job kind '{kind}'")
+    _sweep()
+    with _lock:
+        active = sum(1 for j in _jobs.values() if j.status in ("queued", "running"))
+        if active >= JOB_QUEUE_MAX:
+            raise QueueFull(f"{active} jobs already queued or running")
+        job = Job(kind, params)
+        _jobs[job.id] = job
+    _persist(job)
+    _pool.submit(_run, job)
+    return job
+
+def get(job_id: str) -> Optional[Job]:
+    _sweep()
+    with _lock:
+        job = _jobs.get(job_id)
+    return job or _db_load(job_id)
+
+def cancel(job_id: str) -> Optional[Job]:
+    job = get(job_id)
+    if job is not None and job.status in ("queued", "running"):
+        job._cancel.set()  # queued: skipped when picked up; running: stops at the next progress()
+        _db_request_cancel(job_id)  # the job may belong to another worker process
+    return job
+
+def list_jobs() -> List[Dict[str, Any]]:
+    with _lock:
+        return [j.snapshot() for j in sorted(_jobs.values(), key=lambda j: j.created_at, reverse=True)]
+
+# ===== Optional SQLite backing =====
+_db_lock = threading.Lock()
+_db_ready = False
+_owner_pid: Optional[int] = None
+_owner_id = ""
+
+def _owner() -> str:
+    """This process's id in the owner column (computed after fork, so preloaded workers differ)."""
+    global _owner_pid, _owner_id
+    if _owner_pid != os.getpid():
+        _owner_pid, _owner_id = os.getpid(), f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    return _owner_id
+
+def _db() -> Optional[sqlite3.Connection]:
+    global _db_ready
+    if not JOB_DB_PATH:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(JOB_DB_PATH)), exist_ok=True)
+    conn = sqlite3.connect(JOB_DB_PATH, timeout=30)
+    if not _db_ready:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL,
+                done INTEGER, total INTEGER, result TEXT, error TEXT,
+                created_at REAL NOT NULL, finished_at REAL, cancel_requested INTEGER NOT NULL DEFAULT 0,
+                owner TEXT, heartbeat REAL
+            )
+        """)
+        cols = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for col, ddl in (("cancel_requested", "INTEGER NOT NULL DEFAULT 0"), ("owner", "TEXT"), ("heartbeat", "REAL")):
+            if col not in cols:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {col} {ddl}")
+        conn.commit()
+        _db_ready = True
+    return conn
+
+def _persist(job: Job, final: bool = False) -> None:
+    if not JOB_DB_PATH:
+        return
+    try:
+        with _db_lock:
+            conn = _db()
+            try:
+                # upsert that leaves cancel_requested alone: another process may have just set it
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, params, status, done, total, result, error, created_at, finished_at, "
+                    "owner, heartbeat) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+                    "status = excluded.status, done = excluded.done, total = excluded.total, "
+                    "result = excluded.result, error = excluded.error, finished_at = excluded.finished_at, "
+                    "owner = excluded.owner, heartbeat = excluded.heartbeat",
+                    (job.id, job.kind, json.dumps(job.params), job.status, job.done, job.total,
+                     json.dumps(job.result, default=str) if final and job.result is not None else None,
+                     job.error, job.created_at, job.finished_at, _owner(), time.time()),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"[jobs] could not persist job {job.id}: {e}")
+
+def _from_row(row) -> Job:
+    job = Job(row[1], json.loads(row[2]), job_id=row[0])
+    job.status, job.done, job.total = row[3], row[4] or 0, row[5] or 0
+    job.result = json.loads(row[6]) if row[6] else None
+    job.error, job.created_at, job.finished_at = row[7], row[8], row[9]
+    if row[10]:
+        job._cancel.set()
+    return job
+
+def _db_load(job_id: str) -> Optional[Job]:
+    if not JOB_DB_PATH:
+        return None
+    try:
+        with _db_lock:
+            conn = _db()
+            try:
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            finally:
+                conn.close()
+    except (sqlite3.Error, OSError):
+        return None
+    return _from_row(row) if row else None
+
+def _db_request_cancel(job_id: str) -> None:
+    if not JOB_DB_PATH:
+        return
+    try:
+        with _db_lock:
+            conn = _db()
+            try:
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status IN ('queued', 'running')",
+                             (job_id,))
+                conn.commit()
+            finally:
+                conn.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"[jobs] could not record cancellation of job {job_id}: {e}")
+
+def _db_cancel_requested(job_id: str) -> bool:
+    if not JOB_DB_PATH:
+        return False
+    try:
+        with _db_lock:
+            conn = _db()
+            try:
+                row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            finally:
+                conn.close()
+    except (sqlite3.Error, OSError):
+        return False
+    return bool(row and row[0])
+
+def _db_sweep(now: float) -> None:
+    if not JOB_DB_PATH:
+        return
+    try:
+        with _db_lock:
+            conn = _db()
+            try:
+                conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (now - JOB_TTL,))
+                conn.commit()
+            finally:
+                conn.close()
+    except (sqlite3.Error, OSError):
+        pass
+
+def _db_heartbeat() -> None:
+    """Mark this process's unfinished jobs as still owned by a live process."""
+    try:
+        with _db_lock:
+            conn = _db()
+            try:
+                conn.execute("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                             (time.time(), _owner()))
+                conn.commit()
+            finally:
+                conn.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"[jobs] heartbeat failed: {e}")
+
+def resume() -> int:
+    """
+    Adopt and re-queue unfinished jobs whose owner is gone: a previous run of the app, or a
+    worker that died (no heartbeat for JOB_OWNER_TIMEOUT seconds). SQLite mode only.
+    """
+    if not JOB_DB_PATH:
+        return 0
+    stale = time.time() - JOB_OWNER_TIMEOUT
+    orphaned = "status IN ('queued', 'running') AND (owner IS NULL OR heartbeat IS NULL OR heartbeat < ?)"
+    rows = []
+    try:
+        with _db_lock:
+            conn = _db()
+            try:
+                for row in conn.execute(f"SELECT * FROM jobs WHERE {orphaned}", (stale,)).fetchall():
+                    if row[1] not in _runners:
+                        continue
+                    # claim it: of several processes racing for the same row, exactly one updates it
+                    cur = conn.execute(f"UPDATE jobs SET owner = ?, heartbeat = ? WHERE id = ? AND {orphaned}",
+                                       (_owner(), time.time(), row[0], stale))
+                    conn.commit()
+                    if cur.rowcount == 1:
+                        rows.append(row)
+            finally:
+                conn.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"[jobs] could not read the job queue: {e}")
+    n = 0
+    for row in rows:
+        job = _from_row(row)
+        job.status, job.done = "queued", 0
+        with _lock:
+            _jobs[job.id] = job
+        _pool.submit(_run, job)
+        n += 1
+    if n:
+        print(f"[jobs] re-queued {n} unfinished job(s)")
+    return n
+
+_thread: Optional[threading.Thread] = None
+
+def _owner_loop() -> None:
+    while True:
+        _db_heartbeat()
+        resume()
+        time.sleep(JOB_HEARTBEAT_INTERVAL)
+
+def start() -> None:
+    """Heartbeat this process's jobs and adopt orphaned ones, in the background (SQLite mode only)."""
+    global _thread
+    if not JOB_DB_PATH or (_thread is not None and _thread.is_alive()):
+        return
+    _thread = threading.Thread(target=_owner_loop, name="job-owner", daemon=True)
+    _thread.start()
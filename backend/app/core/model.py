@@ -1,14 +1,343 @@
-﻿import os
-import joblib
-import numpy as np
-from tensorflow.keras.models import load_model
+﻿from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from . import model_server, profiling, tflite_model, tracing
+from .batcher import MicroBatcher
+from .importtime import lazy
+
+# Heavy deps are loaded on first prediction, not when the API worker boots
+np = lazy("numpy")
+joblib = lazy("joblib")
+_keras_models = lazy("tensorflow.keras.models")
+tf = lazy("tensorflow")
 
 # Default paths (in case no args passed)
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # backend/app
 DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, "models", "best_lstm_model.h5")
 DEFAULT_SCALER_PATH = os.path.join(BASE_DIR, "models", "scaler.save")
+ENV_MODEL_PATH = os.getenv("MODEL_PATH", "")
+ENV_SCALER_PATH = os.getenv("SCALER_PATH", "")
+
+# compiled: tf.function with a fixed signature (default) | eager: model(x, training=False)
+# predict: legacy model.predict (slow on tiny inputs: builds a data adapter per call)
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "compiled").lower()
+INFERENCE_JIT = os.getenv("INFERENCE_JIT", "false").lower() in ("1", "true", "yes")
+# Batch sizes are padded up to one of these so only a handful of concrete shapes ever run
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Concurrent requests hand their windows to one inference thread that batches them
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "true").lower() in ("1", "true", "yes")
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "3"))
+
+# local: TF runs inside the API process | process: model_server pool, TF never imported here
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "local").lower()
+
+# fp32: the Keras .h5 | fp16/int8: its TFLite variant from `python -m app.core.quantize`
+# (served only if that file exists; otherwise fp32 with a warning)
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32").lower()
+
+# ===== Path resolver =====
+def resolve_file(preferred: str, default_name: str) -> str:
+    """
+    Find file across sensible locations. Returns absolute path or raises FileNotFoundError.
+    """
+    here = Path(__file__).resolve()                 # .../app/core/model.py
+    app_dir = here.parent.parent                    # .../app
+    project_root = app_dir.parent                   # .../backend
+    cwd = Path.cwd()
+    candidates: List[Path] = []
+
+    if preferred:
+        p = Path(preferred)
+        candidates += [p, cwd / p, project_root / p, app_dir / p]
+
+    candidates += [
+        cwd / default_name,
+        project_root / default_name,
+        app_dir / default_name,
+        app_dir / "models" / default_name,          # <-- your files live here
+        here.parent / default_name,
+        Path("/mnt/data") / default_name,
+    ]
+
+    tried = []
+    for c in candidates:
+        c = c.resolve()
+        tried.append(str(c))
+        if c.exists():
+            print(f"[model-path] Using: {c}")
+            return str(c)
+
+    raise FileNotFoundError(
+        f"File '{default_name}' not found. Tried:\n" + "\n".join(tried)
+    )
+
+@lru_cache(maxsize=1)
+def default_model_path() -> str:
+    return resolve_file(ENV_MODEL_PATH, "best_lstm_model.h5")
+
+@lru_cache(maxsize=1)
+def default_scaler_path() -> str:
+    return resolve_file(ENV_SCALER_PATH, "scaler.save")
+
+@lru_cache(maxsize=16)
+def _sha256(path: str, mtime: float) -> str:
+    # mtime is part of the cache key, so a replaced file gets re-hashed
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def file_sha256(path: str) -> str:
+    return _sha256(os.path.realpath(path), os.path.getmtime(path))
+
+def model_version(model_path: str | None = None) -> str:
+    """
+    Content-derived version id of the model being served for this path (stable across
+    renames/redeploys). Once loaded, that is the live registry entry, not the file on disk,
+    so a half-finished hot swap never mislabels predictions.
+    """
+    path = os.path.realpath(model_path or default_model_path())
+    return _version(path, model_source(path))
+
+def scaler_version(scaler_path: str | None = None) -> str:
+    """Same as model_version, for the scaler."""
+    path = os.path.realpath(scaler_path or default_scaler_path())
+    return _version(path, path)
+
+def _version(path: str, source: str) -> str:
+    entry = _live.get(path)
+    return "sha256:" + (entry[1] if entry else file_sha256(source))[:16]
+
+def model_source(model_path: str) -> str:
+    """The file actually loaded for a served model path under MODEL_PRECISION."""
+    if MODEL_PRECISION in tflite_model.PRECISIONS:
+        quantized = tflite_model.quantized_path(model_path, MODEL_PRECISION)
+        if os.path.exists(quantized):
+            return quantized
+    return model_path
+
+# ===== Model registry =====
+# One loaded instance per served file, shared by /predict, /backtest and the readiness warm-up.
+# Entries are served path -> (source path, sha256, object). core/hotswap.py replaces them while
+# serving; the dict is rebound on every change, so readers never see a half-applied swap and
+# requests already holding the old object finish with it.
+_registry_lock = threading.Lock()
+_live: Dict[str, Tuple[str, str, Any]] = {}
+
+# Set by core/hotswap.py while a shadow candidate is loaded: hook(served_path, X, live_out)
+shadow_hook: Optional[Callable[[str, Any, Any], None]] = None
+
+def load_model_file(path: str):
+    print(f"[model] loading {path}")
+    if path.endswith(".tflite"):
+        return tflite_model.QuantizedModel(path)
+    if MODEL_PRECISION != "fp32":
+        print(f"[model] ⚠️ MODEL_PRECISION={MODEL_PRECISION} but no {MODEL_PRECISION} variant of this file; serving fp32")
+    return _keras_models.load_model(path, compile=False)  # inference only
+
+def load_scaler_file(path: str):
+    return joblib.load(path)
+
+def _registered(path: str, loader, source: str | None = None):
+    entry = _live.get(path)
+    if entry is None or entry[2] is None:
+        with _registry_lock:
+            entry = _live.get(path)
+            if entry is None or entry[2] is None:
+                source = source or path
+                entry = (source, file_sha256(source), loader(source))
+                _publish({path: entry})
+    return entry[2]
+
+def _publish(entries: Dict[str, Tuple[str, str, Any]]) -> Dict[str, Tuple[str, str, Any]]:
+    global _live
+    old = _live
+    _live = {**old, **entries}
+    return old
+
+def swap(entries: Dict[str, Tuple[str, str, Any]]) -> None:
+    """Atomically replace served entries (all at once, so model and scaler change together)."""
+    with _registry_lock:
+        old = _publish(entries)
+        for path in entries:
+            prev = old.get(path)
+            if prev is not None and prev[2] is not None and prev[2] is not entries[path][2]:
+                _compiled.pop(id(prev[2]), None)  # in-flight calls keep their own reference
 
-def predict_next_close(last60: np.ndarray, model_path: str = None, scaler_path: str = None) -> float:
+def live_entry(path: str) -> Optional[Tuple[str, str, Any]]:
+    return _live.get(os.path.realpath(path))
+
+def model_file(model_path: str | None = None) -> str:
+    """Absolute model path without loading anything (safe in the TF-free API process)."""
+    path = os.path.realpath(model_path or default_model_path())
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model file not found: {path}")
+    return path
+
+def get_model(model_path: str | None = None):
+    path = model_file(model_path)
+    return _registered(path, load_model_file, model_source(path))
+
+def get_scaler(scaler_path: str | None = None):
+    path = os.path.realpath(scaler_path or default_scaler_path())
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Scaler file not found: {path}")
+    return _registered(path, load_scaler_file)
+
+class Served(NamedTuple):
+    model_path: str
+    model: Any  # None with INFERENCE_BACKEND=process (the workers hold the model)
+    scaler: Any
+    model_version: str
+    scaler_version: str
+
+def served(model_path: str | None = None, scaler_path: str | None = None) -> Served:
+    """
+    Model, scaler and both versions from a single registry read. swap() rebinds _live rather
+    than mutating it, so a concurrent swap can't pair the new model with the old scaler or
+    label a prediction with the other model's version.
+    """
+    mpath = model_file(model_path)
+    spath = os.path.realpath(scaler_path or default_scaler_path())
+    if INFERENCE_BACKEND != "process":
+        get_model(mpath)
+    get_scaler(spath)
+    live = _live
+    m, sc = live.get(mpath), live[spath]
+    model_sha = m[1] if m else file_sha256(model_source(mpath))
+    return Served(mpath, m[2] if m else None, sc[2], "sha256:" + model_sha[:16], "sha256:" + sc[1][:16])
+
+# id(model) -> tf.function; the closure keeps the model alive, so ids can't be reused
+_compiled: Dict[int, Any] = {}
+
+def _compiled_call(model):
+    """
+    One tf.function per model. Batch and time dims are None in the signature, so
+    lookbacks 20..120 and any batch size share a single trace (no retracing).
+    """
+    fn = _compiled.get(id(model))
+    if fn is not None:
+        return fn
+    n_features = int(model.input_shape[-1])
+
+    @tf.function(
+        input_signature=[tf.TensorSpec(shape=[None, None, n_features], dtype=tf.float32)],
+        jit_compile=INFERENCE_JIT,
+    )
+    def call(x):
+        return model(x, training=False)
+
+    with _registry_lock:
+        return _compiled.setdefault(id(model), call)
+
+def _bucket(n: int) -> int:
+    for b in BATCH_BUCKETS:
+        if n <= b:
+            return b
+    return BATCH_BUCKETS[-1]
+
+def _run_compiled(model, X: np.ndarray) -> np.ndarray:
+    call = _compiled_call(model)
+    out = np.empty(len(X), dtype=np.float32)
+    step = BATCH_BUCKETS[-1]
+    for i in range(0, len(X), step):
+        chunk = X[i:i + step]
+        n = len(chunk)
+        size = _bucket(n)
+        if size != n:  # zero-pad to the bucket; padded rows are dropped below
+            chunk = np.concatenate([chunk, np.zeros((size - n,) + chunk.shape[1:], dtype=np.float32)])
+        out[i:i + n] = np.asarray(call(tf.constant(chunk))).reshape(-1)[:n]
+    return out
+
+def _predict_direct(model, X: np.ndarray) -> np.ndarray:
+    if isinstance(model, tflite_model.QuantizedModel):
+        return model.predict(X)
+    if INFERENCE_MODE == "predict":
+        return np.asarray(model.predict(X, verbose=0)).reshape(-1)
+    if INFERENCE_MODE == "eager":
+        return np.asarray(model(X, training=False)).reshape(-1)
+    return _run_compiled(model, X)
+
+_batcher = MicroBatcher(_predict_direct, max_batch=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+profiling.register_worker(_batcher.name, _batcher.running)  # TF time of profiled requests
+
+def batcher_stats() -> Dict[str, int]:
+    return dict(_batcher.stats)
+
+def predict_scaled(model, X: np.ndarray) -> np.ndarray:
+    """Run the model on already-scaled windows, X shape (n, lookback, features) → (n,)."""
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    if INFERENCE_BATCHING:
+        return _batcher.submit(model, X, tag=profiling.current()).result()
+    return _predict_direct(model, X)
+
+def infer(X: np.ndarray, model_path: str | None = None, model=None) -> np.ndarray:
+    """
+    Backend-agnostic entry point used by the routers: scaled windows in, scaled
+    predictions out, wherever the model happens to live. Pass `model` (from served()) to
+    run exactly that instance instead of looking the path up again.
+    """
+    path = model_file(model_path)
+    if INFERENCE_BACKEND == "process":
+        out = model_server.get_pool(path).infer(X)
+    else:
+        out = predict_scaled(model if model is not None else get_model(path), X)
+    hook = shadow_hook
+    if hook is not None:
+        hook(path, X, out)  # only queues the candidate's run; never delays the live answer
+    return out
+
+@contextmanager
+def candidate(model_path: str) -> Iterator[Callable[[np.ndarray], np.ndarray]]:
+    """
+    Inference on a model file that is not being served (e.g. /backtest/compare candidates).
+    It is loaded for the duration of the block only, outside the registry and without a cached
+    compiled graph (process backend: a one-worker pool that is shut down on exit), so comparing
+    any number of files never grows the registry or the set of inference processes.
+    """
+    path = model_file(model_path)
+    if INFERENCE_BACKEND == "process":
+        pool = model_server.ModelServerPool(path, workers=1)
+        try:
+            yield pool.infer
+        finally:
+            pool.shutdown()
+        return
+    m = load_model_file(model_source(path))
+    if isinstance(m, tflite_model.QuantizedModel):
+        yield m.predict
+    else:
+        yield lambda X: np.asarray(m(np.asarray(X, dtype=np.float32), training=False)).reshape(-1)
+
+def warm_up(lookbacks: Iterable[int], model_path: str | None = None, scaler_path: str | None = None) -> List[int]:
+    """
+    Load model + scaler and run one dummy (1, lookback, features) inference per lookback,
+    so the first real request doesn't pay for loading and graph tracing.
+    """
+    lookbacks = [int(lb) for lb in lookbacks]
+    scaler = get_scaler(scaler_path)
+    if INFERENCE_BACKEND == "process":
+        # each worker loads the model and traces every lookback in its initializer
+        pids = model_server.get_pool(model_file(model_path), lookbacks).warm_up()
+        print(f"[model] inference processes ready: {pids}")
+        return lookbacks
+    n_features = int(getattr(scaler, "n_features_in_", 5))
+    for lb in lookbacks:
+        infer(np.zeros((1, lb, n_features), dtype=np.float32), model_path)
+    return lookbacks
+
+def predict_next_close(last60: np.ndarray, model_path: str = None, scaler_path: str = None,
+                       snapshot: Served | None = None) -> float:
     """
     Predict the next closing price given last 60 rows of features.
     
@@ -16,30 +345,23 @@ def predict_next_close(last60: np.ndarray, model_path: str = None, scaler_path:
         last60 (np.ndarray): Shape (60, 5) → [Close, High, Low, Open, Volume]
         model_path (str): Optional path to Keras model.
         scaler_path (str): Optional path to saved scaler.
+        snapshot (Served): Optional served() result; model and scaler are taken from it.
 
     Returns:
         float: Predicted close price
     """
-    if model_path is None:
-        model_path = DEFAULT_MODEL_PATH
-    if scaler_path is None:
-        scaler_path = DEFAULT_SCALER_PATH
-
-    # Load model and scaler
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"Model file not found: {model_path}")
-    if not os.path.exists(scaler_path):
-        raise FileNotFoundError(f"Scaler file not found: {scaler_path}")
-
-    model = load_model(model_path, compile=False)
-    scaler = joblib.load(scaler_path)
+    # Cached after the first call (or after readiness warm-up); one snapshot for both
+    snap = snapshot or served(model_path, scaler_path)
+    scaler = snap.scaler
 
     # Scale input
-    scaled_input = scaler.transform(last60)
-    X_input = np.expand_dims(scaled_input, axis=0)  # Shape: (1, 60, 5)
+    with tracing.span("model.scale", rows=len(last60)):
+        scaled_input = scaler.transform(last60)
+        X_input = np.expand_dims(scaled_input, axis=0)  # Shape: (1, 60, 5)
 
     # Predict
-    pred_scaled = model.predict(X_input)
+    with tracing.span("model.infer", mode=INFERENCE_MODE):
+        pred_scaled = infer(X_input, snap.model_path, snap.model).reshape(-1, 1)
     pred_close = scaler.inverse_transform(
         np.hstack([pred_scaled, np.zeros((pred_scaled.shape[0], last60.shape[1] - 1))])
     )[0, 0]
@@ -0,0 +1,133 @@
+# backend/app/core/model_server.py
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterable, List
+
+from .importtime import lazy
+
+np = lazy("numpy")
+
+MODEL_SERVER_WORKERS = int(os.getenv("MODEL_SERVER_WORKERS", "2"))
+
+# ===== Worker side (runs in the spawned processes; TF is only ever imported here) =====
+def _worker_init(model_path: str, lookbacks: List[int]) -> None:
+    from . import model as model_core
+    m = model_core.get_model(model_path)
+    n_features = int(m.input_shape[-1])
+    for lb in lookbacks:
+        model_core._predict_direct(m, np.zeros((1, lb, n_features), dtype=np.float32))
+    print(f"[model-server] worker {os.getpid()} ready (lookbacks {lookbacks})")
+
+def _worker_infer(shm_name: str, shape: tuple, model_path: str):
+    from . import model as model_core
+    shm = SharedMemory(name=shm_name)  # the API process created it and closes + unlinks it
+    try:
+        X = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        out = np.array(model_core._predict_direct(model_core.get_model(model_path), X), dtype=np.float32)
+        del X  # release the exported buffer before close()
+        return out
+    finally:
+        shm.close()
+
+def _worker_ping() -> int:
+    return os.getpid()
+
+# ===== API side =====
+class ModelServerPool:
+    """
+    Small pool of inference processes. Windows are copied into a shared-memory block
+    (no pickling of the tensor); only the (n,) float32 result travels back over the pipe.
+    """
+
+    def __init__(self, model_path: str, workers: int = MODEL_SERVER_WORKERS, lookbacks: Iterable[int] = ()):
+        self.model_path = model_path
+        self.workers = max(1, int(workers))
+        self.lookbacks = [int(x) for x in lookbacks]
+        self._lock = threading.Lock()
+        self._pool = self._start()
+
+    def _start(self) -> ProcessPoolExecutor:
+        print(f"[model-server] starting {self.workers} inference process(es) for {self.model_path}")
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=get_context("spawn"),  # never fork a process that may hold TF/BLAS threads
+            initializer=_worker_init,
+            initargs=(self.model_path, self.lookbacks),
+        )
+
+    def _submit(self, fn, *args):
+        try:
+            return self._pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            with self._lock:
+                print("[model-server] worker died; restarting pool")
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._start()
+            return self._pool.submit(fn, *args).result()
+        except RuntimeError:
+            current = _pools.get(self.model_path)
+            if current is None or current is self:
+                raise
+            return current._submit(fn, *args)  # retired by replace_pool() after this call picked it
+
+    def infer(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        shm = SharedMemory(create=True, size=max(X.nbytes, 1))
+        try:
+            buf = np.ndarray(X.shape, dtype=np.float32, buffer=shm.buf)
+            buf[...] = X
+            del buf
+            return self._submit(_worker_infer, shm.name, X.shape, self.model_path)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def warm_up(self) -> List[int]:
+        """Make sure every worker has been spawned and finished its initializer."""
+        futs = [self._pool.submit(_worker_ping) for _ in range(self.workers)]  # concurrent → one per worker
+        return sorted({f.result() for f in futs})
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def retire(self) -> None:
+        """Stop taking work but let queued and running calls finish (in the background)."""
+        threading.Thread(target=self._pool.shutdown, kwargs={"wait": True},
+                         name="model-server-retire", daemon=True).start()
+
+# One pool per model file (normally just the served one)
+_pools: Dict[str, ModelServerPool] = {}
+_pool_lock = threading.Lock()
+
+def get_pool(model_path: str, lookbacks: Iterable[int] = ()) -> ModelServerPool:
+    pool = _pools.get(model_path)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(model_path)
+            if pool is None:
+                pool = _pools[model_path] = ModelServerPool(model_path, lookbacks=lookbacks)
+    return pool
+
+def replace_pool(model_path: str, lookbacks: Iterable[int] = ()) -> List[int]:
+    """
+    Start and warm a fresh pool (its workers load the model file as it is now), switch
+    new calls over to it, then retire the old pool without cancelling its in-flight work.
+    """
+    new = ModelServerPool(model_path, lookbacks=lookbacks)
+    pids = new.warm_up()
+    with _pool_lock:
+        old, _pools[model_path] = _pools.get(model_path), new
+    if old is not None:
+        old.retire()
+    return pids
+
+def shutdown() -> None:
+    with _pool_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
@@ -0,0 +1,85 @@
+# backend/app/core/prediction_store.py
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+# Per-date backtest predictions keyed by (source, ticker, date, lookback, model_version,
+# scaler_version). A window only contains bars *before* its target date, so a stored prediction
+# never goes stale for the same data source, model and scaler; actual closes are always re-read
+# from fresh market data and are not stored here. The source (yahoo.DATA_SOURCE) is part of the
+# key because synthetic bars under the same ticker would otherwise pass for live ones.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))  # backend/
+STORE_PATH = os.getenv("BACKTEST_STORE_PATH", os.path.join(BASE_DIR, "data", "backtest_store.sqlite3"))
+STORE_ENABLED = os.getenv("BACKTEST_STORE", "true").lower() in ("1", "true", "yes")
+
+_init_lock = threading.Lock()
+_initialized = False
+
+def _connect() -> sqlite3.Connection:
+    global _initialized
+    os.makedirs(os.path.dirname(STORE_PATH), exist_ok=True)
+    conn = sqlite3.connect(STORE_PATH, timeout=30)
+    if not _initialized:
+        with _init_lock:
+            conn.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+            cols = {row[1] for row in conn.execute("PRAGMA table_info(backtest_predictions)")}
+            if cols and not {"scaler_version", "source"} <= cols:
+                # written before the scaler/source was part of the key: can't tell what made them
+                conn.execute("DROP TABLE backtest_predictions")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS backtest_predictions (
+                    source        TEXT    NOT NULL,
+                    ticker        TEXT    NOT NULL,
+                    date          TEXT    NOT NULL,
+                    lookback      INTEGER NOT NULL,
+                    model_version TEXT    NOT NULL,
+                    scaler_version TEXT   NOT NULL,
+                    pred          REAL    NOT NULL,
+                    PRIMARY KEY (source, ticker, lookback, model_version, scaler_version, date)
+                ) WITHOUT ROWID
+            """)
+            conn.commit()
+            _initialized = True
+    return conn
+
+def get_preds(source: str, ticker: str, lookback: int, model_version: str, scaler_version: str,
+              dates: List[str]) -> Dict[str, float]:
+    """Stored predictions for the given ISO dates (missing dates are simply absent)."""
+    if not STORE_ENABLED or not dates:
+        return {}
+    wanted = set(dates)
+    try:
+        conn = _connect()
+        try:
+            cur = conn.execute(
+                "SELECT date, pred FROM backtest_predictions "
+                "WHERE source = ? AND ticker = ? AND lookback = ? AND model_version = ? "
+                "AND scaler_version = ? AND date BETWEEN ? AND ?",
+                (source, ticker, lookback, model_version, scaler_version, min(dates), max(dates)),
+            )
+            return {d: p for d, p in cur if d in wanted}
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"[store] read failed, recomputing everything: {e}")
+        return {}
+
+def put_preds(source: str, ticker: str, lookback: int, model_version: str, scaler_version: str,
+              items: Iterable[Tuple[str, float]]) -> int:
+    if not STORE_ENABLED:
+        return 0
+    rows = [(source, ticker, d, lookback, model_version, scaler_version, float(p)) for d, p in items]
+    if not rows:
+        return 0
+    try:
+        conn = _connect()
+        try:
+            conn.executemany("INSERT OR REPLACE INTO backtest_predictions VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.commit()
+            return len(rows)
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"[store] write failed (results still returned): {e}")
+        return 0
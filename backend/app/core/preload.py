@@ -0,0 +1,32 @@
+# backend/app/core/preload.py
+import gc
+import time
+
+from . import model
+from .importtime import lazy
+
+np = lazy("numpy")
+pd = lazy("pandas")
+
+# ===== Preload-and-fork (gunicorn --preload, see backend/gunicorn.conf.py) =====
+# The master imports the app once. before_fork() then pulls in what is safe to share
+# copy-on-write: numpy/pandas/scikit-learn and the scaler. After that it freezes the GC, so
+# collections in the workers don't touch (and un-share) those pages. TensorFlow is left out
+# on purpose. Its thread pools don't survive fork(), so each worker imports TF and loads the
+# model after forking (readiness warm-up). The weights are tiny; the TF runtime is not: expect
+# roughly 0.5 GB RSS per worker on top of what is shared, and size WEB_CONCURRENCY for it.
+# INFERENCE_BACKEND=process does not share it either: every worker starts its own pool of
+# MODEL_SERVER_WORKERS inference processes, each with its own TF.
+
+def before_fork() -> None:
+    """Runs once in the gunicorn master, after the app is imported and before workers fork."""
+    t0 = time.perf_counter()
+    np.zeros(1)
+    pd.DataFrame()
+    try:
+        model.get_scaler()  # joblib + scikit-learn + the fitted scaler itself
+    except FileNotFoundError as e:
+        print(f"[preload] scaler not preloaded: {e}")
+    gc.collect()
+    gc.freeze()  # everything allocated so far moves to the permanent generation
+    print(f"[preload] shared modules loaded in {time.perf_counter() - t0:.2f}s; forking workers")
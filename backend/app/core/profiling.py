@@ -0,0 +1,210 @@
+# backend/app/core/profiling.py
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from .admin import is_admin_token
+
+# ===== On-demand request profiling =====
+# A request is profiled when an admin asks for it (`X-Profile: 1` or `?profile=1`, together with
+# `X-Admin-Token`) or when it is picked by PROFILE_SAMPLE_RATE on one of PROFILE_PATHS.
+# FastAPI runs sync endpoints on worker threads, which in-thread profilers (cProfile,
+# pyinstrument) can't see from middleware, so this is a small wall-clock sampler instead:
+# every PROFILE_INTERVAL_MS it snapshots all thread stacks and keeps the ones executing this
+# request's endpoint or its dependencies (pandas and HTTP calls show up as leaf frames).
+# Inference runs elsewhere: with INFERENCE_BATCHING the request thread only waits on a Future,
+# so registered workers (the inference batcher) are sampled too, while they run a batch that
+# holds this request's windows. Those stacks are rooted at "[inference-batcher]", and that is
+# where the TensorFlow time appears. With INFERENCE_BACKEND=process the model runs in other
+# processes and only shows up as the wait. The output is collapsed stacks ("a;b;c 42"), which
+# flamegraph.pl, speedscope and inferno read directly. Concurrent requests to the same endpoint
+# can bleed into a profile.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))  # backend/
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "data", "profiles"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))   # 0..1 of matching requests
+PROFILE_PATHS = tuple(p for p in os.getenv("PROFILE_PATHS", "/backtest,/reconcile").split(",") if p)
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))                  # newest profiles kept on disk
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_current: contextvars.ContextVar[Optional["_Sampler"]] = contextvars.ContextVar("profile", default=None)
+_workers: List[Tuple[str, Callable[[], Tuple[Optional[int], tuple]]]] = []
+
+def current() -> Optional["_Sampler"]:
+    """The profiler of the request being handled (None if it isn't profiled): a tag for work queues."""
+    return _current.get()
+
+def register_worker(name: str, running: Callable[[], Tuple[Optional[int], tuple]]) -> None:
+    """running() -> (thread id, tags of the work it is doing now); sampled when a tag is ours."""
+    _workers.append((name, running))
+
+class _Sampler:
+    def __init__(self, scope: Dict[str, Any], interval_s: float):
+        self.scope = scope
+        self.interval_s = interval_s
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._targets: Optional[Set[Any]] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _resolve_targets(self) -> Optional[Set[Any]]:
+        """Code objects of the matched endpoint and its dependencies (known once routing ran)."""
+        endpoint = self.scope.get("endpoint")
+        if endpoint is None:
+            return None
+        codes = {getattr(endpoint, "__code__", None)}
+        route = self.scope.get("route")
+        dependant = getattr(route, "dependant", None)
+        todo = list(getattr(dependant, "dependencies", []))
+        while todo:
+            dep = todo.pop()
+            call = getattr(dep, "call", None)
+            codes.add(getattr(call, "__code__", None) or getattr(getattr(call, "__call__", None), "__code__", None))
+            todo.extend(dep.dependencies)
+        codes.discard(None)
+        return codes
+
+    def _loop(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            if self._targets is None:
+                self._targets = self._resolve_targets()
+                if self._targets is None:
+                    continue
+            frames = sys._current_frames()
+            for name, running in _workers:
+                tid, tags = running()
+                if tid in frames and self in tags:
+                    self.stacks[";".join([f"[{name}]"] + self._stack(frames.pop(tid)))] += 1
+            for tid, frame in frames.items():
+                if tid == me:
+                    continue
+                stack: List[str] = []
+                hit = False
+                f = frame
+                while f is not None:
+                    code = f.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    if code in self._targets:
+                        hit = True
+                        break  # cut the stack at the endpoint/dependency frame
+                    f = f.f_back
+                if hit:
+                    self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    @staticmethod
+    def _stack(frame) -> List[str]:
+        """Root-first frames of a whole thread stack."""
+        stack: List[str] = []
+        while frame is not None:
+            stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+            frame = frame.f_back
+        return stack[::-1]
+
+def _wanted(request: Request) -> bool:
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    if flag and flag not in ("0", "false") and is_admin_token(request.headers.get("x-admin-token")):
+        return True
+    return (PROFILE_SAMPLE_RATE > 0 and request.url.path.startswith(PROFILE_PATHS)
+            and random.random() < PROFILE_SAMPLE_RATE)
+
+def _save(profile_id: str, meta: Dict[str, Any], stacks: Counter) -> None:
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.folded"), "w", encoding="utf-8") as fh:
+            for stack, n in stacks.most_common():
+                fh.write(f"{stack} {n}\n")
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+        metas = sorted((m for m in list_profiles()), key=lambda m: m["started_at"], reverse=True)
+        for old in metas[PROFILE_KEEP:]:
+            for ext in (".folded", ".json"):
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, old["id"] + ext))
+                except OSError:
+                    pass
+    except OSError as e:
+        print(f"[profile] could not store profile {profile_id}: {e}")
+
+def _top_frames(stacks: Counter, n: int = 15) -> List[Dict[str, Any]]:
+    """Leaf ('self') time per frame: where the samples were actually spent."""
+    leaf: Counter = Counter()
+    for stack, k in stacks.items():
+        leaf[stack.rsplit(";", 1)[-1]] += k
+    total = sum(leaf.values()) or 1
+    return [{"frame": f, "samples": k, "pct": round(100.0 * k / total, 1)} for f, k in leaf.most_common(n)]
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        if not _wanted(request):
+            return await call_next(request)
+
+        profile_id = uuid.uuid4().hex
+        sampler = _Sampler(request.scope, PROFILE_INTERVAL_MS / 1000.0)
+        started = time.time()
+        sampler.start()
+        token = _current.set(sampler)  # follows the request into the threadpool
+        try:
+            response = await call_next(request)
+        finally:
+            _current.reset(token)
+            sampler.stop()
+        duration_ms = (time.time() - started) * 1000.0
+        meta = {
+            "id": profile_id, "method": request.method, "path": request.url.path,
+            "query": str(request.url.query), "status": response.status_code,
+            "started_at": started, "duration_ms": round(duration_ms, 1),
+            "samples": sampler.samples, "interval_ms": PROFILE_INTERVAL_MS,
+            "top_frames": _top_frames(sampler.stacks),
+        }
+        _save(profile_id, meta, sampler.stacks)
+        print(f"[profile] {request.method} {request.url.path} {duration_ms:.0f} ms -> {profile_id}")
+        response.headers["X-Profile-Id"] = profile_id
+        return response
+
+# ===== Stored profiles =====
+def list_profiles() -> List[Dict[str, Any]]:
+    out = []
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except OSError:
+        return out
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+            meta.pop("top_frames", None)
+            out.append(meta)
+        except (OSError, ValueError):
+            continue
+    return sorted(out, key=lambda m: m["started_at"], reverse=True)
+
+def profile_path(profile_id: str, ext: str) -> Optional[str]:
+    if not _ID_RE.match(profile_id):  # ids are uuid hex: never let a path segment through
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + ext)
+    return path if os.path.exists(path) else None
@@ -0,0 +1,157 @@
+# backend/app/core/quantize.py
+"""
+Build reduced-precision variants of the LSTM and check them against the float32 model.
+
+    cd backend
+    python -m app.core.quantize                          # fp16 + int8, parity on ~2y of history
+    python -m app.core.quantize --precision int8 --lookbacks 20,60,120 --max-mae-delta 1.0
+    python -m app.core.quantize --model lstm_v2.h5 --scaler scaler_v2.save   # not the served model
+
+Writes <model>.<precision>.tflite and <model>.<precision>.parity.json next to the Keras file.
+Parity scales the windows with the scaler the model was trained with: the served one by
+default, so --scaler is required whenever --model is not the served model. Serve a variant
+with MODEL_PRECISION=fp16|int8. The command exits with status 1 when a variant's MAE
+grows by more than --max-mae-delta points or its directional accuracy drops by more than
+--max-dir-acc-drop points.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+from . import model, tflite_model, yahoo
+from .importtime import lazy
+
+np = lazy("numpy")
+tf = lazy("tensorflow")
+
+FEATURES = ["Close", "High", "Low", "Open", "Volume"]
+
+# ===== Conversion =====
+def convert(model_path: str, precision: str, batch: int) -> str:
+    """
+    fp16: weights stored as float16. int8: dynamic-range quantization (int8 weights, float
+    activations), which the LSTM's recurrent loop supports without a calibration set.
+    """
+    keras_model = tf.keras.models.load_model(model_path, compile=False)
+    n_features = int(keras_model.input_shape[-1])
+    inp = tf.keras.Input(shape=(None, n_features), batch_size=batch)  # static batch, any lookback
+    converter = tf.lite.TFLiteConverter.from_keras_model(tf.keras.Model(inp, keras_model(inp)))
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if precision == "fp16":
+        converter.target_spec.supported_types = [tf.float16]
+    content = converter.convert()
+
+    out = tflite_model.quantized_path(model_path, precision)
+    tmp = out + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(content)
+    os.replace(tmp, out)  # a hot-swap watcher never sees half a file
+    return out
+
+# ===== Accuracy parity on historical windows =====
+def _timed(fn, X) -> tuple:
+    t0 = time.perf_counter()
+    out = fn(X)
+    return out, (time.perf_counter() - t0) * 1000.0
+
+def _metrics(pred, prev_close, actual) -> Dict[str, float]:
+    hit = np.sign(pred - prev_close) == np.sign(actual - prev_close)
+    return {"MAE": round(float(np.abs(pred - actual).mean()), 4),
+            "Directional_Accuracy_pct": round(100.0 * float(hit.mean()), 2)}
+
+def parity(model_path: str, scaler_path: str, quantized: str, lookbacks: List[int], days: int) -> Dict[str, Any]:
+    scaler = model.load_scaler_file(scaler_path)
+    reference = tf.keras.models.load_model(model_path, compile=False)
+    candidate = tflite_model.QuantizedModel(quantized)
+    raw = yahoo.fetch_ohlc(days)
+    scaled = scaler.transform(raw[FEATURES].values)
+    closes = raw["Close"].to_numpy(dtype=float)
+
+    def unscale(p):
+        dummy = np.zeros((len(p), len(FEATURES)))
+        dummy[:, 0] = p  # Close is feature 0
+        return scaler.inverse_transform(dummy)[:, 0]
+
+    out: Dict[str, Any] = {"model": os.path.basename(model_path), "scaler": os.path.basename(scaler_path),
+                           "variant": os.path.basename(quantized),
+                           "model_bytes": os.path.getsize(model_path), "variant_bytes": os.path.getsize(quantized),
+                           "days": days, "lookbacks": {}}
+    for lb in lookbacks:
+        idxs = np.arange(lb, len(raw))
+        if len(idxs) == 0:
+            continue
+        views = np.lib.stride_tricks.sliding_window_view(scaled, lb, axis=0)
+        X = np.ascontiguousarray(views[idxs - lb].transpose(0, 2, 1), dtype=np.float32)
+        # untimed first pass at the same shape: graph tracing (Keras, per batch bucket) and
+        # interpreter setup (TFLite, per lookback) are one-offs that serving pays at warm-up
+        model._predict_direct(reference, X)
+        candidate.predict(X)
+        ref_scaled, ref_ms = _timed(lambda x: model._predict_direct(reference, x), X)
+        cand_scaled, cand_ms = _timed(candidate.predict, X)
+        ref, cand = unscale(ref_scaled), unscale(cand_scaled)
+        prev_close, actual = closes[idxs - 1], closes[idxs]
+        m_ref, m_cand = _metrics(ref, prev_close, actual), _metrics(cand, prev_close, actual)
+        out["lookbacks"][str(lb)] = {
+            "windows": int(len(idxs)),
+            "fp32": {**m_ref, "ms": round(ref_ms, 1)},
+            "variant": {**m_cand, "ms": round(cand_ms, 1)},
+            "MAE_delta": round(m_cand["MAE"] - m_ref["MAE"], 4),
+            "Directional_Accuracy_delta_pct": round(m_cand["Directional_Accuracy_pct"] - m_ref["Directional_Accuracy_pct"], 2),
+            "pred_abs_diff_mean": round(float(np.abs(cand - ref).mean()), 4),
+            "pred_abs_diff_max": round(float(np.abs(cand - ref).max()), 4),
+        }
+    return out
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.core.quantize", description=__doc__.split("\n\n")[0].strip())
+    ap.add_argument("--model", default=None, help="Keras model file (default: the served model)")
+    ap.add_argument("--scaler", default=None, help="scaler the model was trained with (required unless --model is the served model)")
+    ap.add_argument("--precision", default="all", choices=("all",) + tflite_model.PRECISIONS)
+    ap.add_argument("--batch", type=int, default=16, help="static batch size baked into the TFLite graph")
+    ap.add_argument("--lookbacks", default=os.getenv("LOOKBACK", "60"), help="comma-separated, e.g. 20,60,120")
+    ap.add_argument("--days", type=int, default=730, help="calendar days of history for the parity report")
+    ap.add_argument("--max-mae-delta", type=float, default=None, help="fail if MAE grows by more (points)")
+    ap.add_argument("--max-dir-acc-drop", type=float, default=None, help="fail if directional accuracy drops by more (pct points)")
+    args = ap.parse_args(argv)
+
+    model_path = model.model_file(args.model or model.default_model_path())
+    if args.scaler:
+        scaler_path = os.path.realpath(args.scaler)
+    elif model_path == model.model_file(model.default_model_path()):
+        scaler_path = os.path.realpath(model.default_scaler_path())
+    else:
+        ap.error("--scaler is required when --model is not the served model (parity needs the scaler it was trained with)")
+    if not os.path.exists(scaler_path):
+        ap.error(f"scaler file not found: {scaler_path}")
+    precisions = tflite_model.PRECISIONS if args.precision == "all" else (args.precision,)
+    lookbacks = [int(x) for x in args.lookbacks.split(",") if x.strip()]
+    ok = True
+    for precision in precisions:
+        t0 = time.perf_counter()
+        path = convert(model_path, precision, args.batch)
+        print(f"[quantize] {precision}: wrote {path} in {time.perf_counter() - t0:.1f}s")
+        report = parity(model_path, scaler_path, path, lookbacks, args.days)
+        report_path = os.path.splitext(path)[0] + ".parity.json"
+        with open(report_path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"[quantize] {precision}: {report['model_bytes']} -> {report['variant_bytes']} bytes; report {report_path}")
+        for lb, r in report["lookbacks"].items():
+            print(f"  lookback {lb:>3}: MAE {r['fp32']['MAE']} -> {r['variant']['MAE']} ({r['MAE_delta']:+}), "
+                  f"dir.acc {r['fp32']['Directional_Accuracy_pct']} -> {r['variant']['Directional_Accuracy_pct']} "
+                  f"({r['Directional_Accuracy_delta_pct']:+}), {r['fp32']['ms']} ms -> {r['variant']['ms']} ms "
+                  f"for {r['windows']} windows")
+            if args.max_mae_delta is not None and r["MAE_delta"] > args.max_mae_delta:
+                ok = False
+            if args.max_dir_acc_drop is not None and -r["Directional_Accuracy_delta_pct"] > args.max_dir_acc_drop:
+                ok = False
+    if not ok:
+        print("[quantize] ❌ a variant exceeds the allowed accuracy loss; don't serve it")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# backend/app/core/readiness.py
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+from . import model, yahoo
+
+# Lookbacks to pre-trace (backtest allows 20..120; /predict always uses 60)
+WARMUP_LOOKBACKS: List[int] = [
+    int(x) for x in os.getenv("WARMUP_LOOKBACKS", os.getenv("LOOKBACK", "60")).split(",") if x.strip()
+]
+# fetch_ohlc(days) calls made by /predict and /ohlc
+WARMUP_OHLC_DAYS: List[int] = [
+    int(x) for x in os.getenv("WARMUP_OHLC_DAYS", "120,180").split(",") if x.strip()
+]
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "15"))
+
+_state: Dict[str, Any] = {
+    "model_loaded": False,
+    "warmed_lookbacks": [],
+    "ohlc_primed": False,
+    "started_at": None,
+    "ready_at": None,
+    "last_error": None,
+}
+_lock = threading.Lock()
+_thread: threading.Thread | None = None
+
+def _set(**kw) -> None:
+    with _lock:
+        _state.update(kw)
+
+def _snapshot() -> Dict[str, Any]:
+    """Copy of _state made under the lock (lists copied too), safe to read anywhere."""
+    with _lock:
+        return {k: list(v) if isinstance(v, list) else v for k, v in _state.items()}
+
+def is_ready() -> bool:
+    with _lock:
+        return _state["ready_at"] is not None
+
+def status() -> Dict[str, Any]:
+    out = _snapshot()
+    out["ready"] = out["ready_at"] is not None
+    out["expected_lookbacks"] = WARMUP_LOOKBACKS
+    out["inference_batches"] = model.batcher_stats()
+    return out
+
+def _warm_up() -> None:
+    """Load registry → dummy inference per lookback → prime OHLC cache. Retries until all pass."""
+    _set(started_at=time.time())
+    while True:
+        try:
+            st = _snapshot()
+            if not st["model_loaded"] or st["warmed_lookbacks"] != WARMUP_LOOKBACKS:
+                t0 = time.perf_counter()
+                done = model.warm_up(WARMUP_LOOKBACKS)
+                _set(model_loaded=True, warmed_lookbacks=list(done))
+                print(f"[ready] model warm-up for lookbacks {done} took {time.perf_counter() - t0:.2f}s")
+            if not st["ohlc_primed"]:
+                yahoo.prime_ohlc_cache(WARMUP_OHLC_DAYS)
+                _set(ohlc_primed=True)
+                print(f"[ready] OHLC cache primed for days={WARMUP_OHLC_DAYS}")
+            _set(ready_at=time.time(), last_error=None)
+            print("[ready] ✅ worker is ready for traffic")
+            return
+        except Exception as e:
+            _set(last_error=str(e))
+            print(f"[ready] warm-up not finished: {e}. Retrying in {WARMUP_RETRY_SECONDS}s...")
+            time.sleep(WARMUP_RETRY_SECONDS)
+
+def start() -> None:
+    """Kick off warm-up in a daemon thread (idempotent)."""
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_warm_up, name="readiness-warmup", daemon=True)
+    _thread.start()
@@ -0,0 +1,228 @@
+# backend/app/core/reconcile_job.py
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from . import depmonitor, history_stats, supa, tracing
+from .yahoo import fetch_ohlc_since
+
+# ===== Shared reconcile maths (per-user endpoint + batch job) =====
+ACTUAL_LOOKAHEAD_DAYS = 4  # prediction_for may land on a holiday: take the next close within this
+
+def close_map(df) -> Dict[str, float]:
+    """ISO date -> close for a daily OHLC frame."""
+    if df is None or df.empty:
+        return {}
+    idx = df.index.tz_localize(None) if getattr(df.index, "tz", None) else df.index
+    return dict(zip(idx.strftime("%Y-%m-%d"), df["Close"].astype(float)))
+
+def actual_for(prediction_for: str, closes: Dict[str, float]) -> Optional[float]:
+    dt = date.fromisoformat(prediction_for)
+    for _ in range(ACTUAL_LOOKAHEAD_DAYS):
+        key = dt.isoformat()
+        if key in closes:
+            return closes[key]
+        dt = dt + timedelta(days=1)
+    return None
+
+def _safe_float(x) -> Optional[float]:
+    try:
+        return float(x) if x is not None else None
+    except Exception:
+        return None
+
+def patch_for(row: Dict[str, Any], actual: float) -> Dict[str, Any]:
+    """actual_close plus the error/direction columns derived from it."""
+    last = _safe_float(row.get("last_close"))
+    pred = _safe_float(row.get("predicted_close"))
+    patch: Dict[str, Any] = {"actual_close": actual}
+
+    if pred is not None:
+        err = pred - actual
+        patch["abs_error"] = abs(err)
+        patch["pct_error"] = (abs(err) / actual) if actual else None
+
+    if last is not None and pred is not None:
+        up_pred = 1 if pred >= last else -1
+        up_real = 1 if actual >= last else -1
+        patch["direction_hit"] = (up_pred == up_real)
+    return patch
+
+# ===== Cross-user batch job =====
+# One pass over every user's pending rows: market data is fetched once, rows are grouped by
+# prediction_for (all rows for a date share one actual close) and written back with parallel
+# conditional PATCHes of just the reconcile columns. A PATCH only lands if the row still has
+# no actual and the same prediction_for, so a concurrent edit (e.g. /repair_prediction_for)
+# is never overwritten from the stale page; such rows count as skipped and are picked up by
+# the next run. (A bulk upsert can't do this: it writes whole rows, NOT NULL columns included.)
+# Progress and the keyset cursor are persisted after every page, so a crash, restart or
+# cancel resumes where it stopped instead of rescanning the backlog.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))  # backend/
+STATE_PATH = os.getenv("RECONCILE_JOB_STATE", os.path.join(BASE_DIR, "data", "reconcile_job.json"))
+PAGE_ROWS = int(os.getenv("RECONCILE_JOB_PAGE_ROWS", "1000"))
+WRITE_CONCURRENCY = int(os.getenv("RECONCILE_JOB_WRITE_CONCURRENCY", "8"))  # PATCHes in flight
+# Only what patch_for() and the filters need
+JOB_COLUMNS = "id,user_id,prediction_for,last_close,predicted_close"
+INTERVAL_SECONDS = int(os.getenv("RECONCILE_JOB_INTERVAL", "0"))  # >0: run on a schedule
+
+_state: Dict[str, Any] = {}
+_lock = threading.Lock()
+_cancel = threading.Event()
+_thread: Optional[threading.Thread] = None
+_writers = ThreadPoolExecutor(max_workers=max(1, WRITE_CONCURRENCY), thread_name_prefix="reconcile-write")
+
+def _fresh_state() -> Dict[str, Any]:
+    return {"status": "idle", "cursor": None, "scanned": 0, "updated": 0, "skipped": 0,
+            "failed": 0, "dates": 0, "users": 0, "started_at": None, "finished_at": None, "error": None}
+
+def _load_state() -> Dict[str, Any]:
+    try:
+        with open(STATE_PATH, "r", encoding="utf-8") as fh:
+            return {**_fresh_state(), **json.load(fh)}
+    except (OSError, ValueError):
+        return _fresh_state()
+
+def _save_state() -> None:
+    try:
+        os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+        tmp = STATE_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(_state, fh)
+        os.replace(tmp, STATE_PATH)  # never leave a half-written state file
+    except OSError as e:
+        print(f"[reconcile-job] could not persist progress: {e}")
+
+def _update(**kw) -> None:
+    with _lock:
+        _state.update(kw)
+        _save_state()
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        if not _state:
+            _state.update(_load_state())
+        return dict(_state, running=_thread is not None and _thread.is_alive())
+
+def _get(params: str) -> List[Dict[str, Any]]:
+    with tracing.span("supabase.select", **{"db.table": supa.TABLE}) as s:
+        r = requests.get(f"{supa.REST}/{supa.TABLE}?{params}", headers=supa.HEADERS, timeout=30)
+        s.set(**{"http.status_code": r.status_code})
+    r.raise_for_status()
+    return r.json() or []
+
+def _write_one(row: Dict[str, Any], patch: Dict[str, Any]) -> str:
+    try:
+        n = supa.update_prediction(row["id"], patch, user_id=row.get("user_id"), where={
+            "actual_close": "is.null", "prediction_for": f"eq.{row['prediction_for']}"})
+        return "updated" if n else "stale"
+    except Exception as e:
+        print(f"[reconcile-job] update failed for id={row.get('id')}: {e}")
+        return "failed"
+
+def _write(items: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Tuple[int, int]:
+    """PATCH each (row, patch) pair; returns (failed, stale) counts."""
+    outcomes = list(_writers.map(tracing.run_in_context(lambda item: _write_one(*item)), items))
+    return outcomes.count("failed"), outcomes.count("stale")
+
+def _run() -> None:
+    try:
+        first = _get("select=prediction_for&actual_close=is.null&order=prediction_for.asc&limit=1")
+        today = date.today()
+        if not first or date.fromisoformat(first[0]["prediction_for"]) > today:
+            _update(status="done", finished_at=time.time())
+            return
+        closes = close_map(fetch_ohlc_since(date.fromisoformat(first[0]["prediction_for"])))
+        print(f"[reconcile-job] market data loaded once: {len(closes)} closes")
+
+        users = set()
+        while not _cancel.is_set():
+            params = f"select={JOB_COLUMNS}&actual_close=is.null&order=id.asc&limit={PAGE_ROWS}"
+            if _state["cursor"] is not None:
+                params += f"&id=gt.{_state['cursor']}"
+            page = _get(params)
+            if not page:
+                break
+
+            by_date: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            for row in page:
+                if row.get("prediction_for"):
+                    by_date[row["prediction_for"]].append(row)
+
+            out, skipped = [], len(page) - sum(len(v) for v in by_date.values())
+            for pf, group in by_date.items():
+                actual = actual_for(pf, closes)  # one lookup per date, shared by every user
+                if actual is None:
+                    skipped += len(group)
+                    continue
+                for row in group:
+                    out.append((row, patch_for(row, actual)))
+            failed, stale = _write(out)
+            users.update(row.get("user_id") for row, _ in out)
+
+            _update(
+                cursor=page[-1]["id"],
+                scanned=_state["scanned"] + len(page),
+                updated=_state["updated"] + len(out) - failed - stale,
+                skipped=_state["skipped"] + skipped + stale,
+                failed=_state["failed"] + failed,
+                dates=_state["dates"] + len(by_date),
+                users=len(users),
+            )
+            print(f"[reconcile-job] {_state['scanned']} scanned, {_state['updated']} updated")
+            if len(page) < PAGE_ROWS:
+                break
+
+        for uid in users:
+            history_stats.invalidate(uid)
+        if _cancel.is_set():
+            _update(status="cancelled")  # cursor kept: start() resumes from here
+        else:
+            _update(status="done", cursor=None, finished_at=time.time())
+    except Exception as e:
+        print(f"[reconcile-job] failed: {e}")
+        _update(status="failed", error=str(e))  # cursor kept for resume
+
+def start(restart: bool = False) -> bool:
+    """Start (or resume an interrupted) batch run. False if one is already running."""
+    global _thread
+    status()  # make sure persisted progress is loaded
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return False
+        resume = not restart and _state["status"] in ("running", "failed", "cancelled") and _state["cursor"]
+        if not resume:
+            _state.update(_fresh_state())
+        _state.update(status="running", started_at=time.time(), finished_at=None, error=None)
+        _save_state()
+        _cancel.clear()
+        _thread = threading.Thread(target=_run, name="reconcile-job", daemon=True)
+        _thread.start()
+    print(f"[reconcile-job] {'resuming from ' + str(_state['cursor']) if resume else 'started'}")
+    return True
+
+def cancel() -> bool:
+    if _thread is None or not _thread.is_alive():
+        return False
+    _cancel.set()
+    return True
+
+def _schedule_loop() -> None:
+    while True:
+        time.sleep(INTERVAL_SECONDS)
+        if supa.REST and depmonitor.is_up("supabase"):
+            start()
+
+def start_schedule() -> None:
+    """Run the batch job every RECONCILE_JOB_INTERVAL seconds (no-op when 0)."""
+    if INTERVAL_SECONDS > 0:
+        threading.Thread(target=_schedule_loop, name="reconcile-schedule", daemon=True).start()
+        print(f"[reconcile-job] scheduled every {INTERVAL_SECONDS}s")
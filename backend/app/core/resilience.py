@@ -0,0 +1,107 @@
+# backend/app/core/resilience.py
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "3"))        # consecutive failures to open
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "60"))     # seconds to skip an open source
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "50"))           # recent samples kept per source
+
+class CircuitBreaker:
+    """
+    closed → (N consecutive failures) → open: skipped for `cooldown` seconds
+    → half-open: one trial call allowed; success closes it, failure re-opens it.
+    """
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.failures = failures
+        self.cooldown = cooldown
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.time() - self._opened_at < self.cooldown or self._trial_running:
+                return False
+            self._trial_running = True  # half-open: let exactly one caller probe the source
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"[breaker] {self.name} closed again")
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._consecutive >= self.failures:
+                if self._opened_at is None:
+                    print(f"[breaker] {self.name} opened after {self._consecutive} failures; "
+                          f"skipping it for {self.cooldown:.0f}s")
+                self._opened_at = time.time()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "open" if time.time() - self._opened_at < self.cooldown else "half_open"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self._consecutive}
+
+class LatencyStats:
+    """Rolling window of successful call latencies (seconds)."""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            data = sorted(self._samples)
+        if not data:
+            return None
+        k = min(len(data) - 1, max(0, int(round(p / 100.0 * (len(data) - 1)))))
+        return data[k]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "samples": len(self._samples),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+# ===== Per-source registry =====
+_breakers: Dict[str, CircuitBreaker] = {}
+_latency: Dict[str, LatencyStats] = {}
+_registry_lock = threading.Lock()
+
+def breaker(name: str) -> CircuitBreaker:
+    with _registry_lock:
+        return _breakers.setdefault(name, CircuitBreaker(name))
+
+def latency(name: str) -> LatencyStats:
+    with _registry_lock:
+        return _latency.setdefault(name, LatencyStats())
+
+def sources_status() -> Dict[str, Dict[str, Any]]:
+    with _registry_lock:
+        names = sorted(set(_breakers) | set(_latency))
+    return {n: {**breaker(n).snapshot(), **latency(n).snapshot()} for n in names}
@@ -0,0 +1,162 @@
+# backend/app/core/shared_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from .importtime import lazy
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locks, each worker simply fetches for itself
+    fcntl = None
+
+np = lazy("numpy")
+pd = lazy("pandas")
+
+# ===== Cross-worker cache (multi-process deployments) =====
+# With several uvicorn/gunicorn workers, every process used to download the same OHLC window
+# and run the same /predict inference. With SHARED_CACHE on, workers share results through
+# files in SHARED_CACHE_DIR:
+#   ohlc_<days>.npy   structured array (ts + OHLCV), read back with np.load(mmap_mode="r")
+#   predictions.json  latest /predict outputs keyed by model/scaler version + window digest
+#   model_target.json the last admin model reload, which every worker's hotswap sync applies
+# Writers hold an flock and replace files atomically, so readers never see a partial file.
+# The first worker to fetch a window does the download while the others wait on the lock and
+# then read its snapshot.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))  # backend/
+SHARED_CACHE = os.getenv("SHARED_CACHE", "false").lower() in ("1", "true", "yes")
+SHARED_CACHE_DIR = os.getenv("SHARED_CACHE_DIR", os.path.join(BASE_DIR, "data", "shared"))
+PREDICTION_SNAPSHOT_KEEP = int(os.getenv("PREDICTION_SNAPSHOT_KEEP", "32"))
+
+_OHLC_FIELDS = ("Open", "High", "Low", "Close", "Volume")
+_claims: Dict[str, Any] = {}
+
+def _path(name: str) -> str:
+    return os.path.join(SHARED_CACHE_DIR, name)
+
+def _replace(name: str, write) -> None:
+    """Write via a per-process temp file, then rename over the target (atomic on POSIX)."""
+    os.makedirs(SHARED_CACHE_DIR, exist_ok=True)
+    tmp = _path(f".{name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as fh:
+        write(fh)
+    os.replace(tmp, _path(name))
+
+@contextmanager
+def file_lock(name: str) -> Iterator[None]:
+    """Exclusive lock across worker processes (no-op when disabled or without fcntl)."""
+    if not SHARED_CACHE or fcntl is None:
+        yield
+        return
+    os.makedirs(SHARED_CACHE_DIR, exist_ok=True)
+    with open(_path(f"{name}.lock"), "a+") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+def claim(role: str) -> bool:
+    """
+    True in exactly one process for `role` (the first to ask keeps a lock for its lifetime),
+    for once-per-deployment work such as schedulers. Always True when sharing is off.
+    """
+    if not SHARED_CACHE or fcntl is None:
+        return True
+    if role in _claims:
+        return True
+    os.makedirs(SHARED_CACHE_DIR, exist_ok=True)
+    fh = open(_path(f"{role}.claim"), "a+")
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        fh.close()
+        return False
+    _claims[role] = fh  # released by the OS when this process exits
+    return True
+
+# ===== OHLC snapshot =====
+def load_ohlc(days: int, max_age: float) -> Optional[pd.DataFrame]:
+    """A snapshot another worker stored less than max_age seconds ago, else None."""
+    if not SHARED_CACHE:
+        return None
+    path = _path(f"ohlc_{days}.npy")
+    try:
+        if time.time() - os.path.getmtime(path) >= max_age:
+            return None
+        arr = np.load(path, mmap_mode="r")
+        with open(_path(f"ohlc_{days}.json"), "r", encoding="utf-8") as fh:
+            tz = json.load(fh).get("tz")
+    except (OSError, ValueError):
+        return None
+    idx = pd.DatetimeIndex(np.asarray(arr["ts"]).astype("datetime64[ns]"), name="Date")
+    if tz:
+        idx = idx.tz_localize(tz)
+    return pd.DataFrame({c: np.asarray(arr[c]) for c in _OHLC_FIELDS}, index=idx)
+
+def store_ohlc(days: int, df: pd.DataFrame) -> None:
+    if not SHARED_CACHE or df is None or df.empty:
+        return
+    idx = pd.DatetimeIndex(df.index)
+    arr = np.empty(len(df), dtype=[("ts", "i8")] + [(c, "f8") for c in _OHLC_FIELDS])
+    arr["ts"] = (idx.tz_localize(None) if idx.tz is not None else idx).asi8  # wall clock; tz kept aside
+    for c in _OHLC_FIELDS:
+        arr[c] = df[c].to_numpy(dtype="f8")
+    try:
+        _replace(f"ohlc_{days}.json", lambda fh: fh.write(json.dumps({"tz": str(idx.tz) if idx.tz else None}).encode()))
+        _replace(f"ohlc_{days}.npy", lambda fh: np.save(fh, arr))
+    except OSError as e:
+        print(f"[shared-cache] could not store OHLC snapshot: {e}")
+
+# ===== Prediction snapshot =====
+def prediction_key(model_version: str, scaler_version: str, window) -> str:
+    digest = hashlib.sha1(np.ascontiguousarray(window, dtype=np.float64).tobytes()).hexdigest()
+    return f"{model_version}|{scaler_version}|{digest}"
+
+def _read_predictions() -> Dict[str, Any]:
+    try:
+        with open(_path("predictions.json"), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+def get_prediction(key: str) -> Optional[float]:
+    if not SHARED_CACHE:
+        return None
+    hit = _read_predictions().get(key)
+    return float(hit["pred"]) if hit else None
+
+def put_prediction(key: str, pred: float) -> None:
+    if not SHARED_CACHE:
+        return
+    try:
+        with file_lock("predictions"):
+            snap = _read_predictions()
+            snap[key] = {"pred": float(pred), "at": time.time()}
+            newest = sorted(snap.items(), key=lambda kv: kv[1]["at"])[-PREDICTION_SNAPSHOT_KEEP:]
+            _replace("predictions.json", lambda fh: fh.write(json.dumps(dict(newest)).encode()))
+    except OSError as e:
+        print(f"[shared-cache] could not store prediction snapshot: {e}")
+
+# ===== Model target (admin reloads reach every worker) =====
+def publish_model_target(model_name: Optional[str], scaler_name: Optional[str]) -> int:
+    """Record a reload for all workers; returns its sequence number."""
+    with file_lock("model_target"):
+        seq = int((read_model_target() or {}).get("seq", 0)) + 1
+        record = {"seq": seq, "model": model_name, "scaler": scaler_name, "at": time.time()}
+        _replace("model_target.json", lambda fh: fh.write(json.dumps(record).encode()))
+    return seq
+
+def read_model_target() -> Optional[Dict[str, Any]]:
+    if not SHARED_CACHE:
+        return None
+    try:
+        with open(_path("model_target.json"), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
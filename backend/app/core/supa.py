@@ -2,28 +2,22 @@
 import os
 import json
 import requests
-from dotenv import load_dotenv, dotenv_values
+from dotenv import dotenv_values
 
 # ===== Load and clean .env =====
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))  # backend/
 ENV_PATH = os.path.join(BASE_DIR, ".env")
 
-load_dotenv(ENV_PATH)  # normal load
-vals = dotenv_values(ENV_PATH)  # raw parse
-
-# Remove BOM from keys if present
-clean_vals = {}
+# Parse the file once; real env vars win, same as load_dotenv(override=False)
+vals = dotenv_values(ENV_PATH)
 for k, v in (vals or {}).items():
     clean_k = k.replace("\ufeff", "")  # remove BOM
-    clean_vals[clean_k] = v
     if k != clean_k:
         print(f"[env] cleaned key '{k}' -> '{clean_k}'")
+    if v is not None and not os.getenv(clean_k):
+        os.environ[clean_k] = v
 
-# Ensure env vars are set for anything the app reads later
-for k in ("SUPABASE_URL", "SUPABASE_SERVICE_ROLE_KEY", "SUPABASE_JWT_SECRET"):
-    if not os.getenv(k) and clean_vals.get(k):
-        os.environ[k] = clean_vals[k]
-        print(f"[env] set {k} from cleaned .env")
+from . import tracing  # after the .env export: tracing reads its settings at import
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
@@ -49,8 +43,10 @@ def insert_prediction(row: dict) -> dict:
     """
     if not REST:
         raise RuntimeError("Supabase REST endpoint not configured")
-    r = requests.post(f"{REST}/{TABLE}", headers=HEADERS, data=json.dumps(row), timeout=30)
-    r.raise_for_status()
+    with tracing.span("supabase.insert", **{"db.table": TABLE}) as s:
+        r = requests.post(f"{REST}/{TABLE}", headers=HEADERS, data=json.dumps(row), timeout=30)
+        s.set(**{"http.status_code": r.status_code})
+        r.raise_for_status()
     return r.json()[0]
 
 def list_predictions(limit: int = 500) -> list:
@@ -60,30 +56,41 @@ def list_predictions(limit: int = 500) -> list:
     if not REST:
         raise RuntimeError("Supabase REST endpoint not configured")
     url = f"{REST}/{TABLE}?select=*&order=generated_at.desc&limit={limit}"
-    r = requests.get(url, headers=HEADERS, timeout=30)
-    r.raise_for_status()
+    with tracing.span("supabase.select", **{"db.table": TABLE, "limit": limit}) as s:
+        r = requests.get(url, headers=HEADERS, timeout=30)
+        s.set(**{"http.status_code": r.status_code})
+        r.raise_for_status()
     return r.json()
 
-def update_prediction(pred_id: str, patch: dict, user_id: str | None = None) -> None:
+def update_prediction(pred_id: str, patch: dict, user_id: str | None = None, where: dict | None = None) -> int:
     """
     Update a prediction by id. If user_id is provided, also require it to match,
     which prevents accidental cross-user updates when using service_role.
+    `where` adds PostgREST filters (e.g. {"actual_close": "is.null"}) so the write only
+    lands if the row still looks the way it did when it was read. Returns rows updated.
     """
     if not REST:
         raise RuntimeError("Supabase REST endpoint not configured")
     url = f"{REST}/{TABLE}?id=eq.{pred_id}"
     if user_id:
         url += f"&user_id=eq.{user_id}"
-    r = requests.patch(url, headers=HEADERS, data=json.dumps(patch), timeout=30)
-    r.raise_for_status()
+    for col, cond in (where or {}).items():
+        url += f"&{col}={cond}"
+    with tracing.span("supabase.update", **{"db.table": TABLE}) as s:
+        r = requests.patch(url, headers=HEADERS, data=json.dumps(patch), timeout=30)
+        s.set(**{"http.status_code": r.status_code})
+        r.raise_for_status()
+    return len(r.json() or [])  # HEADERS ask for return=representation
 
 # ===== Connection Status =====
-def connection_status() -> tuple[bool, str]:
+def connection_status(timeout: float = 10) -> tuple[bool, str]:
     """Check if Supabase is reachable."""
     if not SUPABASE_URL or not SUPABASE_KEY:
         return False, "Supabase credentials missing"
     try:
-        r = requests.get(f"{REST}/{TABLE}?select=id&limit=1", headers=HEADERS, timeout=10)
+        with tracing.span("supabase.ping", **{"db.table": TABLE}) as s:
+            r = requests.get(f"{REST}/{TABLE}?select=id&limit=1", headers=HEADERS, timeout=timeout)
+            s.set(**{"http.status_code": r.status_code})
         if r.status_code == 200:
             return True, "Connected"
         return False, f"HTTP {r.status_code} - {r.text}"
@@ -0,0 +1,142 @@
+# backend/app/core/synthetic.py
+from __future__ import annotations
+
+import os
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Tuple
+
+from .importtime import lazy
+
+np = lazy("numpy")
+pd = lazy("pandas")
+
+# ===== Deterministic synthetic market =====
+# GBM whose drift/vol switch between a calm and a stressed regime, plus a common market
+# factor so several tickers move together. Every random stream is keyed by (seed, purpose,
+# ticker) and drawn from a fixed origin, so a given date always gets the same bar no matter
+# which window or which other tickers were requested.
+SEED = int(os.getenv("SYNTHETIC_SEED", "42"))
+ORIGIN = date.fromisoformat(os.getenv("SYNTHETIC_ORIGIN", "1990-01-01"))
+SESSION_START_UTC = timedelta(hours=8)                 # LSE 08:00-16:30 (ignoring BST)
+SESSION_SECONDS = int(8.5 * 3600)
+
+# (annual drift, annual vol, mean length in trading days)
+REGIMES = {
+    "calm": (0.06, 0.12, 250.0),
+    "stressed": (-0.20, 0.35, 40.0),
+}
+_MAX_RUNS = 4096  # regime runs drawn up front (~ centuries); fixed so the stream is prefix-stable
+_TRADING_DAYS = 252.0
+
+def _rng(*key: int):
+    return np.random.default_rng([SEED, *key])
+
+def _ticker_key(ticker: str) -> int:
+    return zlib.crc32(ticker.encode())  # stable across processes, unlike hash()
+
+def _ticker_params(ticker: str) -> Tuple[float, float, float]:
+    """(start price, beta to the market factor, idiosyncratic annual vol)."""
+    r = _rng(9, _ticker_key(ticker)).random(3)
+    s0 = 2400.0 if ticker == "^FTSE" else 20.0 + 480.0 * r[0]  # FTSE was ~2400 at the 1990 origin
+    beta = 1.0 if ticker == "^FTSE" else 0.6 + 0.8 * r[1]
+    idio = 0.0 if ticker == "^FTSE" else 0.10 + 0.20 * r[2]
+    return s0, beta, idio
+
+def _business_days(end: date):
+    return pd.bdate_range(ORIGIN, end).values.astype("datetime64[D]")
+
+def _regimes(n: int):
+    """Boolean 'stressed' flag per trading day, built from geometric run lengths (no loop)."""
+    rng = _rng(1)
+    calm_len, stress_len = REGIMES["calm"][2], REGIMES["stressed"][2]
+    lengths = np.empty(_MAX_RUNS, dtype=np.int64)
+    lengths[0::2] = rng.geometric(1.0 / calm_len, size=_MAX_RUNS // 2)
+    lengths[1::2] = rng.geometric(1.0 / stress_len, size=_MAX_RUNS // 2)
+    flags = np.repeat(np.arange(_MAX_RUNS) % 2 == 1, lengths)
+    if len(flags) < n:  # beyond the drawn horizon: stay calm
+        flags = np.concatenate([flags, np.zeros(n - len(flags), dtype=bool)])
+    return flags[:n]
+
+def _daily_columns(ticker: str, end: date) -> Dict[str, np.ndarray]:
+    days = _business_days(end)
+    n = len(days)
+    stressed = _regimes(n)
+    mu = np.where(stressed, REGIMES["stressed"][0], REGIMES["calm"][0]) / _TRADING_DAYS
+    sig = np.where(stressed, REGIMES["stressed"][1], REGIMES["calm"][1]) / np.sqrt(_TRADING_DAYS)
+
+    s0, beta, idio = _ticker_params(ticker)
+    market = _rng(2).standard_normal(n)
+    own = _rng(3, _ticker_key(ticker)).standard_normal(n)
+    idio_d = idio / np.sqrt(_TRADING_DAYS)
+    ret = beta * (mu - 0.5 * sig ** 2 + sig * market) + idio_d * own - 0.5 * idio_d ** 2
+    close = s0 * np.exp(np.cumsum(ret))
+
+    noise = _rng(4, _ticker_key(ticker)).standard_normal((n, 3))
+    vol_d = np.sqrt((beta * sig) ** 2 + idio_d ** 2)
+    prev = np.concatenate(([s0], close[:-1]))
+    open_ = prev * np.exp(0.2 * vol_d * noise[:, 0])            # overnight gap
+    high = np.maximum(open_, close) * np.exp(0.5 * vol_d * np.abs(noise[:, 1]))
+    low = np.minimum(open_, close) * np.exp(-0.5 * vol_d * np.abs(noise[:, 2]))
+    calm_vol = REGIMES["calm"][1] / np.sqrt(_TRADING_DAYS)
+    volume = np.round(5e8 * (vol_d / calm_vol) * np.exp(0.3 * noise[:, 0]))  # busier when stressed
+    return {"days": days, "open": open_, "high": high, "low": low, "close": close,
+            "volume": volume, "vol_d": vol_d}
+
+def daily_frame(start: date, end: date, ticker: str = "^FTSE") -> pd.DataFrame:
+    """Daily OHLCV for [start, end] in the same shape yahoo._as_ohlcv() returns."""
+    c = _daily_columns(ticker, end)
+    keep = c["days"] >= np.datetime64(start, "D")
+    return pd.DataFrame({
+        "Open": c["open"][keep],
+        "High": c["high"][keep],
+        "Low": c["low"][keep],
+        "Close": c["close"][keep],
+        "Volume": c["volume"][keep],
+    }, index=pd.DatetimeIndex(c["days"][keep].astype("datetime64[ns]"), name="Date"))
+
+def daily_frames(start: date, end: date, tickers: Iterable[str]) -> Dict[str, pd.DataFrame]:
+    """Several correlated tickers (they share the market factor and regimes)."""
+    return {t: daily_frame(start, end, t) for t in tickers}
+
+def intraday_columns(start: date, end: date, step_seconds: int, ticker: str = "^FTSE") -> Dict[str, np.ndarray]:
+    """
+    Intraday bars (bars.py column layout) that open/close exactly at the daily bars: a
+    Brownian bridge per session, scaled by that day's regime vol. Each calendar year uses
+    its own random stream, so any window over it reproduces the same bars.
+    """
+    c = _daily_columns(ticker, end)
+    sel = np.flatnonzero(c["days"] >= np.datetime64(start, "D"))
+    k = SESSION_SECONDS // step_seconds
+    if len(sel) == 0 or k < 1:
+        return {col: np.empty(0) for col in ("ts", "open", "high", "low", "close", "volume")}
+
+    all_years = c["days"].astype("datetime64[Y]").astype(int) + 1970
+    years = all_years[sel]
+    z = np.empty((len(sel), k))
+    for y in np.unique(years):  # one vectorized draw per calendar year, not per bar
+        year_rows = np.flatnonzero(all_years == y)
+        block = _rng(5, _ticker_key(ticker), int(y), step_seconds).standard_normal((len(year_rows), k))
+        mine = years == y
+        z[mine] = block[sel[mine] - year_rows[0]]
+
+    o, cl = c["open"][sel], c["close"][sel]
+    w = np.cumsum(z * (c["vol_d"][sel] / np.sqrt(k))[:, None], axis=1)
+    frac = np.arange(1, k + 1) / k
+    bridge = w - frac[None, :] * w[:, -1:] + frac[None, :] * np.log(cl / o)[:, None]
+    path = o[:, None] * np.exp(bridge)                          # bar closes
+    bar_open = np.concatenate([o[:, None], path[:, :-1]], axis=1)
+    wiggle = np.abs(z) * (c["vol_d"][sel] / np.sqrt(k))[:, None] * 0.5
+    high = np.maximum(bar_open, path) * np.exp(wiggle)
+    low = np.minimum(bar_open, path) * np.exp(-wiggle)
+    volume = np.repeat((c["volume"][sel] / k)[:, None], k, axis=1)
+
+    day_ts = c["days"][sel].astype("datetime64[s]").astype(np.int64)
+    ts = day_ts[:, None] + int(SESSION_START_UTC.total_seconds()) + step_seconds * np.arange(k)[None, :]
+    return {"ts": ts.ravel(), "open": bar_open.ravel(), "high": high.ravel(), "low": low.ravel(),
+            "close": path.ravel(), "volume": volume.ravel()}
+
+def fetch_daily(days: int, ticker: str = "^FTSE") -> pd.DataFrame:
+    """Drop-in for fetch_ohlc(days): the last `days` calendar days up to today."""
+    end = datetime.utcnow().date()
+    return daily_frame(end - timedelta(days=days), end, ticker)
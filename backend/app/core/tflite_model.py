@@ -0,0 +1,75 @@
+# backend/app/core/tflite_model.py
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import os
+import threading
+from typing import Dict
+
+from .importtime import lazy
+
+np = lazy("numpy")
+
+# ===== Reduced-precision LSTM (TFLite) =====
+# `python -m app.core.quantize` writes <model>.fp16.tflite / <model>.int8.tflite next to the
+# Keras file. The converter needs a static batch size to lower the LSTM loop, so the files have
+# a fixed batch (input shape (B, None, features)). Lookback stays dynamic. At run time windows
+# are fed in chunks of B, with the last chunk zero-padded. A standalone interpreter
+# (ai_edge_litert or tflite_runtime) is used when installed, so serving never imports
+# TensorFlow; otherwise tf.lite.
+PRECISIONS = ("fp16", "int8")
+
+def quantized_path(model_path: str, precision: str) -> str:
+    return os.path.splitext(model_path)[0] + f".{precision}.tflite"
+
+def _interpreter_class():
+    for pkg in ("ai_edge_litert", "tflite_runtime"):
+        if importlib.util.find_spec(pkg) is not None:
+            return importlib.import_module(f"{pkg}.interpreter").Interpreter
+    return importlib.import_module("tensorflow").lite.Interpreter
+
+class QuantizedModel:
+    """TFLite variant behind the same contract as the Keras model: (n, lookback, features) → (n,)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as fh:
+            self._content = fh.read()
+        probe = _interpreter_class()(model_content=self._content)
+        shape = probe.get_input_details()[0]["shape_signature"]
+        self.batch = int(shape[0])
+        self.input_shape = (None, None, int(shape[-1]))
+        # one interpreter per lookback: resizing the time dim re-plans the whole graph
+        self._interpreters: Dict[int, object] = {}
+        self._locks: Dict[int, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _for_lookback(self, lookback: int):
+        with self._guard:
+            it = self._interpreters.get(lookback)
+            if it is None:
+                it = _interpreter_class()(model_content=self._content)
+                it.resize_tensor_input(it.get_input_details()[0]["index"], (self.batch, lookback, self.input_shape[-1]))
+                it.allocate_tensors()
+                self._interpreters[lookback] = it
+                self._locks[lookback] = threading.Lock()
+            return it, self._locks[lookback]
+
+    def predict(self, X) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n, lookback = X.shape[0], X.shape[1]
+        it, lock = self._for_lookback(lookback)
+        inp = it.get_input_details()[0]["index"]
+        outp = it.get_output_details()[0]["index"]
+        out = np.empty(n, dtype=np.float32)
+        with lock:  # an interpreter is not thread-safe
+            for i in range(0, n, self.batch):
+                chunk = X[i:i + self.batch]
+                k = len(chunk)
+                if k != self.batch:
+                    chunk = np.concatenate([chunk, np.zeros((self.batch - k,) + chunk.shape[1:], dtype=np.float32)])
+                it.set_tensor(inp, chunk)
+                it.invoke()
+                out[i:i + k] = it.get_tensor(outp).reshape(-1)[:k]
+        return out
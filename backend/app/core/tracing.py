@@ -0,0 +1,167 @@
+# backend/app/core/tracing.py
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from . import supa  # loads backend/.env before the config below is read
+
+# ===== Lightweight tracing =====
+# Spans use OpenTelemetry's data model (32-hex trace id, 16-hex span id, parent id, unix-nano
+# timestamps, attributes, status) and W3C `traceparent` propagation, but are exported locally
+# as JSON lines, either to stdout or to TRACE_FILE. No collector or SDK is needed, and the
+# output can be replayed into one later. The current span and request id live in
+# contextvars, so they follow the request into Starlette's threadpool; executors we own copy
+# the context explicitly (see run_in_context).
+TRACING = os.getenv("TRACING", "off").lower()            # off | console | file
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))  # backend/
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(BASE_DIR, "data", "traces.jsonl"))
+REQUEST_ID_LOGS = os.getenv("REQUEST_ID_LOGS", "true").lower() in ("1", "true", "yes")
+ENABLED = TRACING in ("console", "file")
+
+_span_var: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+_request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_export_lock = threading.Lock()
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attributes.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+
+class _NoSpan:
+    """Returned when tracing is off so call sites can still do `s.set(...)`."""
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+_NO_SPAN = _NoSpan()
+
+def _export(span: Span) -> None:
+    line = json.dumps(span.to_dict(), default=str)
+    try:
+        if TRACING == "file":
+            with _export_lock:
+                os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+                with open(TRACE_FILE, "a", encoding="utf-8") as fh:
+                    fh.write(line + "\n")
+        else:
+            sys.__stdout__.write(f"[trace] {line}\n")
+    except OSError as e:
+        print(f"[trace] export failed: {e}")
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """Child of the current span (or a new trace). Exceptions mark the span ERROR and propagate."""
+    if not ENABLED:
+        yield _NO_SPAN
+        return
+    parent = _span_var.get()
+    rid = _request_id_var.get()
+    if rid:
+        attributes.setdefault("request.id", rid)
+    s = Span(name, parent.trace_id if parent else secrets.token_hex(16),
+             parent.span_id if parent else None, attributes)
+    token = _span_var.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {getattr(e, 'detail', None) or e}"
+        raise
+    finally:
+        _span_var.reset(token)
+        s.end_ns = time.time_ns()
+        _export(s)
+
+def request_id() -> Optional[str]:
+    return _request_id_var.get()
+
+def run_in_context(fn):
+    """Wrap fn so it runs with the caller's contextvars (span, request id) on another thread."""
+    ctx = contextvars.copy_context()
+    return lambda *a, **kw: ctx.run(fn, *a, **kw)
+
+# ===== Request ids in logs =====
+class _RequestIdStream:
+    """stdout wrapper: lines printed while handling a request get a `[req=<id>]` prefix."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def write(self, text: str) -> int:
+        rid = _request_id_var.get()
+        if rid and text and getattr(self._local, "at_line_start", True) and text != "\n":
+            text = f"[req={rid}] {text}"
+        if text:
+            self._local.at_line_start = text.endswith("\n")
+        return self._stream.write(text)
+
+    def __getattr__(self, name: str):
+        return getattr(self._stream, name)
+
+def install_log_context() -> None:
+    if REQUEST_ID_LOGS and not isinstance(sys.stdout, _RequestIdStream):
+        sys.stdout = _RequestIdStream(sys.stdout)
+
+# ===== Per-request root span =====
+class TracingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        rid = request.headers.get("x-request-id") or secrets.token_hex(8)
+        rid_token = _request_id_var.set(rid[:64])
+        parent_token = None
+        m = _TRACEPARENT_RE.match(request.headers.get("traceparent", ""))
+        if ENABLED and m:
+            # continue the caller's trace: a stand-in parent that is never exported
+            remote = Span("remote", m.group(1), None, {})
+            remote.span_id = m.group(2)
+            parent_token = _span_var.set(remote)
+        try:
+            with span(f"{request.method} {request.url.path}", **{
+                "http.method": request.method, "http.target": request.url.path,
+            }) as s:
+                response = await call_next(request)
+                s.set(**{"http.status_code": response.status_code})
+            response.headers["X-Request-ID"] = rid[:64]  # the id the logs and spans carry
+            if ENABLED:
+                response.headers["traceparent"] = f"00-{s.trace_id}-{s.span_id}-01"
+            return response
+        finally:
+            if parent_token is not None:
+                _span_var.reset(parent_token)
+            _request_id_var.reset(rid_token)
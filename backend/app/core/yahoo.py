@@ -1,11 +1,21 @@
-﻿import os
+﻿from __future__ import annotations
+
+import os
 import io
-from datetime import datetime, timedelta
-from typing import List
-import pandas as pd
-import yfinance as yf
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
 import requests
 
+from . import bars, resilience, shared_cache, synthetic, tracing
+from .importtime import lazy
+
+# pandas/yfinance are only paid for by the first request that needs market data
+pd = lazy("pandas")
+yf = lazy("yfinance")
+
 # --- FTSE100 focus tickers (most reliable first) ---
 TICKERS: List[str] = [
 
@@ -13,6 +23,14 @@ TICKERS: List[str] = [
 ]
 
 ALLOW_MOCK = os.environ.get("ALLOW_MOCK_DATA", "false").lower() in ("1", "true", "yes")
+# live = Yahoo/Stooq; synthetic = deterministic generated market (load tests, offline dev)
+DATA_SOURCE = os.environ.get("DATA_SOURCE", "live").strip().lower()
+OHLC_CACHE_TTL = int(os.environ.get("OHLC_CACHE_TTL", "300"))  # seconds; 0 disables
+
+# days -> (fetched_at, frame); daily bars only change once a day, so a short TTL is safe
+_ohlc_cache: Dict[int, Tuple[float, pd.DataFrame]] = {}
+_ohlc_locks: Dict[int, threading.Lock] = {}
+_ohlc_locks_guard = threading.Lock()
 
 # --- Helper: Normalize DataFrame to OHLCV ---
 def _as_ohlcv(df: pd.DataFrame) -> pd.DataFrame:
@@ -42,80 +60,335 @@ def _as_ohlcv(df: pd.DataFrame) -> pd.DataFrame:
 # --- Download from Yahoo Finance ---
 def _download_yf(symbol: str, days: int) -> pd.DataFrame:
     try:
-        df = yf.download(
-            symbol,
-            period=f"{days}d",
-            interval="1d",
-            auto_adjust=False,
-            progress=False,
-            threads=True,
-            repair=True
-        )
-        return _as_ohlcv(df)
+        with tracing.span("yahoo.download", symbol=symbol, days=days, interval="1d") as s:
+            df = yf.download(
+                symbol,
+                period=f"{days}d",
+                interval="1d",
+                auto_adjust=False,
+                progress=False,
+                threads=True,
+                repair=True
+            )
+            df = _as_ohlcv(df)
+            s.set(rows=len(df))
+        return df
     except Exception as e:
         print(f"[WARN] Yahoo download failed for {symbol}: {e}")
         return pd.DataFrame()
 
+# --- Intraday bars (chunked ingestion into the append-only bar store) ---
+# interval -> (max days per request, how far back Yahoo serves that interval)
+INTRADAY_LIMITS: Dict[str, Tuple[int, int]] = {
+    "1m": (7, 30),
+    "2m": (60, 60),
+    "5m": (60, 60),
+    "15m": (60, 60),
+    "30m": (60, 60),
+    "60m": (730, 730),
+    "1h": (730, 730),
+}
+# Coarser intervals that Yahoo doesn't serve natively (10m, 4h, ...) are resampled from this
+INTRADAY_BASE_INTERVAL = os.environ.get("INTRADAY_BASE_INTERVAL", "5m")
+INTRADAY_REFRESH_SECONDS = int(os.environ.get("INTRADAY_REFRESH_SECONDS", "60"))
+_last_ingest: Dict[Tuple[str, str], float] = {}
+
+def _download_yf_range(symbol: str, interval: str, start: datetime, end: datetime) -> Optional[pd.DataFrame]:
+    """
+    Bars in [start, end). An empty frame means Yahoo had no bars there (weekend, holiday);
+    None means the request failed, so the caller must not skip past this range.
+    """
+    try:
+        with tracing.span("yahoo.download", symbol=symbol, start=str(start), end=str(end), interval=interval) as s:
+            df = _as_ohlcv(yf.Ticker(symbol).history(start=start, end=end, interval=interval,
+                                                     auto_adjust=False, raise_errors=True))
+            s.set(rows=len(df))
+        return df
+    except Exception as e:
+        msg = str(e)
+        if isinstance(e, yf.exceptions.YFPricesMissingError) and "Yahoo error" not in msg \
+                and "status_code" not in msg:
+            return pd.DataFrame()  # a valid answer that simply holds no bars
+        print(f"[WARN] Yahoo {interval} download failed for {symbol} {start:%Y-%m-%d}..{end:%Y-%m-%d}: {e}")
+        return None
+
+def ingest_intraday(symbol: str = TICKERS[0], interval: str = "5m",
+                    start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    """
+    Download [start, end) in request-sized chunks Yahoo will accept and append to the
+    bar store. Resumes after the last stored bar; returns rows written.
+    """
+    if interval not in INTRADAY_LIMITS:
+        raise ValueError(f"Yahoo does not serve '{interval}' bars; use one of {sorted(INTRADAY_LIMITS)}")
+    max_span, max_back = INTRADAY_LIMITS[interval]
+    now = datetime.now(timezone.utc)
+    end = min(end or now, now)
+    earliest = now - timedelta(days=max_back) + timedelta(hours=1)  # Yahoo rejects the exact edge
+
+    start = max(start or earliest, earliest)
+    last = bars.last_timestamp(symbol, interval)
+    if last is not None:
+        start = max(start, datetime.fromtimestamp(last + 1, tz=timezone.utc))
+
+    written, cur = 0, start
+    while cur < end:
+        nxt = min(cur + timedelta(days=max_span), end)
+        df = _download_yf_range(symbol, interval, cur, nxt)
+        if df is None:
+            break  # the store is append-only: stop here so the next run retries from this chunk
+        if not df.empty:
+            written += bars.append(symbol, interval, bars.frame_to_columns(df))
+        cur = nxt
+    _last_ingest[(symbol, interval)] = time.time()
+    if written:
+        print(f"[INFO] Stored {written} new {interval} bars for {symbol}")
+    return written
+
+def fetch_intraday(days: int = 5, interval: str = "5m", symbol: str = TICKERS[0]) -> pd.DataFrame:
+    """
+    Intraday OHLCV for the last `days`. Native Yahoo intervals are ingested as-is; any
+    coarser interval is resampled on read from INTRADAY_BASE_INTERVAL bars.
+    """
+    source = interval if interval in INTRADAY_LIMITS else INTRADAY_BASE_INTERVAL
+    if DATA_SOURCE == "synthetic":
+        start = (datetime.now(timezone.utc) - timedelta(days=days)).date()
+        cols = synthetic.intraday_columns(start, datetime.now(timezone.utc).date(),
+                                          bars.interval_seconds(source), symbol)
+        return bars.to_frame(bars.resample(cols, interval) if source != interval else cols)
+    if time.time() - _last_ingest.get((symbol, source), 0.0) > INTRADAY_REFRESH_SECONDS:
+        ingest_intraday(symbol, source)
+    start_ts = int((datetime.now(timezone.utc) - timedelta(days=days)).timestamp())
+    return bars.read_bars(symbol, source, start_ts=start_ts, resample_to=interval)
+
 # --- Fallback: Stooq ---
+STOOQ_URL = "https://stooq.com/q/d/l/"
+STOOQ_CACHE_TTL = int(os.environ.get("STOOQ_CACHE_TTL", "900"))  # seconds before revalidating
+_STOOQ_COLS = ("Date", "Open", "High", "Low", "Close", "Volume")
+_STOOQ_DTYPES = {"Open": "float64", "High": "float64", "Low": "float64", "Close": "float64", "Volume": "float64"}
+
+# Single entry: the widest range fetched for the current end date, plus its validators
+_stooq_cache: Dict[str, object] = {}
+_stooq_lock = threading.Lock()
+
+def _parse_stooq(content: bytes) -> pd.DataFrame:
+    df = pd.read_csv(
+        io.BytesIO(content),
+        usecols=lambda c: c.strip() in _STOOQ_COLS,  # skip anything else Stooq adds
+        dtype=_STOOQ_DTYPES,
+        engine="c",
+    )
+    df.rename(columns=str.strip, inplace=True)
+    if df.empty or "Close" not in df.columns:  # Stooq answers "No data" for empty ranges
+        return pd.DataFrame()
+    df.index = pd.to_datetime(df.pop("Date"), format="%Y-%m-%d")
+    df.index.name = "Date"
+    if "Volume" not in df.columns:
+        df["Volume"] = 0.0
+    return df[["Open", "High", "Low", "Close", "Volume"]].dropna()
+
 def _download_stooq(days: int) -> pd.DataFrame:
+    """Only the needed d1..d2 range, typed parse, cached with ETag/Last-Modified revalidation."""
     try:
-        url = "https://stooq.com/q/d/l/?s=ukx&i=d"
-        r = requests.get(url, timeout=15, headers={
-            "User-Agent": "Mozilla/5.0"
-        })
-        r.raise_for_status()
+        d2 = datetime.now(timezone.utc).date()
+        d1 = d2 - timedelta(days=days + 10)
+        with _stooq_lock:
+            entry = dict(_stooq_cache)
+        covers = entry.get("d2") == d2 and entry.get("d1") <= d1
+        if covers and time.time() - entry["at"] < STOOQ_CACHE_TTL:
+            df = entry["df"]
+        else:
+            headers = {"User-Agent": "Mozilla/5.0"}
+            if covers and entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if covers and entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+            lo = entry["d1"] if covers else d1
+            with tracing.span("stooq.download", days=days, revalidate=bool(covers)) as s:
+                r = requests.get(STOOQ_URL, timeout=15, headers=headers, params={
+                    "s": "ukx", "i": "d", "d1": lo.strftime("%Y%m%d"), "d2": d2.strftime("%Y%m%d"),
+                })
+                s.set(**{"http.status_code": r.status_code})
+            if r.status_code == 304 and covers:
+                df = entry["df"]
+            else:
+                r.raise_for_status()
+                df = _parse_stooq(r.content)
+            with _stooq_lock:
+                _stooq_cache.update({
+                    "d1": lo, "d2": d2, "df": df, "at": time.time(),
+                    "etag": r.headers.get("ETag") or entry.get("etag"),
+                    "last_modified": r.headers.get("Last-Modified") or entry.get("last_modified"),
+                })
 
-        df = pd.read_csv(io.StringIO(r.text))
         if df.empty:
             return pd.DataFrame()
-
-        df.rename(columns=str.strip, inplace=True)
-        df["Date"] = pd.to_datetime(df["Date"])
-        df.set_index("Date", inplace=True)
-
-        if "Volume" not in df.columns:
-            df["Volume"] = 0
-
-        df = df[["Open", "High", "Low", "Close", "Volume"]].dropna()
         end = df.index.max()
         start = end - timedelta(days=days + 10)
-        return df.loc[start:end]
+        return df.loc[start:end].copy()
     except Exception as e:
         print(f"[WARN] Stooq fallback failed: {e}")
         return pd.DataFrame()
 
 # --- Mock data (optional dev mode) ---
 def _generate_mock(days: int) -> pd.DataFrame:
-    import numpy as np
-    end = datetime.utcnow().date()
-    idx = pd.date_range(end - timedelta(days=days * 2), end, freq="B")
-    price = 7600.0
-    out = []
-    for _ in idx:
-        price *= (1.0 + np.random.normal(0, 0.003))
-        out.append(price)
-    close = pd.Series(out, index=idx)
-    df = pd.DataFrame({
-        "Open": close.shift(1).fillna(close) * (1 + 0.0005),
-        "High": close * (1 + 0.003),
-        "Low":  close * (1 - 0.003),
-        "Close": close,
-        "Volume": 0
-    }, index=idx)
-    return df.tail(days)
+    return synthetic.fetch_daily(days)
 
 # --- Main Fetch Function ---
 def fetch_ohlc(days: int = 180) -> pd.DataFrame:
-    """Fetch FTSE100 OHLC data from Yahoo, else fallback to Stooq, else mock (if allowed)."""
+    """Cached fetch_ohlc: concurrent callers for the same `days` share one download."""
+    hit = _ohlc_cache.get(days)
+    if hit and time.time() - hit[0] < OHLC_CACHE_TTL:
+        return hit[1].copy()
+
+    with _ohlc_locks_guard:
+        lock = _ohlc_locks.setdefault(days, threading.Lock())
+    with lock, tracing.span("ohlc.fetch", days=days, source=DATA_SOURCE) as s:
+        hit = _ohlc_cache.get(days)
+        if hit and time.time() - hit[0] < OHLC_CACHE_TTL:
+            s.set(cache="memory")  # another caller downloaded it while we waited
+            return hit[1].copy()
+        source = "shared"
+        df = shared_cache.load_ohlc(days, OHLC_CACHE_TTL)  # another worker's fresh download
+        if df is None:
+            with shared_cache.file_lock(f"ohlc_{days}"):
+                df = shared_cache.load_ohlc(days, OHLC_CACHE_TTL)  # landed while we waited?
+                if df is None:
+                    df = _fetch_ohlc_uncached(days)
+                    shared_cache.store_ohlc(days, df)
+                    source = "miss"
+        s.set(rows=len(df), cache=source)
+        if OHLC_CACHE_TTL > 0:
+            _ohlc_cache[days] = (time.time(), df)
+        return df.copy()
+
+def fetch_ohlc_since(start) -> pd.DataFrame:
+    """
+    Daily bars from `start` (a date) up to today. Reuses any fresh cached window that already
+    covers it; otherwise fetches the smallest window that does, rounded up to whole weeks so
+    nearby callers share one cache entry.
+    """
+    days = max(7, (datetime.utcnow().date() - start).days + 1)
+    now = time.time()
+    covering = [d for d, (at, _) in list(_ohlc_cache.items()) if d >= days and now - at < OHLC_CACHE_TTL]
+    if covering:
+        df = _ohlc_cache[min(covering)][1]
+    else:
+        df = fetch_ohlc(-(-days // 7) * 7)
+    return df.loc[df.index >= pd.Timestamp(start)].copy()
+
+def prime_ohlc_cache(days_list: List[int]) -> List[int]:
+    """Fill the cache for the given lookbacks (used by the readiness warm-up)."""
+    primed = []
+    for days in days_list:
+        fetch_ohlc(days)
+        primed.append(days)
+    return primed
+
+# --- Source racing: sequential (default) or hedged, each source behind a circuit breaker ---
+FETCH_MODE = os.environ.get("FETCH_MODE", "sequential").lower()     # sequential | hedged
+HEDGE_DELAY_MS = float(os.environ.get("HEDGE_DELAY_MS", "1500"))    # used until we have latency samples
+HEDGE_MIN_MS = float(os.environ.get("HEDGE_MIN_MS", "200"))
+HEDGE_MAX_MS = float(os.environ.get("HEDGE_MAX_MS", "5000"))
+_hedge_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ohlc-hedge")
+
+def _yahoo_source(days: int) -> pd.DataFrame:
     for sym in TICKERS:
         df = _download_yf(sym, days)
         if not df.empty:
             print(f"[INFO] Using Yahoo Finance data for {sym}")
             return df
+    return pd.DataFrame()
 
+def _stooq_source(days: int) -> pd.DataFrame:
     df = _download_stooq(days)
     if not df.empty:
         print("[INFO] Using Stooq fallback data")
+    return df
+
+def _call_source(name: str, fn, days: int) -> pd.DataFrame:
+    """Run one source, feeding its breaker and latency stats. Never raises."""
+    t0 = time.perf_counter()
+    with tracing.span(f"ohlc.source.{name}", days=days) as s:
+        try:
+            df = fn(days)
+        except Exception as e:
+            print(f"[WARN] {name} source failed: {e}")
+            df = pd.DataFrame()
+        s.set(rows=len(df))
+    if df.empty:
+        resilience.breaker(name).record_failure()
+    else:
+        resilience.breaker(name).record_success()
+        resilience.latency(name).add(time.perf_counter() - t0)
+    return df
+
+# --- Health probes (core/depmonitor.py): tiny uncached requests with a bounded timeout ---
+def probe_yahoo(timeout: float) -> Tuple[bool, str]:
+    df = _as_ohlcv(yf.download(TICKERS[0], period="5d", interval="1d", auto_adjust=False,
+                               progress=False, threads=False, timeout=timeout))
+    return (True, f"{len(df)} rows") if not df.empty else (False, "no data returned")
+
+def probe_stooq(timeout: float) -> Tuple[bool, str]:
+    d2 = datetime.now(timezone.utc).date()
+    r = requests.get(STOOQ_URL, timeout=timeout, headers={"User-Agent": "Mozilla/5.0"}, params={
+        "s": "ukx", "i": "d", "d1": (d2 - timedelta(days=10)).strftime("%Y%m%d"), "d2": d2.strftime("%Y%m%d"),
+    })
+    r.raise_for_status()
+    df = _parse_stooq(r.content)
+    return (True, f"{len(df)} rows") if not df.empty else (False, "no data returned")
+
+def _hedge_delay(name: str) -> float:
+    """Seconds to wait on `name` before racing the next source: its recent p95, clamped."""
+    p95 = resilience.latency(name).percentile(95)
+    ms = HEDGE_DELAY_MS if p95 is None else p95 * 1000.0
+    return min(max(ms, HEDGE_MIN_MS), HEDGE_MAX_MS) / 1000.0
+
+def _fetch_sequential(sources, days: int) -> pd.DataFrame:
+    for name, fn in sources:
+        if not resilience.breaker(name).allow():
+            print(f"[INFO] Skipping {name}: circuit open")
+            continue
+        df = _call_source(name, fn, days)
+        if not df.empty:
+            return df
+    return pd.DataFrame()
+
+def _fetch_hedged(sources, days: int) -> pd.DataFrame:
+    """
+    Start the primary; if it hasn't answered within its hedge delay (or fails), start the
+    next source too. First non-empty result wins; stragglers finish in the background and
+    still update their stats.
+    """
+    pending = list(sources)
+    running: Dict = {}
+    delay = 0.0
+    while pending or running:
+        # first pass launches the primary; later passes mean it timed out or came back empty.
+        # allow() only right before launching: a half-open breaker's trial must actually run.
+        while pending:
+            name, fn = pending.pop(0)
+            if resilience.breaker(name).allow():
+                running[_hedge_pool.submit(tracing.run_in_context(_call_source), name, fn, days)] = name
+                delay = _hedge_delay(name)
+                break
+            print(f"[INFO] Skipping {name}: circuit open")
+        if not running:
+            break
+        done, _ = wait(list(running), timeout=delay if pending else None, return_when=FIRST_COMPLETED)
+        for fut in done:
+            running.pop(fut)
+            df = fut.result()
+            if not df.empty:
+                return df
+    return pd.DataFrame()
+
+def _fetch_ohlc_uncached(days: int) -> pd.DataFrame:
+    """Fetch FTSE100 OHLC data from Yahoo, else fallback to Stooq, else mock (if allowed)."""
+    if DATA_SOURCE == "synthetic":
+        return synthetic.fetch_daily(days)
+    sources = [("yahoo", _yahoo_source), ("stooq", _stooq_source)]
+    df = _fetch_hedged(sources, days) if FETCH_MODE == "hedged" else _fetch_sequential(sources, days)
+    if not df.empty:
         return df
 
     if ALLOW_MOCK:
@@ -123,3 +396,21 @@ def fetch_ohlc(days: int = 180) -> pd.DataFrame:
         return _generate_mock(days)
 
     raise RuntimeError("Unable to fetch FTSE 100 data from any source.")
+
+def fetch_ohlc_range(start, end, symbol: str = TICKERS[0]) -> pd.DataFrame:
+    """Daily OHLCV for [start, end) (dates or datetimes); honours DATA_SOURCE."""
+    if DATA_SOURCE == "synthetic":
+        last = pd.Timestamp(end).date() - timedelta(days=1)
+        return synthetic.daily_frame(pd.Timestamp(start).date(), last, symbol)
+    with tracing.span("yahoo.download", symbol=symbol, start=str(start), end=str(end), interval="1d") as s:
+        df = _as_ohlcv(yf.download(
+            symbol,
+            start=start,
+            end=end,
+            interval="1d",
+            auto_adjust=False,
+            progress=False,
+            threads=False,
+        ))
+        s.set(rows=len(df))
+    return df
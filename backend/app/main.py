@@ -1,12 +1,24 @@
 ﻿from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
-import asyncio
+from fastapi.middleware.gzip import GZipMiddleware
+import importlib.util
+import os
 
-from .routers import health, ohlc, predict, history, reconcile, backtest
-from .core import supa
+from .core.importtime import timed_import, print_import_report
 
-load_dotenv()  # normal load
+# supa parses backend/.env, so it goes first; routers keep TF/yfinance/pandas lazy
+supa = timed_import(".core.supa", __package__)
+readiness = timed_import(".core.readiness", __package__)
+model_server = timed_import(".core.model_server", __package__)
+hotswap = timed_import(".core.hotswap", __package__)
+reconcile_job = timed_import(".core.reconcile_job", __package__)
+jobs = timed_import(".core.jobs", __package__)
+profiling = timed_import(".core.profiling", __package__)
+shared_cache = timed_import(".core.shared_cache", __package__)
+tracing = timed_import(".core.tracing", __package__)
+depmonitor = timed_import(".core.depmonitor", __package__)
+ROUTERS = ("health", "ohlc", "predict", "history", "reconcile", "backtest", "admin")
+routers = [timed_import(f".routers.{name}", __package__) for name in ROUTERS]
 
 app = FastAPI(title="FTSE100 API")
 
@@ -19,31 +31,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ===== Compression =====
+# Responses below the threshold aren't worth the CPU. Brotli is used when brotli-asgi is
+# installed (it still falls back to gzip for clients that don't send "br").
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+if importlib.util.find_spec("brotli_asgi") is not None:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_BYTES, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+
+# ===== Profiling (opt-in: admin header/flag or PROFILE_SAMPLE_RATE) =====
+app.add_middleware(profiling.ProfilingMiddleware)
+
+# ===== Request ids + trace spans (outermost, so the root span covers everything) =====
+# TRACING=console|file exports spans; X-Request-ID is always echoed and prefixed to log lines
+app.add_middleware(tracing.TracingMiddleware)
+
 # ===== Include Routers =====
-app.include_router(health.router)
-app.include_router(ohlc.router)
-app.include_router(predict.router)
-app.include_router(history.router)
-app.include_router(reconcile.router)
-app.include_router(backtest.router)
-# ===== DB Connectivity Check After Startup =====
+for r in routers:
+    app.include_router(r.router)
+
+# ===== Startup =====
 @app.on_event("startup")
 async def startup_event():
     print("[INFO] 🚀 Backend API started successfully and ready to accept requests.")
-    asyncio.create_task(_post_start_db_check())
-
-async def _post_start_db_check():
-    """Retry DB connection a few times after startup."""
-    retries = 5
-    delay = 1  # seconds
-
-    for attempt in range(1, retries + 1):
-        ok, reason = supa.connection_status()
-        if ok:
-            print(f"[DB] ✅ Connected to Supabase: {reason}")
-            return
-        else:
-            print(f"[DB] (attempt {attempt}/{retries}) ❌ {reason}. Retrying in {delay}s...")
-            await asyncio.sleep(delay)
-
-    print("[DB] ❌ Could not connect to Supabase after retries. Check .env, key type, table name, and RLS.")
+    print_import_report()
+    tracing.install_log_context()  # prints made while serving a request get "[req=<id>]"
+    readiness.start()  # model load + graph tracing + OHLC priming, off the event loop
+    hotswap.start_watch()  # reload the model when its files change, only if MODEL_WATCH_INTERVAL > 0
+    jobs.start()  # heartbeat this worker's backtest jobs and re-run ones whose owner died (JOB_DB_PATH only)
+    if shared_cache.claim("scheduler"):  # with several workers, only one runs the once-per-deployment work
+        reconcile_job.start_schedule()  # cross-user batch reconcile, only if RECONCILE_JOB_INTERVAL > 0
+    depmonitor.start()  # Supabase / Yahoo / Stooq probes on a thread; results at /health/deps
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    model_server.shutdown()  # no-op unless INFERENCE_BACKEND=process started a pool
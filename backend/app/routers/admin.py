@@ -0,0 +1,69 @@
+# backend/app/routers/admin.py
+import json
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
+
+from ..core import hotswap, profiling
+from ..core.admin import require_admin
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+# ===== Request profiles (see core/profiling.py) =====
+@router.get("/profiles")
+def list_profiles():
+    return {"profiles": profiling.list_profiles()}
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """Summary: timing, sample count and the frames with the most self time."""
+    path = profiling.profile_path(profile_id, ".json")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+@router.get("/profiles/{profile_id}/folded")
+def download_profile(profile_id: str):
+    """Collapsed stacks for flamegraph.pl / speedscope / inferno."""
+    path = profiling.profile_path(profile_id, ".folded")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"profile_{profile_id}.folded")
+
+# ===== Model hot-swap (see core/hotswap.py) =====
+@router.get("/model")
+def model_status():
+    """Live model version, last reload and, when shadowing, the candidate's agreement stats."""
+    return hotswap.status()
+
+@router.post("/model/reload", status_code=202)
+def reload_model(model_file: str | None = None, scaler_file: str | None = None, shadow: bool = False):
+    """
+    Load in the background, then swap atomically. Without file names the served files are
+    re-read (after replacing them in place); names pick other files in the models directory.
+    shadow=true evaluates the candidate next to the live model instead of serving it.
+    """
+    try:
+        started = hotswap.reload(model_file, scaler_file, shadow=shadow)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not started:
+        return JSONResponse(status_code=409, content={"detail": "A reload is already running",
+                                                      **hotswap.status()})
+    return hotswap.status()
+
+@router.post("/model/promote")
+def promote_shadow():
+    version = hotswap.promote()
+    if version is None:
+        raise HTTPException(status_code=404, detail="No shadow candidate loaded")
+    return {"model_version": version}
+
+@router.delete("/model/shadow")
+def stop_shadow():
+    if not hotswap.stop_shadow():
+        raise HTTPException(status_code=404, detail="No shadow candidate loaded")
+    return {"stopped": True}
@@ -1,80 +1,55 @@
-# backend/app/routers/backtest.py
+﻿# backend/app/routers/backtest.py
+from __future__ import annotations
+
+from contextlib import ExitStack
 from datetime import date, timedelta
 from functools import lru_cache
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import hashlib
+import json
 import os
-import numpy as np
-import pandas as pd
-import yfinance as yf
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
-from pathlib import Path
-import joblib
-from tensorflow.keras.models import load_model
+from io import StringIO
+
+from ..core import supa  # loads backend/.env before the config below is read
+from ..core.importtime import lazy
+from ..core import admission, formats, hotswap, jobs, prediction_store, tracing, yahoo
+from ..core.backtest_rows import BacktestRows, nullable, rolling_mean
+from ..core.model import (
+    candidate, infer, load_scaler_file, model_file, model_version, scaler_version, served,
+    default_model_path, default_scaler_path,
+)
+
+# Heavy deps: imported on the first backtest call, not at worker startup
+np = lazy("numpy")
+pd = lazy("pandas")
 
 router = APIRouter(prefix="/backtest", tags=["backtest"])
 
+# Cost grows with trading days × lookback; a single point is as cheap as /predict
+_heavy = [Depends(admission.admit("heavy", admission.backtest_cost))]
+_light = [Depends(admission.admit("interactive"))]
+_compare = [Depends(admission.admit("heavy", admission.compare_cost))]
+
 # ===== Config =====
 DEFAULT_TICKER = "^FTSE"
 DEFAULT_LOOKBACK = int(os.getenv("LOOKBACK", "60"))
-ENV_MODEL_PATH = os.getenv("MODEL_PATH", "")
-ENV_SCALER_PATH = os.getenv("SCALER_PATH", "")
 FEATURES = ["Close", "High", "Low", "Open", "Volume"]
 
-# ===== Path resolver =====
-def _resolve_file(preferred: str, default_name: str) -> str:
-    """
-    Find file across sensible locations. Returns absolute path or raises FileNotFoundError.
-    """
-    here = Path(__file__).resolve()                 # .../app/routers/backtest.py
-    app_dir = here.parent.parent                    # .../app
-    project_root = app_dir.parent                   # .../backend
-    cwd = Path.cwd()
-    candidates: List[Path] = []
-
-    if preferred:
-        p = Path(preferred)
-        candidates += [p, cwd / p, project_root / p, app_dir / p]
-
-    candidates += [
-        cwd / default_name,
-        project_root / default_name,
-        app_dir / default_name,
-        app_dir / "models" / default_name,          # <-- your files live here
-        here.parent / default_name,
-        Path("/mnt/data") / default_name,
-    ]
-
-    tried = []
-    for c in candidates:
-        c = c.resolve()
-        tried.append(str(c))
-        if c.exists():
-            print(f"[model-path] Using: {c}")
-            return str(c)
-
-    raise FileNotFoundError(
-        f"File '{default_name}' not found. Tried:\n" + "\n".join(tried)
-    )
-
-# ===== Cached loaders =====
-@lru_cache(maxsize=1)
-def _load_scaler():
-    path = _resolve_file(ENV_SCALER_PATH, "scaler.save")
-    return joblib.load(path)
-
-@lru_cache(maxsize=1)
-def _load_model():
-    path = _resolve_file(ENV_MODEL_PATH, "best_lstm_model.h5")
-    return load_model(path, compile=False)  # inference only
+# ===== Cached loaders (shared registry in core/model.py) =====
+def _model_path() -> str:
+    # only resolves the file; the model itself lives in the inference backend
+    return model_file(default_model_path())
 
 # ===== Helpers =====
 def _dl_ohlc(ticker: str, start_dt: date, end_dt: date) -> pd.DataFrame:
     # pad backwards for lookback and a bit forward for safety
     ystart = (start_dt - timedelta(days=220)).strftime("%Y-%m-%d")
     yend = (end_dt + timedelta(days=5)).strftime("%Y-%m-%d")
-    df = yf.download(ticker, start=ystart, end=yend, auto_adjust=False, progress=False)
+    df = yahoo.fetch_ohlc_range(ystart, yend, symbol=ticker)
     if df.empty:
         raise HTTPException(400, "No data returned from Yahoo Finance.")
     df = df[FEATURES].dropna().copy()
@@ -82,15 +57,32 @@ def _dl_ohlc(ticker: str, start_dt: date, end_dt: date) -> pd.DataFrame:
     df.sort_index(inplace=True)
     return df
 
-def _predict_window(model, scaler, window_df: pd.DataFrame) -> float:
+def _predict_window(snap, window_df: pd.DataFrame) -> float:
+    """One window through a served() snapshot, so the model and scaler always belong together."""
+    scaler = snap.scaler
     X = scaler.transform(window_df.values)             # (lookback, 5)
     X = X.reshape(1, X.shape[0], X.shape[1])           # (1, lookback, 5)
-    scaled_pred = float(model.predict(X, verbose=0).reshape(-1)[0])
+    scaled_pred = float(infer(X, snap.model_path, snap.model)[0])
     dummy = np.zeros((1, len(FEATURES)))
     dummy[0, 0] = scaled_pred                          # Close is index 0
     inv = scaler.inverse_transform(dummy)
     return float(inv[0, 0])
 
+def _predict_windows(model_path: str, scaler, raw: pd.DataFrame, idxs: List[int], lookback: int,
+                     model=None) -> np.ndarray:
+    """Batched _predict_window: one inference call for the windows ending before each idx."""
+    if not idxs:
+        return np.empty(0)
+    # MinMax scaling is per-row, so scaling the whole frame once == scaling each window
+    scaled = scaler.transform(raw[FEATURES].values)
+    X = np.stack([scaled[i - lookback: i] for i in idxs])   # (n, lookback, 5)
+    return _unscale_close(scaler, infer(X, model_path, model))
+
+def _unscale_close(scaler, scaled_pred) -> np.ndarray:
+    dummy = np.zeros((len(scaled_pred), len(FEATURES)))
+    dummy[:, 0] = scaled_pred                          # Close is index 0
+    return scaler.inverse_transform(dummy)[:, 0]
+
 def _direction(prev_close: float, value: float) -> int:
     s = np.sign(value - prev_close)
     return int(s) if s in (-1, 0, 1) else 0
@@ -122,6 +114,8 @@ class PointResponse(BaseModel):
     accuracy_pct: float
     trade_points: float
     trade_return_pct: float
+    model_version: str | None = None
+    scaler_version: str | None = None
 
 class BacktestSeries(BaseModel):
     dates: List[str]
@@ -137,14 +131,13 @@ class BacktestResponse(BaseModel):
     table: List[Dict[str, Any]]
 
 # ===== Single day (auto-roll forward; no 404 for holidays/insufficient history) =====
-@router.get("/point", response_model=PointResponse)
+@router.get("/point", response_model=PointResponse, dependencies=_light)
 def backtest_point(
     target: date = Query(..., description="Requested date; rolls to next valid trading day if needed"),
     lookback: int = Query(DEFAULT_LOOKBACK, ge=20, le=120),
 ):
     try:
-        model = _load_model()
-        scaler = _load_scaler()
+        snap = served(default_model_path(), default_scaler_path())  # model + scaler + versions together
     except FileNotFoundError as e:
         raise HTTPException(500, str(e))
 
@@ -161,7 +154,7 @@ def backtest_point(
     window_df = df.iloc[idx - lookback: idx]
     prev_close = float(window_df["Close"].iloc[-1])
     actual = float(df.loc[t, "Close"])
-    pred = _predict_window(model, scaler, window_df[FEATURES])
+    pred = _predict_window(snap, window_df[FEATURES])
 
     abs_err = abs(pred - actual)
     pct_err = (abs_err / abs(actual) * 100.0) if actual != 0 else 0.0
@@ -186,11 +179,14 @@ def backtest_point(
         accuracy_pct=round(acc_pct, 4),
         trade_points=round(trade_pts, 4),
         trade_return_pct=round(trade_ret, 4),
+        model_version=snap.model_version,
+        scaler_version=snap.scaler_version,
     )
 
 # ===== Range (adhoc only; single Accuracy% = 100 − MAPE%) =====
-@router.get("", response_model=BacktestResponse)
+@router.get("", response_model=BacktestResponse, dependencies=_heavy)
 def backtest_range(
+    request: Request,
     start: Optional[date] = Query(None),
     end: Optional[date] = Query(None),
     lookback: int = Query(DEFAULT_LOOKBACK, ge=20, le=120),
@@ -203,269 +199,486 @@ def backtest_range(
     if start > end:
         raise HTTPException(400, "start cannot be after end")
 
-    try:
-        model = _load_model()
-        scaler = _load_scaler()
-    except FileNotFoundError as e:
-        raise HTTPException(500, str(e))
-
-    raw = _dl_ohlc(DEFAULT_TICKER, start, end)
-    end = min(end, raw.index.max().date())
-
-    mask = (raw.index.date >= start) & (raw.index.date <= end)
-    tdates = list(raw.index[mask])
-    rows: List[Dict[str, Any]] = []
-    if not tdates:
-        raise HTTPException(400, "No trading days found in selected range.")
-
-    for t in tdates:
-        idx = raw.index.get_indexer([t])[0]
-        if idx < lookback:
-            continue
-        win = raw.iloc[idx - lookback: idx]
-        prev_close = float(win["Close"].iloc[-1])
-        actual = float(raw.loc[t, "Close"])
-        try:
-            pred = _predict_window(model, scaler, win[FEATURES])
-        except Exception:
-            continue
-
-        error = pred - actual
-        abs_err = abs(error)
-        mape = (abs_err / abs(actual) * 100.0) if actual != 0 else 0.0
-        acc = 100.0 - mape
-        hit = (_direction(prev_close, actual) == _direction(prev_close, pred))
-
-        trade_pts = _direction(prev_close, pred) * (actual - prev_close)
-        trade_ret = (trade_pts / prev_close) * 100.0 if prev_close != 0 else 0.0
-
-        rows.append({
-            "date": _fmt(t),
-            "actual": round(actual, 4),
-            "pred": round(pred, 4),
-            "prev_close": round(prev_close, 4),
-            "error": round(error, 4),
-            "abs_error": round(abs_err, 4),
-            "mape_pct": round(mape, 4),
-            "accuracy_pct": round(acc, 4),
-            "direction_pred": "UP" if pred >= prev_close else "DOWN",
-            "hit": bool(hit),
-            "trade_points": round(trade_pts, 4),
-            "trade_return_pct": round(trade_ret, 4),
-        })
-
-    if not rows:
-        raise HTTPException(400, "Not enough history for selected range.")
-
-    df = pd.DataFrame(rows)
-
-    # cumulative series (simple sum; UI only needs shape)
-    df["cum_pl_points"] = df["trade_points"].cumsum()
-    df["cum_return_pct"] = df["trade_return_pct"].cumsum()
-
-    # rolling metrics
-    r_acc: List[Optional[float]] = []
-    r_rmse: List[Optional[float]] = []
-    for i in range(len(df)):
-        if i + 1 < window:
-            r_acc.append(None)
-            r_rmse.append(None)
-        else:
-            sl = df.iloc[i + 1 - window: i + 1]
-            r_acc.append(round(100.0 * sl["hit"].mean(), 4))
-            r_rmse.append(round(np.sqrt((sl["error"] ** 2).mean()), 4))
-
-    # naive: predict prev_close
-    naive_err = df["prev_close"] - df["actual"]
-    naive_mae = float(np.abs(naive_err).mean())
-    naive_rmse = float(np.sqrt((naive_err ** 2).mean()))
-
-    # single Accuracy% for the range
-    mape_mean = float(df["mape_pct"].mean())
-    summary = {
-        "count": int(len(df)),
-        "MAE": round(float(df["abs_error"].mean()), 4),
-        "RMSE": round(float(np.sqrt((df["error"] ** 2).mean())), 4),
-        "MAPE_pct": round(mape_mean, 4),
-        "Avg_Accuracy_pct": round(100.0 - mape_mean, 4),  # <-- single indicator
-        "Directional_Accuracy_pct": round(100.0 * float(df["hit"].mean()), 2),
-        "Naive_MAE": round(naive_mae, 4),
-        "Naive_RMSE": round(naive_rmse, 4),
-        "Window": int(window),
-    }
-
-    series = BacktestSeries(
-        dates=df["date"].tolist(),
-        cum_pl_points=df["cum_pl_points"].tolist(),
-        cum_return_pct=df["cum_return_pct"].tolist(),
-        rolling_directional_accuracy_pct=r_acc,
-        rolling_rmse=r_rmse,
-    )
-
+    summary, rows, series = _compute_range(start, end, lookback, window)
+    fmt = formats.negotiate(request)
+    if fmt != "json":
+        # one column per table field; the rolling series share the table's dates
+        columns = rows.columns()
+        columns["rolling_directional_accuracy_pct"] = series["rolling_directional_accuracy_pct"]
+        columns["rolling_rmse"] = series["rolling_rmse"]
+        return formats.table_response(fmt, columns, {"success": True, "summary": summary, "window": window})
     return BacktestResponse(
         success=True,
         summary=summary,
-        series=series,
-        table=df.to_dict(orient="records"),
+        series=BacktestSeries(**series),
+        table=rows.records(),
     )
-# --- add at top with other imports ---
-from fastapi.responses import StreamingResponse, JSONResponse
-from io import StringIO
 
-# try to use Supabase if configured
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-_supabase = None
-try:
-    if SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY:
-        from supabase import create_client, Client
-        _supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+# ===== Supabase client (created on first save, not at import) =====
+@lru_cache(maxsize=1)
+def _get_supabase():
+    if not (supa.SUPABASE_URL and supa.SUPABASE_KEY):
+        return None
+    try:
+        from supabase import create_client
+        client = create_client(supa.SUPABASE_URL, supa.SUPABASE_KEY)
         print("[DB] backtest router: Supabase client ready")
-except Exception as e:
-    print(f"[DB] backtest router: Supabase client not available: {e}")
+        return client
+    except Exception as e:
+        print(f"[DB] backtest router: Supabase client not available: {e}")
+        return None
 
 # --- helper to compute the same range result (reused by export/save) ---
-def _compute_range(start: date, end: date, lookback: int, window: int):
-    # this calls your existing backtest_range logic but returns (summary, df, series)
-    model = _load_model()
-    scaler = _load_scaler()
+BACKTEST_CHUNK_DAYS = int(os.getenv("BACKTEST_CHUNK_DAYS", "250"))  # inference chunk when reporting progress
+
+def _compute_range(start: date, end: date, lookback: int, window: int,
+                   progress: Optional[Callable[[int, int, Callable[[], BacktestRows]], None]] = None):
+    # shared by /backtest, export, save and background jobs; returns (summary, rows, series),
+    # rows being column arrays that are only turned into dicts/CSV by the caller.
+    # progress(done_days, total_days, partial) is called after every inference chunk, where
+    # partial() builds the rows for the leading days that are already predicted.
+    try:
+        snap = served(default_model_path(), default_scaler_path())  # model + scaler + versions together
+    except FileNotFoundError as e:
+        raise HTTPException(500, str(e))
+    scaler = snap.scaler
 
-    raw = _dl_ohlc(DEFAULT_TICKER, start, end)
+    with tracing.span("backtest.fetch", start=str(start), end=str(end)):
+        raw = _dl_ohlc(DEFAULT_TICKER, start, end)
     end = min(end, raw.index.max().date())
     mask = (raw.index.date >= start) & (raw.index.date <= end)
-    tdates = list(raw.index[mask])
-    rows = []
-    for t in tdates:
-        idx = raw.index.get_indexer([t])[0]
-        if idx < lookback:
-            continue
-        win = raw.iloc[idx - lookback: idx]
-        prev_close = float(win["Close"].iloc[-1])
-        actual = float(raw.loc[t, "Close"])
-        try:
-            pred = _predict_window(model, scaler, win[FEATURES])
-        except Exception:
-            continue
+    if not mask.any():
+        raise HTTPException(400, "No trading days found in selected range.")
 
-        error = pred - actual
-        abs_err = abs(error)
-        mape = (abs_err / abs(actual) * 100.0) if actual != 0 else 0.0
-        acc = 100.0 - mape
-        hit = (_direction(prev_close, actual) == _direction(prev_close, pred))
-        trade_pts = _direction(prev_close, pred) * (actual - prev_close)
-        trade_ret = (trade_pts / prev_close) * 100.0 if prev_close != 0 else 0.0
-
-        rows.append({
-            "date": t.strftime("%Y-%m-%d"),
-            "actual": round(actual, 4),
-            "pred": round(float(pred), 4),
-            "prev_close": round(prev_close, 4),
-            "error": round(error, 4),
-            "abs_error": round(abs_err, 4),
-            "mape_pct": round(mape, 4),
-            "accuracy_pct": round(acc, 4),
-            "direction_pred": "UP" if pred >= prev_close else "DOWN",
-            "hit": bool(hit),
-            "trade_points": round(trade_pts, 4),
-            "trade_return_pct": round(trade_ret, 4),
-        })
-
-    if not rows:
+    # every target with a full lookback behind it
+    idxs = np.array([i for i in np.flatnonzero(mask) if i >= lookback], dtype=int)
+    if len(idxs) == 0:
         raise HTTPException(400, "Not enough history for selected range.")
-
-    df = pd.DataFrame(rows)
-    df["cum_pl_points"] = df["trade_points"].cumsum()
-    df["cum_return_pct"] = df["trade_return_pct"].cumsum()
-
-    # rolling
-    r_acc, r_rmse = [], []
-    for i in range(len(df)):
-        if i + 1 < window:
-            r_acc.append(None); r_rmse.append(None)
-        else:
-            sl = df.iloc[i + 1 - window: i + 1]
-            r_acc.append(round(100.0 * sl["hit"].mean(), 4))
-            r_rmse.append(round(np.sqrt((sl["error"] ** 2).mean()), 4))
-
+    dates = [_fmt(t) for t in raw.index[idxs]]
+
+    closes = raw["Close"].to_numpy(dtype=float)
+    prev_close, actual = closes[idxs - 1], closes[idxs]
+
+    # only dates missing from the prediction store go through the model: one batched call,
+    # or date-ordered chunks when someone is watching progress
+    version = snap.model_version
+    stored = prediction_store.get_preds(yahoo.DATA_SOURCE, DEFAULT_TICKER, lookback, version,
+                                        snap.scaler_version, dates)
+    pred = np.array([stored.get(d, np.nan) for d in dates], dtype=float)
+    missing = np.flatnonzero(np.isnan(pred))
+
+    def partial() -> BacktestRows:
+        gaps = np.flatnonzero(np.isnan(pred))
+        upto = int(gaps[0]) if len(gaps) else len(dates)
+        return BacktestRows.compute(dates[:upto], pred[:upto], prev_close[:upto], actual[:upto])
+
+    step = BACKTEST_CHUNK_DAYS if progress else max(1, len(missing))
+    if progress:
+        progress(len(dates) - len(missing), len(dates), partial)
+    for lo in range(0, len(missing), step):
+        chunk = missing[lo:lo + step]
+        try:
+            with tracing.span("backtest.infer", days=len(chunk), lookback=lookback):
+                fresh = _predict_windows(snap.model_path, scaler, raw, [int(idxs[k]) for k in chunk], lookback,
+                                         snap.model)
+        except Exception as e:
+            raise HTTPException(500, f"Prediction failed: {e}")
+        pred[chunk] = fresh
+        prediction_store.put_preds(yahoo.DATA_SOURCE, DEFAULT_TICKER, lookback, version, snap.scaler_version,
+                                   ((dates[k], float(p)) for k, p in zip(chunk, fresh)))
+        if progress:
+            progress(len(dates) - len(missing) + lo + len(chunk), len(dates), partial)
+
+    rows = BacktestRows.compute(dates, pred=pred, prev_close=prev_close, actual=actual)
+    return _summary(rows, window), rows, _series(rows, window)
+
+def _summary(rows: BacktestRows, window: int) -> Dict[str, Any]:
     # naive
-    naive_err = df["prev_close"] - df["actual"]
+    naive_err = rows.prev_close - rows.actual
     naive_mae = float(np.abs(naive_err).mean())
     naive_rmse = float(np.sqrt((naive_err ** 2).mean()))
 
-    mape_mean = float(df["mape_pct"].mean())
-    summary = {
-        "count": int(len(df)),
-        "MAE": round(float(df["abs_error"].mean()), 4),
-        "RMSE": round(float(np.sqrt((df["error"] ** 2).mean())), 4),
+    mape_mean = float(rows.mape_pct.mean())
+    return {
+        "count": len(rows),
+        "MAE": round(float(rows.abs_error.mean()), 4),
+        "RMSE": round(float(np.sqrt((rows.error ** 2).mean())), 4),
         "MAPE_pct": round(mape_mean, 4),
         "Avg_Accuracy_pct": round(100.0 - mape_mean, 4),
-        "Directional_Accuracy_pct": round(100.0 * float(df["hit"].mean()), 2),
+        "Directional_Accuracy_pct": round(100.0 * float(rows.hit.mean()), 2),
         "Naive_MAE": round(naive_mae, 4),
         "Naive_RMSE": round(naive_rmse, 4),
         "Window": int(window),
     }
-    series = {
-        "dates": df["date"].tolist(),
-        "cum_pl_points": df["cum_pl_points"].tolist(),
-        "cum_return_pct": df["cum_return_pct"].tolist(),
+
+def _series(rows: BacktestRows, window: int) -> Dict[str, Any]:
+    """Chart series from per-day rows (also used to rebuild saved runs)."""
+    r_acc = nullable(100.0 * rolling_mean(rows.hit, window))
+    r_rmse = nullable(np.sqrt(rolling_mean(rows.error ** 2, window)))
+    return {
+        "dates": rows.dates(),
+        "cum_pl_points": rows.cum_pl_points.tolist(),
+        "cum_return_pct": rows.cum_return_pct.tolist(),
         "rolling_directional_accuracy_pct": r_acc,
         "rolling_rmse": r_rmse,
     }
-    return summary, df, series
 
 # --- 1) CSV Export ---
-@router.get("/export.csv")
+@router.get("/export.csv", dependencies=_heavy)
 def export_range_csv(
     start: date = Query(...),
     end: date = Query(...),
     lookback: int = Query(DEFAULT_LOOKBACK, ge=20, le=120),
     window: int = Query(7, ge=2, le=60),
 ):
-    summary, df, _ = _compute_range(start, end, lookback, window)
+    filename, text = _export_csv(start, end, lookback, window)
+    return StreamingResponse(StringIO(text), media_type="text/csv",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+def _export_csv(start: date, end: date, lookback: int, window: int, progress=None):
+    summary, rows, _ = _compute_range(start, end, lookback, window, progress)
     # include summary as first rows (prefixed with '#')
     buf = StringIO()
     for k, v in summary.items():
         buf.write(f"# {k},{v}\n")
-    df.to_csv(buf, index=False)
-    buf.seek(0)
-    filename = f"backtest_{start}_{end}.csv"
-    return StreamingResponse(buf, media_type="text/csv",
-                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
-
-# --- 2) Save Run to Supabase ---
-@router.post("/save")
+    rows.frame().to_csv(buf, index=False)
+    return f"backtest_{start}_{end}.csv", buf.getvalue()
+
+# --- 2) Save Run to Supabase (content-addressed: same inputs + same model → same run) ---
+SAVE_CHUNK_ROWS = int(os.getenv("BACKTEST_SAVE_CHUNK_ROWS", "500"))
+_SUMMARY_KEYS = ("count", "MAE", "RMSE", "MAPE_pct", "Avg_Accuracy_pct", "Directional_Accuracy_pct",
+                 "Naive_MAE", "Naive_RMSE", "Window")
+
+def _run_hash(start: date, end: date, lookback: int, window: int) -> str:
+    key = {
+        "ticker": DEFAULT_TICKER,
+        "start": str(start),
+        "end": str(end),
+        "lookback": lookback,
+        "window": window,
+        # what is actually served (quantized variant, hot-swapped file), not the files on disk
+        "model_version": model_version(default_model_path()),
+        "scaler_version": scaler_version(default_scaler_path()),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+def _find_run(client, run_hash: str) -> Optional[Dict[str, Any]]:
+    with tracing.span("supabase.select", **{"db.table": "backtest_runs"}) as s:
+        res = client.table("backtest_runs").select("*").eq("run_hash", run_hash).limit(1).execute()
+        s.set(rows=len(res.data or []))
+    return res.data[0] if res.data else None
+
+def _load_run_rows(client, run_id) -> List[Dict[str, Any]]:
+    """All stored rows of a run, paged (PostgREST caps a single response at 1000 rows)."""
+    out: List[Dict[str, Any]] = []
+    page = 1000
+    while True:
+        with tracing.span("supabase.select", **{"db.table": "backtest_rows", "offset": len(out)}) as s:
+            res = (client.table("backtest_rows").select("*").eq("backtest_id", run_id)
+                   .order("date").range(len(out), len(out) + page - 1).execute())
+            s.set(rows=len(res.data or []))
+        out.extend(res.data or [])
+        if len(res.data or []) < page:
+            return out
+
+def _saved_run_response(client, run: Dict[str, Any]) -> Dict[str, Any]:
+    rows = _load_run_rows(client, run["id"])
+    summary = {k: run.get(k) for k in _SUMMARY_KEYS}
+    series = _series(BacktestRows.from_records(rows), int(run.get("window") or 7)) if rows else None
+    return {"success": True, "run_id": run["id"], "run": run,
+            "summary": summary, "series": series, "table": rows}
+
+@router.post("/save", dependencies=_heavy)
 def save_range_to_supabase(
     start: date = Query(...),
     end: date = Query(...),
     lookback: int = Query(DEFAULT_LOOKBACK, ge=20, le=120),
     window: int = Query(7, ge=2, le=60),
 ):
+    _supabase = _get_supabase()
     if _supabase is None:
         return JSONResponse(status_code=503, content={"success": False, "error": "Supabase not configured"})
-
-    summary, df, series = _compute_range(start, end, lookback, window)
-
-    # upsert into two tables: backtest_runs, backtest_rows
+    return _save_run(_supabase, start, end, lookback, window)
+
+def _reused_run(client, run: Dict[str, Any]) -> Dict[str, Any]:
+    """Same shape as a fresh save, rebuilt from the stored run."""
+    saved = _saved_run_response(client, run)
+    return {"success": True, "run_id": run["id"], "reused": True,
+            "summary": saved["summary"], "series": saved["series"]}
+
+def _save_run(_supabase, start: date, end: date, lookback: int, window: int, progress=None) -> Dict[str, Any]:
+    # Re-saving the same run is a no-op: look it up before spending any inference on it. That
+    # is only safe for a range that is already complete; one ending today or later grows as
+    # new bars arrive, so it is hashed on the last bar it actually covers, after computing.
+    if end < date.today():
+        existing = _find_run(_supabase, _run_hash(start, end, lookback, window))
+        if existing:
+            return _reused_run(_supabase, existing)
+
+    summary, rows, series = _compute_range(start, end, lookback, window, progress)
+    end = min(end, date.fromisoformat(rows.dates()[-1]))
+    run_hash = _run_hash(start, end, lookback, window)
+    existing = _find_run(_supabase, run_hash)
+    if existing:
+        return _reused_run(_supabase, existing)
+
+    # insert into two tables: backtest_runs, backtest_rows
     run_payload = {
         "start_date": str(start),
         "end_date": str(end),
         "lookback": lookback,
         "window": window,
         **summary,
-        "model_path": _resolve_file(ENV_MODEL_PATH, "best_lstm_model.h5"),
-        "scaler_path": _resolve_file(ENV_SCALER_PATH, "scaler.save"),
+        "model_path": default_model_path(),
+        "scaler_path": default_scaler_path(),
+        "run_hash": run_hash,
     }
-    run_res = _supabase.table("backtest_runs").insert(run_payload).execute()
+    try:
+        with tracing.span("supabase.insert", **{"db.table": "backtest_runs"}):
+            run_res = _supabase.table("backtest_runs").insert(run_payload).execute()
+    except Exception:
+        # lost a race against an identical save (unique run_hash): reuse the winner
+        existing = _find_run(_supabase, run_hash)
+        if existing:
+            return {"success": True, "run_id": existing["id"], "reused": True, "summary": summary, "series": series}
+        raise
     run_id = run_res.data[0]["id"]
 
-    rows_payload = [
-        {
-            "backtest_id": run_id,
-            **{k: (None if pd.isna(v) else v) for k, v in rec.items()}
-        }
-        for rec in df.to_dict(orient="records")
-    ]
-    # batch insert (Supabase can handle arrays)
-    _supabase.table("backtest_rows").insert(rows_payload).execute()
-
-    return {"success": True, "run_id": run_id, "summary": summary, "series": series}
+    records = rows.records()
+    try:
+        for i in range(0, len(records), SAVE_CHUNK_ROWS):
+            chunk = records[i:i + SAVE_CHUNK_ROWS]
+            with tracing.span("supabase.insert", **{"db.table": "backtest_rows", "rows": len(chunk)}):
+                _supabase.table("backtest_rows").insert([
+                    {"backtest_id": run_id, **{k: (None if pd.isna(v) else v) for k, v in rec.items()}}
+                    for rec in chunk
+                ]).execute()
+    except Exception:
+        # never leave a half-written run behind for the hash lookup to "reuse"
+        with tracing.span("supabase.delete", **{"db.table": "backtest_rows,backtest_runs"}):
+            _supabase.table("backtest_rows").delete().eq("backtest_id", run_id).execute()
+            _supabase.table("backtest_runs").delete().eq("id", run_id).execute()
+        raise
+
+    return {"success": True, "run_id": run_id, "reused": False, "summary": summary, "series": series}
+
+# --- 3) Read a saved run back (no inference) ---
+@router.get("/runs/{run_id}")
+def get_saved_run(run_id: str):
+    _supabase = _get_supabase()
+    if _supabase is None:
+        return JSONResponse(status_code=503, content={"success": False, "error": "Supabase not configured"})
+    with tracing.span("supabase.select", **{"db.table": "backtest_runs"}) as s:
+        res = _supabase.table("backtest_runs").select("*").eq("id", run_id).limit(1).execute()
+        s.set(rows=len(res.data or []))
+    if not res.data:
+        raise HTTPException(404, "Backtest run not found")
+    return _saved_run_response(_supabase, res.data[0])
+
+# --- 4) Background jobs: same computations, off the request thread ---
+JOB_KINDS = ("range", "export", "save")
+
+def _job_args(job: jobs.Job):
+    p = job.params
+
+    def progress(done: int, total: int, partial) -> None:
+        # partial results are handed out as row dicts, built only when someone asks for them
+        job.progress(done, total, lambda: partial().records())
+
+    return date.fromisoformat(p["start"]), date.fromisoformat(p["end"]), p["lookback"], p["window"], progress
+
+def _job_range(job: jobs.Job) -> Dict[str, Any]:
+    summary, rows, series = _compute_range(*_job_args(job))
+    return {"success": True, "summary": summary, "series": series, "table": rows.records()}
+
+def _job_export(job: jobs.Job) -> Dict[str, Any]:
+    filename, text = _export_csv(*_job_args(job))
+    return {"filename": filename, "csv": text}
+
+def _job_save(job: jobs.Job) -> Dict[str, Any]:
+    client = _get_supabase()
+    if client is None:
+        raise RuntimeError("Supabase not configured")
+    return _save_run(client, *_job_args(job))
+
+jobs.register("backtest:range", _job_range)
+jobs.register("backtest:export", _job_export)
+jobs.register("backtest:save", _job_save)
+
+@router.post("/jobs", status_code=202, dependencies=[Depends(admission.admit("jobs", admission.backtest_cost))])
+def submit_job(
+    kind: str = Query("range", description="range | export | save"),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    lookback: int = Query(DEFAULT_LOOKBACK, ge=20, le=120),
+    window: int = Query(7, ge=2, le=60),
+):
+    if kind not in JOB_KINDS:
+        raise HTTPException(400, f"kind must be one of {', '.join(JOB_KINDS)}")
+    end = end or date.today()
+    start = start or end - timedelta(days=14)
+    if start > end:
+        raise HTTPException(400, "start cannot be after end")
+    params = {"start": start.isoformat(), "end": end.isoformat(), "lookback": lookback, "window": window}
+    try:
+        job = jobs.submit(f"backtest:{kind}", params)
+    except jobs.QueueFull as e:
+        raise HTTPException(503, f"Job queue full: {e}", headers={"Retry-After": "10"})
+    return {"success": True, "job_id": job.id, **job.snapshot()}
+
+def _job_or_404(job_id: str) -> jobs.Job:
+    job = jobs.get(job_id)
+    if job is None or not job.kind.startswith("backtest:"):
+        raise HTTPException(404, "Job not found (unknown id or expired)")
+    return job
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str, partial: bool = Query(False, description="Include rows computed so far")):
+    job = _job_or_404(job_id)
+    out: Dict[str, Any] = {"success": True, **job.snapshot()}
+    if job.status == "done" and job.kind != "backtest:export":
+        out["result"] = job.result
+    elif partial and job.status == "running":
+        out["partial"] = job.partial()
+    return out
+
+@router.get("/jobs/{job_id}/download")
+def download_job(job_id: str):
+    job = _job_or_404(job_id)
+    if job.kind != "backtest:export":
+        raise HTTPException(400, "Only export jobs have a file to download")
+    if job.status != "done":
+        raise HTTPException(409, f"Job is {job.status}")
+    return StreamingResponse(StringIO(job.result["csv"]), media_type="text/csv",
+                             headers={"Content-Disposition": f'attachment; filename="{job.result["filename"]}"'})
+
+@router.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """
+    Queued jobs never start; running ones stop after the current inference chunk, also when
+    another worker process runs them (JOB_DB_PATH).
+    """
+    job = _job_or_404(job_id)
+    jobs.cancel(job_id)
+    return {"success": True, "cancel_requested": job.status in ("queued", "running"), **job.snapshot()}
+
+# --- 5) Compare models × lookbacks on one shared download and one scaled array ---
+COMPARE_MAX_VARIANTS = int(os.getenv("BACKTEST_COMPARE_MAX_VARIANTS", "12"))
+
+@router.get("/compare", dependencies=_compare)
+def backtest_compare(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    models: List[str] = Query([], description="Model files in the models directory; default: the served model"),
+    scalers: List[str] = Query([], description="Scaler file for each model, in the same order; default: the served scaler"),
+    lookbacks: List[int] = Query([DEFAULT_LOOKBACK]),
+    window: int = Query(7, ge=2, le=60),
+):
+    """Each model is scored through its own scaler: a model trained on a re-fitted scaler is
+    only meaningful with it, so pass `scalers` alongside `models` when they differ."""
+    end = end or date.today()
+    start = start or end - timedelta(days=14)
+    if start > end:
+        raise HTTPException(400, "start cannot be after end")
+    lookbacks = sorted(set(lookbacks))
+    if any(lb < 20 or lb > 120 for lb in lookbacks):
+        raise HTTPException(400, "every lookback must be between 20 and 120")
+    if scalers and len(scalers) != len(models):
+        raise HTTPException(400, "pass one scaler per model (or none to use the served scaler for all)")
+    try:
+        paths = [hotswap.candidate_path(m) for m in models] if models else [_model_path()]
+        scaler_paths = ([hotswap.candidate_path(s) for s in scalers] if scalers
+                        else [os.path.realpath(default_scaler_path())] * len(paths))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(404, str(e))
+    variants = list(dict.fromkeys(zip(paths, scaler_paths)))
+    if len(variants) * len(lookbacks) > COMPARE_MAX_VARIANTS:
+        raise HTTPException(400, f"at most {COMPARE_MAX_VARIANTS} model × lookback combinations per call")
+    return _compute_compare(start, end, variants, lookbacks, window)
+
+def _compute_compare(start: date, end: date, variants: List[Tuple[str, str]], lookbacks: List[int],
+                     window: int) -> Dict[str, Any]:
+    """
+    `variants`: (model path, scaler path) pairs. The served model and scaler come from one
+    served() snapshot; any other file is a candidate, loaded for this call only (see
+    model.candidate) so comparisons never pile up in the serving registry.
+    """
+    try:
+        snap = served(default_model_path(), default_scaler_path())
+        served_scaler = os.path.realpath(default_scaler_path())
+        scalers = {sp: (snap.scaler, snap.scaler_version) if sp == served_scaler
+                   else (load_scaler_file(sp), scaler_version(sp))
+                   for sp in dict.fromkeys(sp for _, sp in variants)}
+    except FileNotFoundError as e:
+        raise HTTPException(500, str(e))
+
+    with tracing.span("backtest.fetch", start=str(start), end=str(end)):
+        raw = _dl_ohlc(DEFAULT_TICKER, start, end)
+    end = min(end, raw.index.max().date())
+    mask = (raw.index.date >= start) & (raw.index.date <= end)
+    # only days the longest lookback can score, so every variant is judged on the same days
+    idxs = np.flatnonzero(mask)
+    idxs = idxs[idxs >= max(lookbacks)]
+    if len(idxs) == 0:
+        raise HTTPException(400, "Not enough history for selected range.")
+    dates = [_fmt(t) for t in raw.index[idxs]]
+    closes = raw["Close"].to_numpy(dtype=float)
+    prev_close, actual = closes[idxs - 1], closes[idxs]
+
+    # MinMax scaling is per-row: scale the frame once per scaler and cut every lookback's windows from it
+    scaled = {sp: scaler.transform(raw[FEATURES].values) for sp, (scaler, _) in scalers.items()}
+    results: List[Dict[str, Any]] = []
+    # the served model runs through the registry; candidates are loaded once and dropped on return
+    runners: Dict[str, Callable[[Any], Any]] = {snap.model_path: lambda x: infer(x, snap.model_path, snap.model)}
+    with ExitStack() as candidates:
+        for lb in lookbacks:
+            X: Dict[str, Any] = {}  # scaler path -> (n, lb, features), only built if some model has dates to infer
+            for path, sp in variants:
+                scaler, scaler_ver = scalers[sp]
+                version = snap.model_version if path == snap.model_path else model_version(path)
+                stored = prediction_store.get_preds(yahoo.DATA_SOURCE, DEFAULT_TICKER, lb, version, scaler_ver, dates)
+                pred = np.array([stored.get(d, np.nan) for d in dates], dtype=float)
+                missing = np.flatnonzero(np.isnan(pred))
+                if len(missing):
+                    if sp not in X:
+                        views = np.lib.stride_tricks.sliding_window_view(scaled[sp], lb, axis=0)  # (.., features, lb)
+                        X[sp] = np.ascontiguousarray(views[idxs - lb].transpose(0, 2, 1))
+                    try:
+                        if path not in runners:
+                            runners[path] = candidates.enter_context(candidate(path))
+                        with tracing.span("backtest.infer", days=len(missing), lookback=lb, model_version=version):
+                            fresh = _unscale_close(scaler, runners[path](X[sp][missing]))
+                    except Exception as e:
+                        raise HTTPException(500, f"Prediction failed for {os.path.basename(path)}: {e}")
+                    pred[missing] = fresh
+                    prediction_store.put_preds(yahoo.DATA_SOURCE, DEFAULT_TICKER, lb, version, scaler_ver,
+                                               ((dates[k], float(p)) for k, p in zip(missing, fresh)))
+                rows = BacktestRows.compute(dates, pred=pred, prev_close=prev_close, actual=actual)
+                results.append({
+                    "model": os.path.basename(path),
+                    "model_version": version,
+                    "scaler": os.path.basename(sp),
+                    "scaler_version": scaler_ver,
+                    "lookback": lb,
+                    "inferred_days": int(len(missing)),
+                    "summary": {
+                        **_summary(rows, window),
+                        "PL_points": round(float(rows.cum_pl_points[-1]), 4),
+                        "Return_pct": round(float(rows.cum_return_pct[-1]), 4),
+                    },
+                })
+
+    naive_err = prev_close - actual
+    return {
+        "success": True,
+        "start": dates[0],
+        "end": dates[-1],
+        "count": len(dates),
+        "baseline": {
+            "Naive_MAE": round(float(np.abs(naive_err).mean()), 4),
+            "Naive_RMSE": round(float(np.sqrt((naive_err ** 2).mean())), 4),
+        },
+        "results": results,
+    }
@@ -1,7 +1,39 @@
 ﻿from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from ..core import admission, depmonitor, readiness, resilience
+from ..core.importtime import import_report
 
 router = APIRouter()
 
 @router.get("/health")
 def health():
     return {"status":"ok","service":"ftse-api"}
+
+@router.get("/health/ready")
+def health_ready():
+    """503 until the model is loaded, every configured lookback is traced and OHLC is cached."""
+    st = readiness.status()
+    if not st["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **st})
+    return {"status": "ready", **st}
+
+@router.get("/health/sources")
+def health_sources():
+    """Circuit-breaker state and recent latency per market-data source."""
+    return {"sources": resilience.sources_status()}
+
+@router.get("/health/deps")
+def health_deps():
+    """Last background probe of Supabase / Yahoo / Stooq: up, latency, detail, since when. Never blocks."""
+    return depmonitor.status()
+
+@router.get("/health/admission")
+def health_admission():
+    """Concurrency slots in use and admitted / throttled (429) / shed (503) counts per class."""
+    return {"enabled": admission.ADMISSION_ENABLED, "classes": admission.status()}
+
+@router.get("/health/imports")
+def health_imports():
+    """Per-module import timings (startup + lazily loaded heavy deps)."""
+    return {"imports": import_report()}
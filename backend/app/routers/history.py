@@ -3,11 +3,11 @@ from datetime import date
 from typing import Optional
 import io, csv, requests
 
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import StreamingResponse
 
-from ..core import supa
+from ..core import depmonitor, supa, history_stats, formats, tracing
 
 router = APIRouter(tags=["history"])
 auth_scheme = HTTPBearer()
@@ -15,6 +15,8 @@ auth_scheme = HTTPBearer()
 def _check_conn():
     if not supa.SUPABASE_URL or not supa.SUPABASE_KEY or not supa.REST:
         raise HTTPException(status_code=503, detail="Supabase credentials missing")
+    if not depmonitor.is_up("supabase"):  # fail fast instead of waiting out the request timeout
+        raise HTTPException(status_code=503, detail="Supabase unreachable (last health probe failed)")
     return f"{supa.REST}/{supa.TABLE}", supa.HEADERS
 
 def _get_user_id_from_supabase(token: HTTPAuthorizationCredentials = Depends(auth_scheme)) -> str:
@@ -25,14 +27,16 @@ def _get_user_id_from_supabase(token: HTTPAuthorizationCredentials = Depends(aut
     if not supa.SUPABASE_URL or not supa.SUPABASE_KEY:
         raise HTTPException(status_code=500, detail="Server misconfigured: Supabase env not set")
     try:
-        resp = requests.get(
-            f"{supa.SUPABASE_URL}/auth/v1/user",
-            headers={
-                "Authorization": f"Bearer {token.credentials}",
-                "apikey": supa.SUPABASE_KEY,
-            },
-            timeout=10,
-        )
+        with tracing.span("history.auth") as s:
+            resp = requests.get(
+                f"{supa.SUPABASE_URL}/auth/v1/user",
+                headers={
+                    "Authorization": f"Bearer {token.credentials}",
+                    "apikey": supa.SUPABASE_KEY,
+                },
+                timeout=10,
+            )
+            s.set(**{"http.status_code": resp.status_code})
         if resp.status_code != 200:
             raise HTTPException(status_code=401, detail=f"Auth failed: HTTP {resp.status_code} - {resp.text}")
         data = resp.json() or {}
@@ -47,13 +51,14 @@ def _get_user_id_from_supabase(token: HTTPAuthorizationCredentials = Depends(aut
 
 @router.get("/history")
 def list_history(
+    request: Request,
     limit: int = Query(50, ge=1, le=500),
     offset: int = Query(0, ge=0),
     start: Optional[date] = None,
     end: Optional[date] = None,
     by: str = "generated_at",          # or "prediction_for"
     desc: bool = True,
-    format: str = "json",              # "json" | "csv"
+    format: str = "json",              # "json" | "csv" | "arrow" | "msgpack" (or send an Accept header)
     user_id: str = Depends(_get_user_id_from_supabase),
 ):
     base, headers = _check_conn()
@@ -70,7 +75,9 @@ def list_history(
         url += f"&{col}=lte.{end.isoformat()}"
 
     try:
-        r = requests.get(url, headers=headers, timeout=30)
+        with tracing.span("supabase.select", **{"db.table": supa.TABLE, "limit": limit}) as s:
+            r = requests.get(url, headers=headers, timeout=30)
+            s.set(**{"http.status_code": r.status_code})
         r.raise_for_status()
         rows = r.json() or []
     except Exception as e:
@@ -93,14 +100,38 @@ def list_history(
             headers={"Content-Disposition": "attachment; filename=predictions.csv"},
         )
 
+    fmt = formats.negotiate(request, format if format.lower() != "json" else None)
+    if fmt != "json":
+        meta = {"success": True, "count": len(rows), "offset": offset, "limit": limit}
+        return formats.table_response(fmt, formats.records_to_columns(rows), meta)
+
     return {"success": True, "count": len(rows), "offset": offset, "limit": limit, "data": rows}
 
+@router.get("/history/stats")
+def history_stats_view(
+    bucket: str = Query("day", description="day | week | month"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user_id: str = Depends(_get_user_id_from_supabase),
+):
+    """Hit rate, MAE, MAPE (%) and signal P&L of reconciled predictions, per bucket."""
+    _check_conn()
+    try:
+        return {"success": True, **history_stats.stats(user_id, bucket.lower(), start, end)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except requests.RequestException as e:
+        txt = getattr(getattr(e, "response", None), "text", str(e))
+        raise HTTPException(status_code=502, detail=f"Supabase error: {txt}")
+
 @router.get("/history/{prediction_id}")
 def get_history_item(prediction_id: str, user_id: str = Depends(_get_user_id_from_supabase)):
     base, headers = _check_conn()
     url = f"{base}?select=*&id=eq.{prediction_id}&user_id=eq.{user_id}"
     try:
-        r = requests.get(url, headers=headers, timeout=15)
+        with tracing.span("supabase.select", **{"db.table": supa.TABLE}) as s:
+            r = requests.get(url, headers=headers, timeout=15)
+            s.set(**{"http.status_code": r.status_code})
         r.raise_for_status()
         data = r.json() or []
     except Exception as e:
@@ -1,18 +1,38 @@
-﻿from fastapi import APIRouter, HTTPException
-from ..core.yahoo import fetch_ohlc
+﻿from fastapi import APIRouter, HTTPException, Query, Request
+from ..core import formats
+from ..core.yahoo import fetch_ohlc, fetch_intraday
 
 router = APIRouter()
 
 @router.get("/ohlc")
-def ohlc():
+def ohlc(
+    request: Request,
+    interval: str = Query("1d", description="1d (default) or intraday: 1m, 5m, 15m, 1h, 4h ..."),
+    days: int = Query(5, ge=1, le=730, description="History for intraday intervals"),
+):
+    intraday = interval != "1d"
     try:
-        df = fetch_ohlc(180)
+        df = fetch_intraday(days, interval) if intraday else fetch_ohlc(180)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
 
+    fmt = formats.negotiate(request)
+    if fmt != "json":  # columnar: no per-row objects at all
+        dates = df.index.strftime("%Y-%m-%dT%H:%M:%S" if intraday else "%Y-%m-%d")
+        return formats.table_response(fmt, {
+            "date": list(dates),
+            "open": df["Open"].astype(float),
+            "high": df["High"].astype(float),
+            "low": df["Low"].astype(float),
+            "close": df["Close"].astype(float),
+            "volume": df["Volume"].astype(float),
+        }, {"interval": interval})
+
     rows = [
         {
-            "date": idx.date().isoformat(),
+            "date": idx.isoformat() if intraday else idx.date().isoformat(),
             "open": float(r.Open),
             "high": float(r.High),
             "low":  float(r.Low),
@@ -7,8 +7,9 @@ from pydantic import BaseModel
 import requests
 
 from ..core.yahoo import fetch_ohlc
-from ..core.model import predict_next_close
+from ..core.model import predict_next_close, served
 from ..core import supa  # provides SUPABASE_URL, SUPABASE_KEY, REST, etc.
+from ..core import admission, depmonitor, shared_cache, tracing
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, "models", "best_lstm_model.h5")
@@ -29,8 +30,8 @@ class PredictOut(BaseModel):
     window_start: str
     window_end: str
     prediction_for: str
-    model_version: str = "lstm_h5_v1"
-    scaler_version: str = "minmax_v1"
+    model_version: str | None = None
+    scaler_version: str | None = None
     ticker_used: str | None = None
 
 def _next_trading_day(d):
@@ -45,14 +46,16 @@ def _get_user_id_from_supabase(token: HTTPAuthorizationCredentials = Depends(aut
         raise HTTPException(status_code=500, detail="Server misconfigured: Supabase env not set")
 
     try:
-        resp = requests.get(
-            f"{supa.SUPABASE_URL}/auth/v1/user",
-            headers={
-                "Authorization": f"Bearer {token.credentials}",
-                "apikey": supa.SUPABASE_KEY,  # backend key is fine here
-            },
-            timeout=10,
-        )
+        with tracing.span("predict.auth") as s:
+            resp = requests.get(
+                f"{supa.SUPABASE_URL}/auth/v1/user",
+                headers={
+                    "Authorization": f"Bearer {token.credentials}",
+                    "apikey": supa.SUPABASE_KEY,  # backend key is fine here
+                },
+                timeout=10,
+            )
+            s.set(**{"http.status_code": resp.status_code})
         if resp.status_code != 200:
             # Surface the real reason (expired token, etc.)
             raise HTTPException(status_code=401, detail=f"Auth failed: HTTP {resp.status_code} - {resp.text}")
@@ -66,11 +69,12 @@ def _get_user_id_from_supabase(token: HTTPAuthorizationCredentials = Depends(aut
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Auth failed: {e}")
 
-@router.get("/predict", response_model=PredictOut)
+@router.get("/predict", response_model=PredictOut, dependencies=[Depends(admission.admit("interactive", user=_get_user_id_from_supabase))])
 def predict(user_id: str = Depends(_get_user_id_from_supabase)):
     # 1) Market data
     try:
-        df = fetch_ohlc(120)
+        with tracing.span("predict.fetch", days=120):
+            df = fetch_ohlc(120)
         ticker_used = "^FTSE"
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Unable to fetch FTSE data: {e}")
@@ -93,7 +97,16 @@ def predict(user_id: str = Depends(_get_user_id_from_supabase)):
 
     # 3) Inference
     try:
-        pred_close = float(predict_next_close(last60, model_path=MODEL_PATH, scaler_path=SCALER_PATH))
+        # the registry's live model + scaler, read together so a hot swap can't split them
+        snap = served(MODEL_PATH, SCALER_PATH)
+        version, scaler_ver = snap.model_version, snap.scaler_version
+        # same window + same model = same answer: another worker may already have computed it
+        snapshot_key = shared_cache.prediction_key(version, scaler_ver, last60)
+        pred_close = shared_cache.get_prediction(snapshot_key)
+        if pred_close is None:
+            with tracing.span("predict.inference", model_version=version):
+                pred_close = float(predict_next_close(last60, snapshot=snap))
+            shared_cache.put_prediction(snapshot_key, pred_close)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {e}")
 
@@ -108,29 +121,30 @@ def predict(user_id: str = Depends(_get_user_id_from_supabase)):
 
     # 5) Persist under this user_id
     rec_id, gen_at = None, None
-    if supa.is_connected():
+    if supa.is_connected() and depmonitor.is_up("supabase"):
         try:
-            record = supa.insert_prediction({
-                "user_id": user_id,
-                "window_start": window_start,
-                "window_end": window_end,
-                "prediction_for": prediction_for,
-                "last_close": last_close,
-                "predicted_close": pred_close,
-                "direction_pred": direction,
-                "band_lower": band_lower,
-                "band_upper": band_upper,
-                "signal": signal,
-                "model_version": "lstm_h5_v1",
-                "scaler_version": "minmax_v1",
-                "raw_context": {"ticker_used": ticker_used}
-            })
+            with tracing.span("predict.persist"):
+                record = supa.insert_prediction({
+                    "user_id": user_id,
+                    "window_start": window_start,
+                    "window_end": window_end,
+                    "prediction_for": prediction_for,
+                    "last_close": last_close,
+                    "predicted_close": pred_close,
+                    "direction_pred": direction,
+                    "band_lower": band_lower,
+                    "band_upper": band_upper,
+                    "signal": signal,
+                    "model_version": version,
+                    "scaler_version": scaler_ver,
+                    "raw_context": {"ticker_used": ticker_used}
+                })
             rec_id = record.get("id")
             gen_at = record.get("generated_at")
         except Exception as e:
             print(f"[WARN] Failed to save prediction to Supabase: {e}")
     else:
-        print("[INFO] Skipped Supabase save – DB not connected.")
+        print("[INFO] Skipped Supabase save – DB not connected or last health probe failed.")
 
     # 6) Response
     return PredictOut(
@@ -145,5 +159,7 @@ def predict(user_id: str = Depends(_get_user_id_from_supabase)):
         window_start=window_start,
         window_end=window_end,
         prediction_for=prediction_for,
+        model_version=version,
+        scaler_version=scaler_ver,
         ticker_used=ticker_used
     )
@@ -1,34 +1,43 @@
 ﻿# backend/app/routers/reconcile.py
 from datetime import date, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any
 import requests
 
 from fastapi import APIRouter, HTTPException, Query, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-from ..core import supa
-from ..core.yahoo import fetch_ohlc
+from ..core import admission, depmonitor, supa, history_stats, reconcile_job, tracing
+from ..core.admin import require_admin
+from ..core.reconcile_job import ACTUAL_LOOKAHEAD_DAYS, actual_for, close_map as build_close_map, patch_for
+from ..core.yahoo import fetch_ohlc_since
 
 router = APIRouter(tags=["reconcile"])
 auth_scheme = HTTPBearer()
 
+# Only the columns reconcile reads; "*" would drag every feature/metadata column along
+RECONCILE_COLUMNS = "id,prediction_for,last_close,predicted_close"
+
 def _check_conn():
     if not (supa.SUPABASE_URL and supa.SUPABASE_KEY and supa.REST):
         raise HTTPException(status_code=503, detail="Supabase credentials missing")
+    if not depmonitor.is_up("supabase"):  # fail fast instead of waiting out the request timeout
+        raise HTTPException(status_code=503, detail="Supabase unreachable (last health probe failed)")
     return f"{supa.REST}/{supa.TABLE}", supa.HEADERS
 
 def _get_user_id_from_supabase(token: HTTPAuthorizationCredentials = Depends(auth_scheme)) -> str:
     if not supa.SUPABASE_URL or not supa.SUPABASE_KEY:
         raise HTTPException(status_code=500, detail="Server misconfigured: Supabase env not set")
     try:
-        resp = requests.get(
-            f"{supa.SUPABASE_URL}/auth/v1/user",
-            headers={
-                "Authorization": f"Bearer {token.credentials}",
-                "apikey": supa.SUPABASE_KEY,
-            },
-            timeout=10,
-        )
+        with tracing.span("reconcile.auth") as s:
+            resp = requests.get(
+                f"{supa.SUPABASE_URL}/auth/v1/user",
+                headers={
+                    "Authorization": f"Bearer {token.credentials}",
+                    "apikey": supa.SUPABASE_KEY,
+                },
+                timeout=10,
+            )
+            s.set(**{"http.status_code": resp.status_code})
         if resp.status_code != 200:
             raise HTTPException(status_code=401, detail=f"Auth failed: HTTP {resp.status_code} - {resp.text}")
         data = resp.json() or {}
@@ -41,11 +50,8 @@ def _get_user_id_from_supabase(token: HTTPAuthorizationCredentials = Depends(aut
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Auth failed: {e}")
 
-def _safe_float(x) -> Optional[float]:
-    try:
-        return float(x) if x is not None else None
-    except Exception:
-        return None
+# cost ~ row limit, charged to the validated user
+_heavy = [Depends(admission.admit("heavy", admission.reconcile_cost, user=_get_user_id_from_supabase))]
 
 def _next_trading_day(d: date) -> date:
     nd = d + timedelta(days=1)
@@ -53,7 +59,7 @@ def _next_trading_day(d: date) -> date:
         nd += timedelta(days=1)
     return nd
 
-@router.post("/repair_prediction_for")
+@router.post("/repair_prediction_for", dependencies=_heavy)
 def repair_prediction_for(
     limit: int = Query(5000, ge=1, le=20000),
     user_id: str = Depends(_get_user_id_from_supabase)
@@ -61,7 +67,9 @@ def repair_prediction_for(
     base, headers = _check_conn()
     q = f"{base}?select=id,window_end,prediction_for&order=window_end.asc&limit={limit}&user_id=eq.{user_id}"
     try:
-        r = requests.get(q, headers=headers, timeout=30)
+        with tracing.span("supabase.select", **{"db.table": supa.TABLE, "limit": limit}) as s:
+            r = requests.get(q, headers=headers, timeout=30)
+            s.set(**{"http.status_code": r.status_code})
         r.raise_for_status()
         rows = r.json() or []
     except Exception as e:
@@ -94,23 +102,27 @@ def repair_prediction_for(
         else:
             skipped += 1
 
+    if fixed:
+        history_stats.invalidate(user_id)  # repaired rows lost their actuals
     return {"success": True, "fixed": fixed, "skipped": skipped}
 
-@router.post("/reconcile")
+@router.post("/reconcile", dependencies=_heavy)
 def reconcile(
     force: bool = Query(False, description="Recompute even when actual_close is present"),
-    days_back: int = Query(730, ge=7, le=3650, description="Days of OHLC to fetch"),
+    days_back: int = Query(730, ge=7, le=3650, description="Oldest prediction_for (in days) to reconcile"),
     limit: int = Query(5000, ge=1, le=20000),
     user_id: str = Depends(_get_user_id_from_supabase)
 ):
     base, headers = _check_conn()
 
     # 1) Load target rows for this user
-    q = f"{base}?select=*&order=prediction_for.asc&limit={limit}&user_id=eq.{user_id}"
+    q = f"{base}?select={RECONCILE_COLUMNS}&order=prediction_for.asc&limit={limit}&user_id=eq.{user_id}"
     if not force:
         q += "&actual_close=is.null"
     try:
-        r = requests.get(q, headers=headers, timeout=30)
+        with tracing.span("supabase.select", **{"db.table": supa.TABLE, "limit": limit}) as s:
+            r = requests.get(q, headers=headers, timeout=30)
+            s.set(**{"http.status_code": r.status_code})
         r.raise_for_status()
         rows: List[Dict[str, Any]] = r.json() or []
     except Exception as e:
@@ -120,60 +132,44 @@ def reconcile(
     if not rows:
         return {"success": True, "updated": 0, "skipped": 0, "reason": "no rows to reconcile"}
 
-    # 2) Build date->close map
+    # 2) Build date->close map for just the window the pending rows need
+    targets = []
+    for row in rows:
+        try:
+            targets.append(date.fromisoformat(row["prediction_for"]))
+        except Exception:
+            continue
+    today = date.today()
+    start = max(min(targets, default=today), today - timedelta(days=days_back))
+    if start > today:
+        return {"success": True, "updated": 0, "skipped": len(rows), "reason": "no closes available yet"}
+    end = max(targets, default=today) + timedelta(days=ACTUAL_LOOKAHEAD_DAYS)
+
     try:
-        df = fetch_ohlc(days_back)
+        df = fetch_ohlc_since(start)
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"fetch_ohlc failed: {e}")
 
     if df is None or df.empty:
         raise HTTPException(status_code=502, detail="fetch_ohlc returned no data")
 
-    df = df.copy()
-    df.index = df.index.tz_localize(None) if getattr(df.index, "tz", None) else df.index
-    close_map: Dict[str, float] = {}
-    for ts, row in df.iterrows():
-        try:
-            close_map[ts.date().isoformat()] = float(row["Close"])
-        except Exception:
-            continue
+    close_map = build_close_map(df.loc[df.index <= end.isoformat()])
 
     # 3) Fill actuals/errors
     updated, skipped = 0, 0
     for row in rows:
         pid = row.get("id")
         pf_str = row.get("prediction_for")
-        last = _safe_float(row.get("last_close"))
-        pred = _safe_float(row.get("predicted_close"))
         if not pid or not pf_str:
             skipped += 1
             continue
 
-        actual: Optional[float] = None
-        dt = date.fromisoformat(pf_str)
-        for _ in range(4):
-            key = dt.isoformat()
-            if key in close_map:
-                actual = close_map[key]
-                break
-            dt = dt + timedelta(days=1)
-
+        actual = actual_for(pf_str, close_map)
         if actual is None:
             skipped += 1
             continue
 
-        patch: Dict[str, Any] = {"actual_close": actual}
-
-        if pred is not None:
-            err = pred - actual
-            patch["abs_error"] = abs(err)
-            patch["pct_error"] = (abs(err) / actual) if actual else None
-
-        if last is not None and pred is not None:
-            up_pred = 1 if pred >= last else -1
-            up_real = 1 if actual >= last else -1
-            patch["direction_hit"] = (up_pred == up_real)
-
+        patch = patch_for(row, actual)
         try:
             supa.update_prediction(pid, patch, user_id=user_id)  # extra safety
             updated += 1
@@ -181,4 +177,23 @@ def reconcile(
             print(f"[reconcile] update failed for id={pid}: {e}")
             skipped += 1
 
+    if updated:
+        history_stats.invalidate(user_id)
     return {"success": True, "updated": updated, "skipped": skipped}
+
+# ===== Admin: cross-user batch reconcile =====
+@router.post("/admin/reconcile", dependencies=[Depends(require_admin)])
+def start_batch_reconcile(restart: bool = Query(False, description="Ignore saved progress and rescan from the start")):
+    """Reconcile every user's pending rows in one background pass (resumes an interrupted run)."""
+    _check_conn()
+    started = reconcile_job.start(restart=restart)
+    return {"success": True, "started": started, **reconcile_job.status()}
+
+@router.get("/admin/reconcile", dependencies=[Depends(require_admin)])
+def batch_reconcile_status():
+    return {"success": True, **reconcile_job.status()}
+
+@router.delete("/admin/reconcile", dependencies=[Depends(require_admin)])
+def cancel_batch_reconcile():
+    """Stop after the current page; progress is kept so the next POST resumes."""
+    return {"success": True, "cancelled": reconcile_job.cancel(), **reconcile_job.status()}
@@ -0,0 +1,24 @@
+# backend/gunicorn.conf.py
+# Preload-and-fork deployment:  gunicorn -c gunicorn.conf.py app.main:app
+# The app is imported once in the master and forked into WEB_CONCURRENCY uvicorn workers.
+# SHARED_CACHE makes the workers share one OHLC download and /predict result (app/core/shared_cache.py),
+# and only one of them runs the background schedulers. POST /admin/model/reload reaches one worker
+# and is relayed to the rest through the shared cache directory within MODEL_SYNC_INTERVAL seconds
+# (shadow mode is unavailable here). /predict snapshots are keyed by model version, so workers that
+# haven't switched yet never reuse the new model's results or vice versa.
+# Memory: the numpy/pandas/scikit-learn pages and the scaler are shared copy-on-write, but every
+# worker loads its own TensorFlow and model after the fork (~0.5 GB each; see app/core/preload.py).
+import os
+
+os.environ.setdefault("SHARED_CACHE", "true")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+def when_ready(server):
+    from app.core import preload
+    preload.before_fork()
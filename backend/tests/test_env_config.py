@@ -0,0 +1,26 @@
+# backend/tests/test_env_config.py
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stands in for backend/.env: the settings exist nowhere but in the parsed file
+SCRIPT = """
+import dotenv
+dotenv.dotenv_values = lambda path: {"TRACING": "file", "TRACE_FILE": "/tmp/env-traces.jsonl",
+                                     "REQUEST_ID_LOGS": "false"}
+import importlib
+importlib.import_module(%r)
+from app.core import tracing
+print(tracing.TRACING, tracing.TRACE_FILE, tracing.REQUEST_ID_LOGS)
+"""
+
+@pytest.mark.parametrize("first", ["app.core.supa", "app.core.tracing", "app.core.yahoo"])
+def test_tracing_settings_come_from_dotenv(first):
+    env = {k: v for k, v in os.environ.items() if k not in ("TRACING", "TRACE_FILE", "REQUEST_ID_LOGS")}
+    out = subprocess.run([sys.executable, "-c", SCRIPT % first], cwd=BACKEND, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == "file /tmp/env-traces.jsonl False"
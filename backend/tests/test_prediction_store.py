@@ -0,0 +1,47 @@
+# backend/tests/test_prediction_store.py
+import os
+from datetime import date
+
+import pytest
+
+from app.core import prediction_store, synthetic, yahoo
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(prediction_store, "STORE_PATH", str(tmp_path / "store.sqlite3"))
+    monkeypatch.setattr(prediction_store, "STORE_ENABLED", True)
+    monkeypatch.setattr(prediction_store, "_initialized", False)
+    return prediction_store
+
+def test_sources_do_not_share_predictions(store):
+    key = ("^FTSE", 60, "sha256:model", "sha256:scaler")
+    store.put_preds("synthetic", *key, [("2024-01-02", 1.0)])
+    assert store.get_preds("live", *key, ["2024-01-02"]) == {}
+    store.put_preds("live", *key, [("2024-01-02", 2.0)])
+    assert store.get_preds("synthetic", *key, ["2024-01-02"]) == {"2024-01-02": 1.0}
+    assert store.get_preds("live", *key, ["2024-01-02"]) == {"2024-01-02": 2.0}
+
+def test_compare_alternating_sources_recomputes(store, monkeypatch):
+    pytest.importorskip("tensorflow")
+    from app.core import model
+    from app.routers import backtest
+
+    def fetch(start, end, symbol=yahoo.TICKERS[0]):
+        # "live" stands in for Yahoo: same calendar, different prices
+        last = (date.fromisoformat(end) if isinstance(end, str) else end)
+        df = synthetic.daily_frame(date.fromisoformat(start), last, symbol)
+        return df if yahoo.DATA_SOURCE == "synthetic" else df * 1.05
+
+    monkeypatch.setattr(yahoo, "fetch_ohlc_range", fetch)
+    variants = [(model.model_file(model.default_model_path()), os.path.realpath(model.default_scaler_path()))]
+
+    def inferred(source):
+        monkeypatch.setattr(yahoo, "DATA_SOURCE", source)
+        out = backtest._compute_compare(date(2024, 3, 4), date(2024, 3, 15), variants, [60], 7)
+        return out["count"], out["results"][0]["inferred_days"]
+
+    count, first = inferred("synthetic")
+    assert first == count
+    assert inferred("live") == (count, count)        # not served the synthetic predictions
+    assert inferred("synthetic") == (count, 0)
+    assert inferred("live") == (count, 0)